@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Build the ledger.html entity tables from their data files.
+
+The Verified Entity Logs table in ledger.html is generated, not hand-edited:
+
+- ledger_entities.json lists the sections in display order and, per entity,
+  its notice/change date, base fine and (optionally) a bounce flag.
+- notices_extracted.json (written by parse_notices.py) decides the bounce flag
+  of every entity it has notices for, so the two files cannot disagree.
+
+The build emits one pre-grouped JavaScript block, already in display order,
+with dates as epoch milliseconds, and replaces the block between the GENERATED
+markers in ledger.html. The page then renders it without parsing or sorting.
+validate_ledger.py runs the same build and fails when the block is stale.
+
+Examples:
+  python build_ledger.py            # rewrite the block in ledger.html
+  python build_ledger.py --check    # exit 1 if ledger.html is out of date
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+LEDGER_PATH = ROOT / "ledger.html"
+ENTITIES_PATH = ROOT / "ledger_entities.json"
+NOTICES_PATH = ROOT / "notices_extracted.json"
+
+BEGIN_MARKER = "// BEGIN GENERATED: ledger entity tables"
+END_MARKER = "// END GENERATED: ledger entity tables"
+INDENT = " " * 8
+
+
+def parse_timestamp(value: str) -> int:
+    """ISO 8601 date/time -> epoch milliseconds (naive values are taken as UTC)."""
+    parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+def notice_bounces(notices: list[dict]) -> dict[str, bool]:
+    """Entity -> whether any of its extracted notices bounced."""
+    bounces: dict[str, bool] = {}
+    for notice in notices:
+        bounces[notice["entity"]] = bounces.get(notice["entity"], False) or bool(notice["bounced"])
+    return bounces
+
+
+def build_sections(entities_config: dict, notices: list[dict]) -> list[dict]:
+    """Resolves every entity row; raises ValueError when the two sources disagree."""
+    bounces = notice_bounces(notices)
+    sections = []
+    seen: set[str] = set()
+    for section in entities_config["sections"]:
+        rows = []
+        for entity in section["entities"]:
+            entity_id = entity["id"]
+            if entity_id in seen:
+                raise ValueError(f"Entity '{entity_id}' is listed twice in {ENTITIES_PATH.name}")
+            seen.add(entity_id)
+            bounce = entity.get("bounce", False)
+            if entity_id in bounces:
+                if "bounce" in entity and entity["bounce"] != bounces[entity_id]:
+                    raise ValueError(
+                        f"Entity '{entity_id}' has bounce={entity['bounce']} in {ENTITIES_PATH.name} "
+                        f"but bounced={bounces[entity_id]} in {NOTICES_PATH.name}")
+                bounce = bounces[entity_id]
+            rows.append({
+                "id": entity_id,
+                "noticeMs": parse_timestamp(entity["date"]),
+                "base": entity["base"],
+                "bounce": bounce,
+            })
+        sections.append({"section": section["key"], "title": section["title"], "entities": rows})
+    return sections
+
+
+def render_block(sections: list[dict]) -> str:
+    """The generated JavaScript, markers included, indented for ledger.html's <script>."""
+    lines = [
+        f"{INDENT}{BEGIN_MARKER} (python build_ledger.py; edit {ENTITIES_PATH.name})",
+        f"{INDENT}const ENTITY_SECTIONS = [",
+    ]
+    for section in sections:
+        lines.append(f"{INDENT}    {{ section: {json.dumps(section['section'])}, "
+                     f"title: {json.dumps(section['title'], ensure_ascii=False)}, entities: [")
+        for row in section["entities"]:
+            lines.append(f"{INDENT}        {{ id: {json.dumps(row['id'], ensure_ascii=False)}, "
+                         f"noticeMs: {row['noticeMs']}, base: {row['base']}, "
+                         f"bounce: {'true' if row['bounce'] else 'false'} }},")
+        lines.append(f"{INDENT}    ] }},")
+    lines.append(f"{INDENT}];")
+    lines.append(f"{INDENT}{END_MARKER}")
+    return "\n".join(lines)
+
+
+def inject_block(html: str, block: str) -> str:
+    """Replaces the marked lines in html with block."""
+    start = html.find(BEGIN_MARKER)
+    end = html.find(END_MARKER)
+    if start < 0 or end < start:
+        raise ValueError(f"{LEDGER_PATH.name} has no '{BEGIN_MARKER}' ... '{END_MARKER}' block")
+    start = html.rfind("\n", 0, start) + 1
+    end += len(END_MARKER)
+    return html[:start] + block + html[end:]
+
+
+def load_json(path: Path):
+    with path.open("r", encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def expected_ledger(ledger_path: Path = LEDGER_PATH) -> tuple[str, str]:
+    """Returns (current, expected) ledger.html contents."""
+    sections = build_sections(load_json(ENTITIES_PATH), load_json(NOTICES_PATH))
+    current = ledger_path.read_text(encoding="utf-8")
+    return current, inject_block(current, render_block(sections))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Generate the ledger.html entity tables.")
+    parser.add_argument("--check", action="store_true",
+                        help="Only report whether ledger.html is up to date (exit 1 if not)")
+    args = parser.parse_args()
+
+    try:
+        current, expected = expected_ledger()
+    except (OSError, ValueError, KeyError) as exc:
+        print(f"❌ {exc}")
+        return 1
+
+    if current == expected:
+        print(f"✅ {LEDGER_PATH.name} entity tables are up to date")
+        return 0
+    if args.check:
+        print(f"❌ {LEDGER_PATH.name} entity tables are stale; run: python build_ledger.py")
+        return 1
+    LEDGER_PATH.write_text(expected, encoding="utf-8")
+    print(f"✅ Regenerated entity tables in {LEDGER_PATH.name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+"""
+Build the deployable site into dist/.
+
+The pages are written for editing: indented inline <style>/<script> blocks,
+comments, and theme.css/theme.js linked by bare name (so browsers cannot cache
+them for long), with theme.css linked twice on some pages. The build writes a
+dist/ tree for deployment in which:
+
+- HTML, inline and linked CSS and inline and linked JavaScript are minified.
+  The minifiers are conservative: comments and redundant whitespace go, tokens
+  are never rewritten, and JavaScript keeps its line breaks (so automatic
+  semicolon insertion is unaffected).
+- Repeated <link rel="stylesheet"> / <script src> references are removed. For a
+  stylesheet the last link is kept, which leaves the cascade unchanged; for a
+  script the first is kept, so it still runs once, where it ran first.
+- Stylesheets, scripts and images a page loads are written as
+  name.<content hash>.ext and the pages point at those, so the files can be
+  cached as immutable. The unhashed copies are written too, for anything that
+  still requests them by name.
+- Each page gets the rules of its first local stylesheet that can apply to it
+  (those whose ids, classes and tags all occur in the page or its scripts)
+  inlined in a <style>, and loads the full stylesheet without blocking
+  rendering. The full sheet lands at the same position, so once it has loaded
+  the cascade is the same as before.
+
+Other site files (archive data, the PDF, .nojekyll) are copied unchanged;
+tooling (utils/, pr-screenshots/, *.py, *.md) is left out.
+
+Examples:
+  python build_site.py                 # write dist/
+  python build_site.py --out-dir /tmp/site --no-critical-css
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import re
+import shutil
+import subprocess
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+sys.path.insert(0, str(Path(__file__).parent / "utils"))
+
+from change_analysis import resolve_local_ref  # noqa: E402
+
+ROOT = Path(__file__).parent
+DEFAULT_OUT_DIR = ROOT / "dist"
+SITE_SUFFIXES = (".html", ".css", ".js", ".json", ".pdf", ".txt", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp",
+                 ".ico", ".woff", ".woff2", ".ttf", ".otf")
+SITE_FILES = (".nojekyll",)
+EXCLUDED_DIRS = ("utils/", "pr-screenshots/", ".github/", ".githooks/", "dist/")
+# Inputs of build_ledger.py and validator config, not fetched by any page
+EXCLUDED_FILES = ("ledger_entities.json", "notices_extracted.json", "page_budgets.json")
+FINGERPRINT_SUFFIXES = (".css", ".js", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".ico",
+                        ".woff", ".woff2", ".ttf", ".otf")
+HASH_LENGTH = 10
+
+# Elements whose contents are not ordinary markup, and comments
+RAW_SEGMENT_PATTERN = re.compile(r"<(script|style|pre|textarea)\b[^>]*>.*?</\1\s*>|<!--.*?-->",
+                                 re.IGNORECASE | re.DOTALL)
+TAG_PATTERN = re.compile(r"<(link|script|img|source)\b[^>]*>", re.IGNORECASE)
+ATTRIBUTE_PATTERN = re.compile(r"""([\w:-]+)\s*=\s*("[^"]*"|'[^']*'|[^\s>]+)""")
+SCRIPT_TYPES_JS = ("", "text/javascript", "application/javascript", "module")
+JS_REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^")
+JS_REGEX_KEYWORDS = {"return", "typeof", "case", "do", "else", "in", "of", "new", "delete", "void", "throw",
+                     "instanceof", "yield", "await"}
+CSS_TOKEN_PATTERN = re.compile(r"""/\*.*?\*/|"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'""", re.DOTALL)
+CSS_SELECTOR_TOKEN_PATTERN = re.compile(r"([#.]?)(-?[_a-zA-Z][\w-]*)")
+
+
+# --- Minifiers ---
+
+def minify_css(css: str) -> str:
+    """Drops comments and whitespace that CSS does not need; strings are kept as written."""
+    out = []
+    code = ""
+    position = 0
+    for match in CSS_TOKEN_PATTERN.finditer(css):
+        code += css[position:match.start()]
+        if match.group().startswith("/*"):
+            code += " "
+        else:
+            out.append(_squeeze_css(code) + match.group())
+            code = ""
+        position = match.end()
+    out.append(_squeeze_css(code + css[position:]))
+    return "".join(out).strip()
+
+
+def _squeeze_css(code: str) -> str:
+    code = re.sub(r"\s+", " ", code)
+    code = re.sub(r"\s*([{};,>])\s*", r"\1", code)
+    code = re.sub(r":\s+", ":", code)
+    return code.replace(";}", "}")
+
+
+def _skip_quoted(source: str, start: int) -> int:
+    """Index just past the string or regex literal opening at start."""
+    quote = source[start]
+    index = start + 1
+    in_class = False
+    while index < len(source):
+        char = source[index]
+        if char == "\\":
+            index += 2
+            continue
+        if quote == "/" and char == "[":
+            in_class = True
+        elif quote == "/" and char == "]":
+            in_class = False
+        elif char == quote and not in_class:
+            return index + 1
+        elif char == "\n" and quote != "`":
+            break  # Unterminated; leave the rest alone
+        index += 1
+    return index
+
+
+def minify_js(source: str) -> str:
+    """Drops comments, indentation and blank lines; strings, templates and regexes are kept verbatim."""
+    pieces: list[str] = []  # Alternating code and verbatim text, code at even indexes
+    code: list[str] = []
+    template_depths: list[int] = []  # Open braces inside each ${...} being scanned
+    last_code = ""
+    index = 0
+
+    def flush_code(verbatim: str) -> None:
+        pieces.append("".join(code))
+        pieces.append(verbatim)
+        code.clear()
+
+    def regex_allowed() -> bool:
+        stripped = "".join(code).rstrip() or last_code
+        if not stripped:
+            return True
+        if stripped[-1] in JS_REGEX_PRECEDERS:
+            return True
+        word = re.search(r"[\w$]+$", stripped)
+        return word is not None and word.group() in JS_REGEX_KEYWORDS
+
+    def scan_template(start: int) -> int:
+        """Scans template text from start (just inside a backtick or after a `}`); returns where code resumes."""
+        position = start
+        while position < len(source):
+            char = source[position]
+            if char == "\\":
+                position += 2
+            elif char == "`":
+                return position + 1
+            elif source.startswith("${", position):
+                template_depths.append(0)
+                return position + 2
+            else:
+                position += 1
+        return position
+
+    while index < len(source):
+        char = source[index]
+        if char in "\"'":
+            end = _skip_quoted(source, index)
+            flush_code(source[index:end])
+            last_code = "x"
+            index = end
+        elif char == "`":
+            end = scan_template(index + 1)
+            flush_code(source[index:end])
+            last_code = "x" if source[end - 1] == "`" else "{"
+            index = end
+        elif char == "}" and template_depths and template_depths[-1] == 0:
+            template_depths.pop()
+            end = scan_template(index + 1)
+            flush_code(source[index:end])
+            last_code = "x" if source[end - 1] == "`" else "{"
+            index = end
+        elif source.startswith("//", index):
+            end = source.find("\n", index)
+            index = len(source) if end < 0 else end
+        elif source.startswith("/*", index):
+            end = source.find("*/", index + 2)
+            end = len(source) if end < 0 else end + 2
+            code.append("\n" if "\n" in source[index:end] else " ")
+            index = end
+        elif char == "/" and regex_allowed():
+            end = _skip_quoted(source, index)
+            while end < len(source) and (source[end].isalnum() or source[end] == "_"):
+                end += 1  # Flags
+            flush_code(source[index:end])
+            last_code = "x"
+            index = end
+        else:
+            if template_depths and char == "{":
+                template_depths[-1] += 1
+            elif template_depths and char == "}":
+                template_depths[-1] -= 1
+            code.append(char)
+            index += 1
+    pieces.append("".join(code))
+
+    out = []
+    for position, piece in enumerate(pieces):
+        if position % 2 == 0:
+            piece = re.sub(r"[ \t\r\f\v]+", " ", piece)
+            piece = re.sub(r" ?\n[\s]*", "\n", piece)
+        out.append(piece)
+    return "".join(out).strip()
+
+
+def minify_html_text(text: str) -> str:
+    """Collapses whitespace runs between and around tags; a run with a line break stays a line break."""
+    return re.sub(r"\s+", lambda match: "\n" if "\n" in match.group() else " ", text)
+
+
+# --- Critical CSS ---
+
+def split_css_rules(css: str) -> list[tuple[str, str]]:
+    """Top-level (prelude, body) pairs of minified CSS; statements such as @import have an empty body."""
+    rules = []
+    position = 0
+    while position < len(css):
+        brace = _find_css_char(css, "{;", position)
+        if brace < 0:
+            break
+        if css[brace] == ";":
+            rules.append((css[position:brace + 1], ""))
+            position = brace + 1
+            continue
+        depth, end = 0, brace
+        while end < len(css):
+            end = _find_css_char(css, "{}", end)
+            if end < 0:
+                end = len(css)
+                break
+            depth += 1 if css[end] == "{" else -1
+            end += 1
+            if depth == 0:
+                break
+        rules.append((css[position:brace], css[brace + 1:end - 1]))
+        position = end
+    return rules
+
+
+def _find_css_char(css: str, chars: str, start: int) -> int:
+    """Next index of any of chars at or after start, outside strings; -1 if none."""
+    index = start
+    while index < len(css):
+        char = css[index]
+        if char in "\"'":
+            index = _skip_quoted(css, index)
+            continue
+        if char in chars:
+            return index
+        index += 1
+    return -1
+
+
+def selector_can_match(selector: str, page_words: set[str]) -> bool:
+    """Whether every id, class and tag a selector names occurs in the page (attributes and states are ignored)."""
+    selector = re.sub(r"\[[^\]]*\]", "", selector)
+    selector = re.sub(r"::?[\w-]+(\([^)]*\))?", "", selector)
+    return all(name.lower() in page_words for _, name in CSS_SELECTOR_TOKEN_PATTERN.findall(selector))
+
+
+def critical_css(css: str, page_words: set[str]) -> str:
+    """The rules of css that can apply to a page, keeping @media/@supports wrappers and other at-rules."""
+    out = []
+    for prelude, body in split_css_rules(css):
+        if prelude.startswith("@media") or prelude.startswith("@supports"):
+            inner = critical_css(body, page_words)
+            if inner:
+                out.append(f"{prelude}{{{inner}}}")
+        elif prelude.startswith("@"):
+            out.append(f"{prelude}{{{body}}}" if body or not prelude.endswith(";") else prelude)
+        elif any(selector_can_match(selector, page_words) for selector in prelude.split(",")):
+            out.append(f"{prelude}{{{body}}}")
+    return "".join(out)
+
+
+def page_words(*texts: str) -> set[str]:
+    return {word.lower() for text in texts for word in re.findall(r"[\w-]+", text)}
+
+
+# --- Site ---
+
+@dataclass
+class PageStats:
+    page: str
+    bytes_before: int
+    bytes_after: int
+    blocking_before: int
+    blocking_after: int
+
+
+def tag_attributes(tag: str) -> dict[str, str]:
+    return {name.lower(): value.strip("\"'") for name, value in ATTRIBUTE_PATTERN.findall(tag)}
+
+
+def list_site_files(root: Path) -> list[str]:
+    """Tracked files that are part of the deployed site."""
+    listed = subprocess.run(["git", "ls-files", "-z"], cwd=root, check=True, capture_output=True, text=True).stdout
+    return sorted(
+        path for path in filter(None, listed.split("\0"))
+        if (path.lower().endswith(SITE_SUFFIXES) or path in SITE_FILES)
+        and not path.startswith(EXCLUDED_DIRS) and path not in EXCLUDED_FILES and (root / path).is_file()
+    )
+
+
+def fingerprint(name: str, data: bytes) -> str:
+    stem, dot, suffix = name.rpartition(".")
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}.{suffix}"
+
+
+def minify_asset(name: str, data: bytes) -> bytes:
+    if name.endswith(".css"):
+        return minify_css(data.decode("utf-8")).encode("utf-8")
+    if name.endswith(".js"):
+        return minify_js(data.decode("utf-8")).encode("utf-8")
+    if name.endswith(".json"):
+        return json.dumps(json.loads(data), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return data
+
+
+def is_blocking_stylesheet(tag: str) -> bool:
+    attributes = tag_attributes(tag)
+    return tag[1:5].lower() == "link" and attributes.get("rel", "").lower() == "stylesheet"
+
+
+def dedupe_references(html: str) -> str:
+    """Keeps the last link to each stylesheet and the first <script src> of each script."""
+    stylesheets = [(match, tag_attributes(match.group())["href"]) for match in TAG_PATTERN.finditer(html)
+                   if is_blocking_stylesheet(match.group()) and "href" in tag_attributes(match.group())]
+    last_link = {href: match.start() for match, href in stylesheets}
+    drop = [(match.start(), match.end()) for match, href in stylesheets if last_link[href] != match.start()]
+
+    seen_scripts: set[str] = set()
+    for match in re.finditer(r"<script\b[^>]*\bsrc\s*=[^>]*>\s*</script\s*>", html, re.IGNORECASE):
+        src = tag_attributes(match.group()).get("src", "")
+        if src in seen_scripts:
+            drop.append((match.start(), match.end()))
+        seen_scripts.add(src)
+
+    for start, end in sorted(drop, reverse=True):
+        html = html[:start] + html[end:]
+    return html
+
+
+def minify_html(html: str) -> str:
+    out = []
+    position = 0
+    for match in RAW_SEGMENT_PATTERN.finditer(html):
+        out.append(minify_html_text(html[position:match.start()]))
+        segment = match.group()
+        tag = (match.group(1) or "").lower()
+        if not tag:
+            segment = segment if segment.startswith("<!--[if") else ""
+        elif tag in ("style", "script"):
+            open_end = segment.index(">") + 1
+            close_start = segment.lower().rindex("</")
+            opening, body, closing = segment[:open_end], segment[open_end:close_start], segment[close_start:]
+            if tag == "style":
+                body = minify_css(body)
+            elif tag_attributes(opening).get("type", "").lower() in SCRIPT_TYPES_JS:
+                body = minify_js(body)
+            segment = f"{opening}{body}{closing}"
+        out.append(segment)
+        position = match.end()
+    out.append(minify_html_text(html[position:]))
+    return "".join(out).strip() + "\n"
+
+
+class SiteBuilder:
+    def __init__(self, root: Path, out_dir: Path, inline_critical_css: bool = True):
+        self.root = root
+        self.out_dir = out_dir
+        self.inline_critical_css = inline_critical_css
+        self.files = list_site_files(root)
+        self.hashed: dict[str, str] = {}  # Site path -> fingerprinted site path
+        self.minified: dict[str, bytes] = {}
+        self.stats: list[PageStats] = []
+
+    def asset(self, path: str) -> bytes:
+        if path not in self.minified:
+            self.minified[path] = minify_asset(path, (self.root / path).read_bytes())
+        return self.minified[path]
+
+    def hashed_path(self, path: str) -> str:
+        if path not in self.hashed:
+            directory, _, name = path.rpartition("/")
+            hashed_name = fingerprint(name, self.asset(path))
+            self.hashed[path] = f"{directory}/{hashed_name}" if directory else hashed_name
+        return self.hashed[path]
+
+    def rewrite_references(self, page: str, html: str) -> str:
+        """Points local subresources at their fingerprinted copies."""
+        def rewrite_attribute(match: re.Match) -> str:
+            name, written = match.groups()
+            value = written.strip("\"'")
+            if name.lower() not in ("href", "src") or not value:
+                return match.group()
+            target = resolve_local_ref(self.root, page, value)
+            if target is None or target not in self.files or not target.lower().endswith(FINGERPRINT_SUFFIXES):
+                return match.group()
+            # Only the file name changes; the directory, query and fragment are kept as written
+            parts = urlsplit(value)
+            directory = parts.path.rpartition("/")[0]
+            hashed_name = self.hashed_path(target).rpartition("/")[2]
+            path = f"{directory}/{hashed_name}" if "/" in parts.path else hashed_name
+            quote = written[0] if written[0] in "\"'" else '"'
+            return f"{name}={quote}{urlunsplit(parts._replace(path=path))}{quote}"
+
+        return TAG_PATTERN.sub(lambda match: ATTRIBUTE_PATTERN.sub(rewrite_attribute, match.group()), html)
+
+    def inline_critical(self, page: str, html: str) -> str:
+        """Inlines the rules of the first local stylesheet that can apply and loads it without blocking."""
+        for match in TAG_PATTERN.finditer(html):
+            tag = match.group()
+            if not is_blocking_stylesheet(tag):
+                continue
+            href = tag_attributes(tag).get("href", "")
+            target = resolve_local_ref(self.root, page, href)
+            if target is None or target not in self.files:
+                continue
+            scripts = [self.asset(path).decode("utf-8") for path in self.page_scripts(page, html)]
+            critical = critical_css(self.asset(target).decode("utf-8"), page_words(html, *scripts))
+            deferred = (f'<style>{critical}</style>'
+                        f'<link rel="preload" href="{href}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">'
+                        f'<noscript>{tag}</noscript>')
+            return html[:match.start()] + deferred + html[match.end():]
+        return html
+
+    def page_scripts(self, page: str, html: str) -> list[str]:
+        scripts = []
+        for match in re.finditer(r"<script\b[^>]*>", html, re.IGNORECASE):
+            src = tag_attributes(match.group()).get("src")
+            target = resolve_local_ref(self.root, page, src) if src else None
+            if target is not None and target in self.files:
+                scripts.append(target)
+        return scripts
+
+    def build_page(self, page: str) -> bytes:
+        source = (self.root / page).read_text(encoding="utf-8")
+        html = minify_html(dedupe_references(source))
+        if self.inline_critical_css:
+            html = self.inline_critical(page, html)
+        html = self.rewrite_references(page, html)
+        self.stats.append(PageStats(
+            page, len(source.encode("utf-8")), len(html.encode("utf-8")),
+            sum(is_blocking_stylesheet(match.group()) for match in TAG_PATTERN.finditer(source)),
+            sum(is_blocking_stylesheet(match.group())
+                for match in TAG_PATTERN.finditer(re.sub(r"<noscript>.*?</noscript>", "", html, flags=re.DOTALL)))))
+        return html.encode("utf-8")
+
+    def build(self) -> None:
+        if self.out_dir.exists():
+            shutil.rmtree(self.out_dir)
+        outputs: dict[str, bytes] = {}
+        for path in self.files:
+            if path.lower().endswith(".html"):
+                outputs[path] = self.build_page(path)
+        for path in self.files:
+            if path in outputs:
+                continue
+            outputs[path] = self.asset(path) if path.lower().endswith((".css", ".js", ".json")) else \
+                (self.root / path).read_bytes()
+            if path in self.hashed:
+                outputs[self.hashed[path]] = self.asset(path)
+        for path, data in outputs.items():
+            target = self.out_dir / path
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(data)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build the minified, fingerprinted site into dist/.")
+    parser.add_argument("--out-dir", type=Path, default=DEFAULT_OUT_DIR,
+                        help=f"Output directory, replaced on every build (default: {DEFAULT_OUT_DIR.name})")
+    parser.add_argument("--no-critical-css", action="store_true",
+                        help="Keep stylesheets render-blocking instead of inlining their critical rules")
+    args = parser.parse_args()
+    if args.out_dir.resolve() == ROOT.resolve():
+        parser.error("--out-dir must not be the repository itself")
+
+    try:
+        builder = SiteBuilder(ROOT, args.out_dir, inline_critical_css=not args.no_critical_css)
+        builder.build()
+    except (OSError, ValueError, subprocess.CalledProcessError) as exc:
+        print(f"❌ Build failed: {exc}")
+        return 1
+
+    for stats in builder.stats:
+        print(f"  {stats.page}: {stats.bytes_before:,} -> {stats.bytes_after:,} bytes, "
+              f"{stats.blocking_before} -> {stats.blocking_after} blocking stylesheet(s)")
+    for path, hashed in sorted(builder.hashed.items()):
+        print(f"  {path} -> {hashed} ({(ROOT / path).stat().st_size:,} -> {len(builder.asset(path)):,} bytes)")
+    before = sum(stats.bytes_before for stats in builder.stats)
+    after = sum(stats.bytes_after for stats in builder.stats)
+    print(f"✅ Built {len(builder.files)} files into {args.out_dir} (pages: {before:,} -> {after:,} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,31 +5,71 @@ Generic screenshot generator for local PR evidence.
 Examples:
   python generate_pr_screenshots.py
   python generate_pr_screenshots.py --page index.html=home-after.png --page off-the-shelf.html
+  python generate_pr_screenshots.py --asset-mode offline --asset-cache-dir .asset-cache
+  python generate_pr_screenshots.py --deterministic
+  python generate_pr_screenshots.py --viewport 1440x1800 --viewport 390x844 --theme light --theme dark
+  python generate_pr_screenshots.py --all --base-rev origin/main --output-dir pr-screenshots/all-pages
+
+All pages are rendered in one browser session. With --viewport/--theme, every
+combination is captured: each page is loaded once per viewport, themes are
+switched with applyTheme() without reloading, and images are written to
+<output-dir>/<WIDTHxHEIGHT[-theme]>/.
+
+--all captures every top-level HTML page (test_*.html harnesses excluded) as
+<page>.png. With --base-rev, that revision and the working tree (or --head-rev)
+are captured in the same session into <output-dir>/{base,head}/ and pixel diffs
+are written to <output-dir>/diff/, the layout of pr-screenshots/all-pages.
+
+If a render daemon is running (python utils/render_service.py serve), pages are
+rendered by its warm browser and file server; otherwise, or with --no-daemon,
+a local HTTP server and browser are started for this run.
+
+Images written under pr-screenshots/ go through its content-addressed store
+(see utils/screenshot_store.py): they are recompressed losslessly, deduplicated
+and recorded in pr-screenshots/manifest.json. --no-store writes plain files.
 """
 
 from __future__ import annotations
 
 import argparse
+import asyncio
 import subprocess
 import sys
-import time
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).parent / "utils"))
+
+from change_analysis import RevisionExports, default_export_cache_dir  # noqa: E402
+from deterministic_render import DEFAULT_FROZEN_TIME, DEFAULT_READY_CONDITION, RenderSettings, parse_frozen_time  # noqa: E402
+from offline_assets import ASSET_MODES, OfflineAssets  # noqa: E402
+from render_service import (  # noqa: E402
+    DEFAULT_CONCURRENCY,
+    THEMES,
+    DaemonRenderer,
+    LocalRenderer,
+    RenderJob,
+    Variant,
+    build_matrix,
+    connect_renderer,
+    parse_viewport,
+)
+from screenshot_store import store_outputs  # noqa: E402
+
+# Pages that are test harnesses rather than site pages
+EXCLUDED_PAGE_PREFIXES = ("test_",)
 
-def start_http_server(port: int, cwd: Path) -> subprocess.Popen[bytes]:
-    process = subprocess.Popen(
-        [sys.executable, "-m", "http.server", str(port)],
-        cwd=str(cwd),
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
+
+def discover_pages(names: list[str]) -> list[str]:
+    """The top-level HTML pages among site-relative file names, sorted."""
+    return sorted(
+        name for name in names
+        if "/" not in name and name.endswith(".html") and not name.startswith(EXCLUDED_PAGE_PREFIXES)
     )
-    time.sleep(1.5)
-    if process.poll() is not None:
-        raise RuntimeError(
-            f"Failed to start HTTP server on port {port}. "
-            "Ensure the port is free and try again."
-        )
-    return process
+
+
+def all_page_targets(names: list[str]) -> list[tuple[str, str]]:
+    """--all targets: every page, saved as <page>.png."""
+    return [(page, f"{page}.png") for page in discover_pages(names)]
 
 
 def parse_page_specs(page_specs: list[str]) -> list[tuple[str, str]]:
@@ -48,67 +88,182 @@ def parse_page_specs(page_specs: list[str]) -> list[tuple[str, str]]:
     return targets
 
 
-def capture_screenshot(url: str, output_path: Path, full_page: bool, viewport_width: int, viewport_height: int) -> bool:
-    try:
-        from playwright.sync_api import sync_playwright
-    except ImportError:
-        print("❌ Playwright not installed. Run: pip install playwright; python -m playwright install chromium")
-        return False
+async def render_jobs(renderer: LocalRenderer | DaemonRenderer, jobs: list[RenderJob]) -> bool:
+    async with renderer:
+        errors = await asyncio.gather(*(renderer.screenshot(job) for job in jobs))
+    all_ok = True
+    for job, error in zip(jobs, errors):
+        for output_path in job.outputs:
+            if error is None:
+                print(f"✅ Saved: {output_path}")
+            else:
+                print(f"❌ Failed screenshot for {job.page} ({output_path}): {error}")
+                all_ok = False
+    return all_ok
 
-    output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    try:
-        with sync_playwright() as playwright:
-            browser = playwright.chromium.launch()
-            page = browser.new_page(
-                viewport={"width": viewport_width, "height": viewport_height}
-            )
-            page.goto(url, wait_until="networkidle")
-            page.screenshot(path=str(output_path), full_page=full_page)
-            browser.close()
-        print(f"✅ Saved: {output_path}")
-        return True
-    except (OSError, RuntimeError, ValueError) as exc:
-        print(f"❌ Failed screenshot for {url}: {exc}")
-        return False
+def build_jobs(
+    site_dir: Path,
+    output_dir: Path,
+    targets: list[tuple[str, str]],
+    full_page: bool,
+    variants: list[Variant],
+    variant_dirs: bool,
+    side: str = "",
+) -> tuple[list[RenderJob], list[str]]:
+    """One job per page and viewport of site_dir, plus the pages site_dir lacks.
+
+    Images go to output_dir[/<variant>][/<side>]/<name>.
+    """
+    by_viewport: dict[tuple[int, int], list[Variant]] = {}
+    for variant in variants:
+        by_viewport.setdefault((variant.width, variant.height), []).append(variant)
+
+    jobs: list[RenderJob] = []
+    missing: list[str] = []
+    for page, output_name in targets:
+        if not (site_dir / page).exists():
+            missing.append(page)
+            continue
+        for group in by_viewport.values():
+            outputs = [
+                (output_dir / variant.name if variant_dirs else output_dir) / side / output_name
+                for variant in group
+            ]
+            jobs.append(RenderJob(site_dir, page, outputs, group[0].viewport, full_page,
+                                  [variant.theme for variant in group]))
+    return jobs, missing
+
+
+def write_diffs(
+    output_dir: Path,
+    targets: list[tuple[str, str]],
+    variants: list[Variant],
+    variant_dirs: bool,
+) -> tuple[list[Path], list[Path]]:
+    """Writes <diff>/<name> for every target captured on both sides and prints the changed share.
+
+    A target's previous diff image is deleted first, so a page that no longer
+    changes does not keep an old one. Returns the diff images written (pages
+    without changes get none) and the stale ones removed.
+    """
+    from compare_ui_screenshots import compute_diff
+
+    written: list[Path] = []
+    removed: list[Path] = []
+    for variant in variants:
+        variant_dir = output_dir / variant.name if variant_dirs else output_dir
+        for page, output_name in targets:
+            base_img = variant_dir / "base" / output_name
+            head_img = variant_dir / "head" / output_name
+            if not base_img.exists() or not head_img.exists():
+                continue
+            diff_img = variant_dir / "diff" / output_name
+            had_diff = diff_img.exists()
+            diff_img.unlink(missing_ok=True)
+            pixel_diff = compute_diff(base_img, head_img, diff_img)
+            if pixel_diff.diff_percent > 0:
+                written.append(diff_img)
+            elif had_diff:
+                removed.append(diff_img)
+            label = f"{page} [{variant.name}]" if variant_dirs else page
+            icon = "🟡" if pixel_diff.diff_percent > 0 else "✅"
+            print(f"{icon} {label}: {pixel_diff.diff_percent:.3f}% changed ({pixel_diff.size_note})")
+    return written, removed
 
 
 def generate_screenshots(
     port: int,
     output_dir: Path,
-    targets: list[tuple[str, str]],
+    targets: list[tuple[str, str]] | None,
     full_page: bool,
-    viewport_width: int,
-    viewport_height: int,
+    variants: list[Variant],
+    assets: OfflineAssets | None = None,
+    render: RenderSettings | None = None,
+    use_daemon: bool = True,
+    variant_dirs: bool = False,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    base_rev: str | None = None,
+    head_rev: str | None = None,
+    use_store: bool = True,
 ) -> bool:
+    """Renders every target in every variant from one browser session, concurrently.
+
+    Each page is loaded once per viewport. With variant_dirs, images go to
+    output_dir/<variant>/, otherwise to output_dir (a single variant). With
+    base_rev, the base revision and the head (head_rev, or the working tree)
+    are both captured into base/ and head/ and compared into diff/. Without
+    targets, every page of the head site is captured as <page>.png. Images
+    under a screenshot store (pr-screenshots/) are written through it.
+    """
     repo_root = Path(__file__).parent
-    server = start_http_server(port=port, cwd=repo_root)
-    try:
-        base_url = f"http://127.0.0.1:{port}"
-        all_ok = True
-        for page, output_name in targets:
-            page_path = repo_root / page
-            if not page_path.exists():
+    all_ok = True
+    sites: list[tuple[str, Path]] = [("", repo_root)]
+    if targets is None and not head_rev:
+        targets = all_page_targets([path.name for path in repo_root.iterdir()])
+    if base_rev:
+        try:
+            # Only the captured pages and what they reference are exported, cached per tree
+            exports = RevisionExports(default_export_cache_dir())
+            if targets is None:
+                targets = all_page_targets(exports.list_files(head_rev))
+            pages = [page for page, _ in targets]
+            sites = [("base", exports.export_pages(base_rev, pages)),
+                     ("head", exports.export_pages(head_rev, pages) if head_rev else repo_root)]
+            exports.prune()
+        except subprocess.CalledProcessError as exc:
+            print(f"❌ Failed to export git revision: {exc.stderr or exc}")
+            return False
+    print(f"Capturing {len(targets)} page(s)")
+
+    jobs: list[RenderJob] = []
+    for side, site_dir in sites:
+        side_jobs, missing = build_jobs(site_dir, output_dir, targets, full_page, variants, variant_dirs, side)
+        jobs.extend(side_jobs)
+        for page in missing:
+            if side == "base":
+                print(f"⚠️  {page} does not exist in {base_rev}; no base screenshot")
+            else:
                 print(f"❌ Page not found: {page}")
                 all_ok = False
-                continue
-            target_path = output_dir / output_name
-            ok = capture_screenshot(
-                f"{base_url}/{page}",
-                target_path,
-                full_page=full_page,
-                viewport_width=viewport_width,
-                viewport_height=viewport_height,
-            )
-            all_ok = all_ok and ok
-
-        if all_ok:
-            print(
-                f"\n✅ Screenshot generation complete. Output dir: {output_dir}")
-        return all_ok
-    finally:
-        server.terminate()
-        server.wait()
+
+    renderer = connect_renderer(concurrency, assets, render, use_daemon=use_daemon, ports={repo_root: port})
+    startup_errors: tuple[type[Exception], ...] = (OSError,)
+    if isinstance(renderer, DaemonRenderer):
+        print(f"Rendering with the render daemon at {renderer.address[0]}:{renderer.address[1]}")
+    else:
+        try:
+            from playwright.async_api import Error as PlaywrightError
+        except ImportError:
+            print("❌ Playwright not installed. Run: pip install playwright; python -m playwright install chromium")
+            return False
+        startup_errors = (OSError, PlaywrightError)
+    try:
+        all_ok = asyncio.run(render_jobs(renderer, jobs)) and all_ok
+    except startup_errors as exc:
+        print(f"❌ Failed to start rendering (is port {port} free?): {exc}")
+        return False
+
+    written = [path for job in jobs for path in job.outputs]
+    removed: list[Path] = []
+    if base_rev:
+        diffs, removed = write_diffs(output_dir, targets, variants, variant_dirs)
+        written += diffs
+        for path in removed:
+            print(f"🗑️  Removed stale diff {path}")
+
+    if use_store:
+        stored = store_outputs(written, removed)
+        if stored:
+            print(stored)
+
+    if assets is not None:
+        print(assets.summary())
+
+    if all_ok:
+        print(
+            f"\n✅ Screenshot generation complete. Output dir: {output_dir}")
+    return all_ok
 
 
 def main() -> int:
@@ -124,23 +279,72 @@ def main() -> int:
         default=[],
         help="Page spec: path.html or path.html=filename.png (can repeat)",
     )
+    parser.add_argument("--all", action="store_true",
+                        help="Capture every top-level HTML page as <page>.png (test_*.html excluded)")
+    parser.add_argument("--base-rev", default=None,
+                        help="Also capture this git revision and write base/, head/ and diff/ under --output-dir")
+    parser.add_argument("--head-rev", default=None,
+                        help="Git revision for head/ with --base-rev (default: the working tree)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Pages rendered at once (default: {DEFAULT_CONCURRENCY})")
     parser.add_argument("--no-full-page", action="store_true",
                         help="Disable full-page screenshots")
     parser.add_argument("--viewport-width", type=int, default=1440,
                         help="Viewport width in pixels (default: 1440)")
     parser.add_argument("--viewport-height", type=int, default=1800,
                         help="Viewport height in pixels (default: 1800)")
+    parser.add_argument("--viewport", type=parse_viewport, action="append", default=[],
+                        help="Viewport as WIDTHxHEIGHT (can repeat; replaces --viewport-width/--viewport-height)")
+    parser.add_argument("--theme", choices=THEMES, action="append", default=[],
+                        help="Render in this theme via applyTheme (can repeat; default: each page's own)")
+    parser.add_argument("--asset-mode", choices=ASSET_MODES, default="live",
+                        help="live: fetch external assets; record: fetch and cache them; "
+                             "offline: serve them from the cache and block the rest (default: live)")
+    parser.add_argument("--asset-cache-dir", default=None,
+                        help="Directory of cached external assets (required for record/offline)")
+    parser.add_argument("--deterministic", action="store_true",
+                        help="Freeze the clock, pause intervals/animations and wait on --ready-condition")
+    parser.add_argument("--frozen-time", default=DEFAULT_FROZEN_TIME,
+                        help=f"Instant the clock is frozen at in deterministic mode (default: {DEFAULT_FROZEN_TIME})")
+    parser.add_argument("--ready-condition", default=DEFAULT_READY_CONDITION,
+                        help="JavaScript expression that is true once a page is ready to capture")
+    parser.add_argument("--no-daemon", action="store_true",
+                        help="Render in this process even when a render daemon is running")
+    parser.add_argument("--no-store", action="store_true",
+                        help="Do not write images under pr-screenshots/ through its content-addressed store")
     args = parser.parse_args()
+    if args.all and args.page:
+        parser.error("--all and --page are mutually exclusive")
+    if args.head_rev and not args.base_rev:
+        parser.error("--head-rev needs --base-rev")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.asset_mode != "live" and not args.asset_cache_dir:
+        parser.error(f"--asset-mode {args.asset_mode} needs --asset-cache-dir")
+    try:
+        parse_frozen_time(args.frozen_time)
+    except ValueError:
+        parser.error(f"--frozen-time '{args.frozen_time}' is not an ISO 8601 date/time")
+    render = RenderSettings(args.deterministic, args.frozen_time, args.ready_condition)
+
+    variants = build_matrix(args.viewport or [(args.viewport_width, args.viewport_height)], args.theme)
 
-    targets = parse_page_specs(args.page)
+    targets = None if args.all else parse_page_specs(args.page)
     output_dir = Path(args.output_dir)
     ok = generate_screenshots(
         port=args.port,
         output_dir=output_dir,
         targets=targets,
         full_page=not args.no_full_page,
-        viewport_width=args.viewport_width,
-        viewport_height=args.viewport_height,
+        variants=variants,
+        assets=OfflineAssets(Path(args.asset_cache_dir), args.asset_mode) if args.asset_mode != "live" else None,
+        render=render,
+        use_daemon=not args.no_daemon,
+        variant_dirs=variants != [Variant(args.viewport_width, args.viewport_height)],
+        concurrency=args.concurrency,
+        base_rev=args.base_rev,
+        head_rev=args.head_rev,
+        use_store=not args.no_store,
     )
     return 0 if ok else 1
 
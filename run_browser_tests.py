@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Headless runner for the in-browser test pages (test_ledger.html, test_compliance_tracker.html).
+
+Both pages are served by a local static server and loaded in one headless
+Chromium, each in its own browser context, concurrently. Results are not
+scraped from the DOM: before a page loads, two functions are exposed to it,
+which the pages call when they are present:
+
+- __reportTestResult(name, passed, error, ms), from displayResult()
+- __reportTestsDone(total), after the last test
+
+Each page is reported like a validator, with per-test and per-page timings.
+A page that does not finish within --timeout counts as failed.
+
+Examples:
+  python run_browser_tests.py
+  python run_browser_tests.py --page test_ledger.html
+  python run_browser_tests.py --asset-mode offline --asset-cache-dir .asset-cache
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "utils"))
+
+from offline_assets import ASSET_MODES, OfflineAssets  # noqa: E402
+from render_service import BrowserPool, LocalServer  # noqa: E402
+
+TEST_PAGES = ("test_ledger.html", "test_compliance_tracker.html")
+DEFAULT_TIMEOUT_SECONDS = 30.0
+
+
+@dataclass
+class TestOutcome:
+    name: str
+    passed: bool
+    error: str
+    ms: float
+
+
+@dataclass
+class PageRun:
+    page: str
+    outcomes: list[TestOutcome] = field(default_factory=list)
+    expected: int | None = None  # Test count the page announced when it finished
+    seconds: float = 0.0
+    error: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return (not self.error and self.expected == len(self.outcomes)
+                and all(outcome.passed for outcome in self.outcomes))
+
+
+async def run_page(pool: BrowserPool, base_url: str, page_name: str, timeout: float) -> PageRun:
+    run = PageRun(page_name)
+    done = asyncio.Event()
+
+    def report_result(name: str, passed: bool, error: str, ms: float) -> None:
+        run.outcomes.append(TestOutcome(name, bool(passed), error, float(ms)))
+
+    def report_done(total: int) -> None:
+        run.expected = int(total)
+        done.set()
+
+    async def setup(context) -> None:
+        await context.expose_function("__reportTestResult", report_result)
+        await context.expose_function("__reportTestsDone", report_done)
+
+    async def wait_for_tests(page) -> None:
+        await asyncio.wait_for(done.wait(), timeout)
+
+    started = time.perf_counter()
+    error = await pool.visit(f"{base_url}/{page_name}", wait_for_tests, setup=setup)
+    run.seconds = time.perf_counter() - started
+    if isinstance(error, TimeoutError):
+        run.error = f"tests did not finish within {timeout:g}s ({len(run.outcomes)} reported)"
+    elif error is not None:
+        run.error = str(error)
+    return run
+
+
+async def run_pages(pages: list[str], port: int, timeout: float, assets: OfflineAssets | None) -> list[PageRun]:
+    with LocalServer(Path(__file__).parent, port) as server:
+        async with BrowserPool(concurrency=len(pages), assets=assets) as pool:
+            base_url = f"http://127.0.0.1:{server.port}"
+            return list(await asyncio.gather(*(run_page(pool, base_url, page, timeout) for page in pages)))
+
+
+def print_run(run: PageRun) -> None:
+    print(f"🧪 {run.page}")
+    for outcome in run.outcomes:
+        icon = "✓" if outcome.passed else "✗"
+        detail = f" - {outcome.error}" if outcome.error else ""
+        print(f"  {icon} {outcome.name} ({outcome.ms:.0f} ms){detail}")
+    passed = sum(outcome.passed for outcome in run.outcomes)
+    if run.error:
+        print(f"❌ {run.page}: {run.error}")
+    elif run.expected != len(run.outcomes):
+        print(f"❌ {run.page}: {len(run.outcomes)} of {run.expected} tests reported a result")
+    elif run.ok:
+        print(f"✅ {run.page}: {passed}/{len(run.outcomes)} passed in {run.seconds:.2f}s")
+    else:
+        print(f"❌ {run.page}: {len(run.outcomes) - passed} of {len(run.outcomes)} failed in {run.seconds:.2f}s")
+    print()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run the in-browser test pages headless.")
+    parser.add_argument("--page", action="append", choices=TEST_PAGES, default=[],
+                        help="Test page to run (can repeat; default: all)")
+    parser.add_argument("--port", type=int, default=0,
+                        help="Local HTTP server port (default: any free port)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT_SECONDS,
+                        help=f"Seconds a page may take to finish its tests (default: {DEFAULT_TIMEOUT_SECONDS:g})")
+    parser.add_argument("--asset-mode", choices=ASSET_MODES, default="live",
+                        help="live: fetch external assets; record: fetch and cache them; "
+                             "offline: serve them from the cache and block the rest (default: live)")
+    parser.add_argument("--asset-cache-dir", default=None,
+                        help="Directory of cached external assets (required for record/offline)")
+    args = parser.parse_args()
+    if args.asset_mode != "live" and not args.asset_cache_dir:
+        parser.error(f"--asset-mode {args.asset_mode} needs --asset-cache-dir")
+    assets = OfflineAssets(Path(args.asset_cache_dir), args.asset_mode) if args.asset_mode != "live" else None
+
+    try:
+        from playwright.async_api import Error as PlaywrightError
+    except ImportError:
+        print("❌ Playwright not installed. Run: pip install playwright; python -m playwright install chromium")
+        return 1
+
+    started = time.perf_counter()
+    try:
+        runs = asyncio.run(run_pages(args.page or list(TEST_PAGES), args.port, args.timeout, assets))
+    except (OSError, PlaywrightError) as exc:
+        print(f"❌ Failed to start the browser tests: {exc}")
+        return 1
+
+    for run in runs:
+        print_run(run)
+    if assets is not None:
+        print(assets.summary())
+    failed = [run.page for run in runs if not run.ok]
+    if failed:
+        print(f"❌ Browser tests failed: {', '.join(failed)} ({time.perf_counter() - started:.2f}s)")
+        return 1
+    print(f"✅ All browser tests passed ({time.perf_counter() - started:.2f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,607 @@
+"""
+Change analysis for PR checks: which files changed, and which jobs have work.
+
+One pass, run once per PR, answers what the CI jobs used to each work out for
+themselves (and the validators never did):
+
+- changed_files: git diff --name-only base...head
+- ui_files: the UI-facing files among them (the screenshot policy's trigger)
+- affected_pages: comparable pages whose rendering inputs changed, with the
+  changed files responsible. A page counts when it changed itself or, in either
+  revision, references a changed local asset or fetches changed data (found
+  from the pages, their stylesheets and scripts, which are all that is
+  exported for this).
+- validators: the validator commands whose inputs changed. A root
+  validate_*.py missing from VALIDATORS has no known inputs, so while one
+  exists every validator (it included) runs.
+
+The result is written to a JSON artifact (change-analysis.json) that the other
+jobs download: check_pr_ui_screenshots.py and compare_ui_screenshots.py read it
+with --analysis instead of diffing again, and `run-validators` runs just the
+validators it lists. With --github-output, per-job flags are also written to
+$GITHUB_OUTPUT so jobs without work are skipped.
+
+Examples:
+  python utils/change_analysis.py analyze --base-sha A --head-sha B --output change-analysis.json
+  python utils/change_analysis.py run-validators --analysis change-analysis.json
+  python utils/change_analysis.py run-validators --all
+  python utils/change_analysis.py check-export --page archive/plotly_stats.html
+"""
+
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from dataclasses import asdict, dataclass, field
+from html.parser import HTMLParser
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+
+UI_FILE_PATTERNS = (
+    ".html",
+    ".css",
+    ".scss",
+    ".sass",
+    ".jsx",
+    ".tsx",
+)
+
+UI_EXCLUDE_PATTERNS = (
+    "test_",
+    "TESTING.md",
+)
+
+# Files that can change how a page renders when a page references or fetches them
+RENDER_INPUT_PATTERNS = UI_FILE_PATTERNS + (
+    ".js",
+    ".mjs",
+    ".json",
+    ".csv",
+    ".txt",
+    ".png",
+    ".jpg",
+    ".jpeg",
+    ".gif",
+    ".svg",
+    ".webp",
+    ".ico",
+    ".woff",
+    ".woff2",
+    ".ttf",
+    ".otf",
+)
+
+ASSET_ATTRIBUTES = {
+    "link": "href",
+    "script": "src",
+    "img": "src",
+    "source": "src",
+    "iframe": "src",
+}
+
+CSS_URL_PATTERN = re.compile(r"url\(\s*['\"]?([^'\")]+)['\"]?\s*\)")
+# The bare string form of @import ("@import 'x.css';"); the url() form matches CSS_URL_PATTERN
+CSS_IMPORT_PATTERN = re.compile(r"@import\s+['\"]([^'\"]+)['\"]")
+# Quoted paths in page and script text that look like data fetched at runtime (fetch('stats.json'))
+RUNTIME_REF_PATTERN = re.compile(r"[\"']([^\"'\s<>()]+\.(?:json|csv|txt|svg|png|jpe?g|gif|webp))[\"']", re.IGNORECASE)
+EXPORT_CACHE_LIMIT = 8  # Tree directories kept in the export cache
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+ANALYSIS_VERSION = 1
+DEFAULT_ANALYSIS_PATH = "change-analysis.json"
+
+# Validator command -> the files it reads (fnmatch patterns); its own script counts too
+VALIDATORS = {
+    "validate_ledger.py": ("ledger.html", "ledger_entities.json", "notices_extracted.json", "build_ledger.py"),
+    "validate_compliance_tracker.py": ("compliance-tracker.html",),
+    "validate_mandates.py": ("mandates.html",),
+    "validate_anchors.py": ("*.html",),
+    "validate_off_the_shelf.py": ("off-the-shelf.html", "theme.css", "theme.js"),
+    "validate_workrave_arrays.py": ("utils/workrave_arrays.py", "utils/convert_workrave.py", "utils/samples/*"),
+    "validate_page_weight.py": ("*.html", "*.css", "*.js", "archive/*", "page_budgets.json"),
+    "utils/screenshot_store.py verify": ("pr-screenshots/*",),
+    "utils/change_analysis.py check-export": ("*.html", "*.js", "archive/*"),
+    "run_browser_tests.py": ("test_ledger.html", "test_compliance_tracker.html", "ledger.html",
+                             "compliance-tracker.html", "theme.css", "theme.js", "utils/render_service.py"),
+}
+BROWSER_VALIDATORS = ("run_browser_tests.py",)  # Need Playwright and Chromium installed
+# Changing these can change what any check does, so every validator runs
+RUN_ALL_INPUTS = (".github/workflows/pr-checks.yml", "utils/change_analysis.py")
+# What build_site.py turns into dist/, whose pages are checked against their budgets as built
+SITE_BUILD_INPUTS = ("*.html", "*.css", "*.js", "build_site.py", "page_budgets.json", "validate_page_weight.py")
+
+
+def run_git_diff(base_sha: str, head_sha: str) -> list[str]:
+    cmd = ["git", "diff", "--name-only", f"{base_sha}...{head_sha}"]
+    result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    return [line.strip() for line in result.stdout.splitlines() if line.strip()]
+
+
+def is_ui_file(path: str) -> bool:
+    lower = path.lower()
+    if not lower.endswith(UI_FILE_PATTERNS):
+        return False
+    return not any(excluded.lower() in lower for excluded in UI_EXCLUDE_PATTERNS)
+
+
+def is_comparable_html(path: str) -> bool:
+    lower = path.lower()
+    return lower.endswith(".html") and not any(excluded.lower() in lower for excluded in UI_EXCLUDE_PATTERNS)
+
+
+def is_render_input(path: str) -> bool:
+    lower = path.lower()
+    if not lower.endswith(RENDER_INPUT_PATTERNS):
+        return False
+    return not any(excluded.lower() in lower for excluded in UI_EXCLUDE_PATTERNS)
+
+
+class _AssetRefParser(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__()
+        self.refs: list[str] = []
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        attribute = ASSET_ATTRIBUTES.get(tag)
+        for name, value in attrs:
+            if name == attribute and value:
+                self.refs.append(value)
+
+
+def resolve_local_ref(site_dir: Path, from_file: str, ref: str) -> str | None:
+    """Returns the site-relative path a reference points to, or None for external/data URLs."""
+    parts = urlsplit(ref.strip())
+    if parts.scheme or parts.netloc or not parts.path:
+        return None
+    path = unquote(parts.path)
+    if path.startswith("/"):
+        target = site_dir / path.lstrip("/")
+    else:
+        target = (site_dir / from_file).parent / path
+    try:
+        return target.resolve().relative_to(site_dir.resolve()).as_posix()
+    except ValueError:
+        return None  # Points outside the site
+
+
+def css_refs(css: str) -> list[str]:
+    """url() targets and bare @import strings in a stylesheet."""
+    return [*CSS_URL_PATTERN.findall(css), *CSS_IMPORT_PATTERN.findall(css)]
+
+
+def find_local_assets(site_dir: Path, page: str) -> list[str]:
+    """Local files a page references directly, plus what its local stylesheets (and their @imports) load."""
+    parser = _AssetRefParser()
+    parser.feed((site_dir / page).read_text(encoding="utf-8", errors="replace"))
+    assets: set[str] = set()
+    pending = [(page, ref) for ref in parser.refs]
+    while pending:
+        referrer, ref = pending.pop()
+        asset = resolve_local_ref(site_dir, referrer, ref)
+        if asset is None or asset in assets:
+            continue
+        assets.add(asset)
+        asset_path = site_dir / asset
+        if asset.lower().endswith(".css") and asset_path.is_file():
+            css = asset_path.read_text(encoding="utf-8", errors="replace")
+            pending.extend((asset, css_ref) for css_ref in css_refs(css))
+    return sorted(assets)
+
+
+def build_dependency_graph(site_dir: Path, site_files: list[str] | None = None) -> dict[str, list[str]]:
+    """Maps every comparable page in an exported revision to the local files it loads.
+
+    That is its local assets plus the data its page or scripts fetch at runtime
+    (see find_runtime_refs(), which site_files is passed on to).
+    """
+    graph: dict[str, list[str]] = {}
+    for path in sorted(site_dir.rglob("*.html")):
+        page = path.relative_to(site_dir).as_posix()
+        if is_comparable_html(page) and not any(part.startswith(".") for part in Path(page).parts):
+            assets = find_local_assets(site_dir, page)
+            graph[page] = sorted({*assets, *find_runtime_refs(site_dir, page, assets, site_files)})
+    return graph
+
+
+def find_affected_pages(base_dir: Path, head_dir: Path, changed_files: list[str],
+                        base_files: list[str] | None = None,
+                        head_files: list[str] | None = None) -> dict[str, list[str]]:
+    """Pages whose rendering inputs changed, mapped to the changed files responsible.
+
+    Both revisions' graphs are checked, so adding or removing a reference to a
+    changed asset counts as well as editing it. base_files/head_files list the
+    revisions' files when the directories are sparse exports.
+    """
+    changed = set(changed_files)
+    affected: dict[str, list[str]] = {}
+    for site_dir, site_files in ((base_dir, base_files), (head_dir, head_files)):
+        for page, assets in build_dependency_graph(site_dir, site_files).items():
+            causes = ([page] if page in changed else []) + [asset for asset in assets if asset in changed]
+            if causes:
+                page_causes = affected.setdefault(page, [])
+                page_causes.extend(cause for cause in causes if cause not in page_causes)
+    return dict(sorted(affected.items()))
+
+
+def find_data_siblings(site_dir: Path, ref: str, site_files: list[str] | None = None) -> list[str]:
+    """Files named <stem>.*<suffix> next to a data file: names scripts derive from it (.rollups.json, shards)."""
+    directory, _, name = ref.rpartition("/")
+    stem, dot, suffix = name.partition(".")
+    if not stem or not dot:
+        return []
+    pattern = f"{directory}/{stem}.*.{suffix}" if directory else f"{stem}.*.{suffix}"
+    if site_files is None:
+        candidates = [path.relative_to(site_dir).as_posix()
+                      for path in (site_dir / directory).glob(f"{stem}.*.{suffix}") if path.is_file()]
+    else:
+        candidates = site_files
+    return sorted(path for path in candidates
+                  if fnmatch.fnmatchcase(path, pattern) and path.count("/") == ref.count("/") and path != ref)
+
+
+def find_runtime_refs(site_dir: Path, page: str, assets: list[str], site_files: list[str] | None = None) -> list[str]:
+    """Site files named in the page's or its scripts' text, resolved against the page like fetch() would.
+
+    Each data file also brings its <stem>.*<suffix> siblings, since scripts
+    derive those names from it (url.replace(/\\.json$/, '.rollups.json'), shard
+    files listed in a manifest). Suffix literals such as '.rollups.json' are
+    not names of their own and are skipped. site_files lists what exists when
+    site_dir is a sparse export; by default siblings are looked up on disk.
+    """
+    refs: set[str] = set()
+    for name in [page, *(asset for asset in assets if asset.lower().endswith(".js"))]:
+        path = site_dir / name
+        if not path.is_file():
+            continue
+        for ref in RUNTIME_REF_PATTERN.findall(path.read_text(encoding="utf-8", errors="replace")):
+            if ref.rpartition("/")[2].startswith("."):
+                continue
+            resolved = resolve_local_ref(site_dir, page, ref)
+            if resolved is not None:
+                refs.add(resolved)
+                refs.update(find_data_siblings(site_dir, resolved, site_files))
+    return sorted(refs)
+
+
+def default_export_cache_dir() -> Path:
+    """<git common dir>/ui-diff-exports, shared by every worktree of the repository."""
+    result = subprocess.run(["git", "rev-parse", "--path-format=absolute", "--git-common-dir"],
+                            check=True, capture_output=True, text=True)
+    return Path(result.stdout.strip()) / "ui-diff-exports"
+
+
+class RevisionExports:
+    """Sparse exports of git revisions, one directory per tree SHA, filled on demand.
+
+    Only the files asked for are written, read from a single `git cat-file --batch`
+    per call. A tree's contents never change, so its directory is reused by later
+    runs against the same revision; files are written atomically, so whatever
+    exists is complete.
+    """
+
+    def __init__(self, cache_dir: Path, limit: int = EXPORT_CACHE_LIMIT):
+        self.cache_dir = cache_dir
+        self.limit = limit
+        self.written = 0
+        self.reused = 0
+        self._handled: set[tuple[str, str]] = set()
+        self._trees: dict[str, tuple[str, dict[str, tuple[str, str]]]] = {}
+
+    def _tree(self, revision: str) -> tuple[str, dict[str, tuple[str, str]]]:
+        """(tree SHA, path -> (mode, blob SHA)) for a revision."""
+        if revision not in self._trees:
+            tree = subprocess.run(["git", "rev-parse", "--verify", f"{revision}^{{tree}}"],
+                                  check=True, capture_output=True, text=True).stdout.strip()
+            listing = subprocess.run(["git", "ls-tree", "-r", "-z", "--full-tree", tree],
+                                     check=True, capture_output=True, text=True).stdout
+            files = {}
+            for entry in filter(None, listing.split("\0")):
+                meta, path = entry.split("\t", 1)
+                mode, kind, sha = meta.split()
+                if kind == "blob":
+                    files[path] = (mode, sha)
+            self._trees[revision] = (tree, files)
+        return self._trees[revision]
+
+    def list_files(self, revision: str) -> list[str]:
+        return sorted(self._tree(revision)[1])
+
+    def site_dir(self, revision: str) -> Path:
+        return self.cache_dir / self._tree(revision)[0]
+
+    def ensure(self, revision: str, paths: list[str]) -> Path:
+        """Writes the given paths of revision that are not exported yet; returns the export directory."""
+        tree, files = self._tree(revision)
+        site_dir = self.cache_dir / tree
+        site_dir.mkdir(parents=True, exist_ok=True)
+        os.utime(site_dir)  # Marks the tree as recently used for prune()
+        wanted: dict[str, list[str]] = {}
+        for path in dict.fromkeys(paths):
+            if path not in files or (tree, path) in self._handled:
+                continue
+            self._handled.add((tree, path))
+            if os.path.lexists(site_dir / path):
+                self.reused += 1
+            else:
+                wanted.setdefault(files[path][1], []).append(path)
+        if not wanted:
+            return site_dir
+
+        batch = subprocess.run(["git", "cat-file", "--batch"], input="".join(f"{sha}\n" for sha in wanted).encode(),
+                               check=True, capture_output=True)
+        output, offset = batch.stdout, 0
+        for sha, targets in wanted.items():
+            header_end = output.index(b"\n", offset)
+            header = output[offset:header_end].decode().split()
+            if len(header) != 3:
+                raise subprocess.CalledProcessError(1, ["git", "cat-file", "--batch"], stderr=f"{sha} missing")
+            size = int(header[2])
+            data = output[header_end + 1:header_end + 1 + size]
+            offset = header_end + 1 + size + 1
+            for path in targets:
+                target = site_dir / path
+                target.parent.mkdir(parents=True, exist_ok=True)
+                temp_path = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+                if files[path][0] == "120000":
+                    os.symlink(data.decode(), temp_path)
+                else:
+                    temp_path.write_bytes(data)
+                    if files[path][0] == "100755":
+                        temp_path.chmod(0o755)
+                os.replace(temp_path, target)
+                self.written += 1
+        return site_dir
+
+    def export_pages(self, revision: str, pages: list[str]) -> Path:
+        """Exports pages with everything they reference: assets, url() targets and runtime data."""
+        site_dir = self.ensure(revision, pages)
+        pages = [page for page in pages if (site_dir / page).is_file()]
+        # Stylesheets first, then what their url()s and the scripts reference
+        self.ensure(revision, [asset for page in pages for asset in find_local_assets(site_dir, page)])
+        needed = []
+        for page in pages:
+            assets = find_local_assets(site_dir, page)
+            needed += assets + find_runtime_refs(site_dir, page, assets, self.list_files(revision))
+        self.ensure(revision, needed)
+        return site_dir
+
+    def export_graph_inputs(self, revision: str, pages: list[str]) -> Path:
+        """Exports pages with their stylesheets and scripts: all build_dependency_graph() reads."""
+        site_dir = self.ensure(revision, pages)
+        self.ensure(revision, [
+            asset for page in pages if (site_dir / page).is_file()
+            for asset in find_local_assets(site_dir, page) if asset.lower().endswith((".css", ".js", ".mjs"))])
+        return site_dir
+
+    def prune(self) -> None:
+        """Keeps the most recently used tree directories."""
+        if not self.cache_dir.is_dir():
+            return
+        trees = sorted((path for path in self.cache_dir.iterdir() if path.is_dir()),
+                       key=lambda path: path.stat().st_mtime, reverse=True)
+        for stale in trees[self.limit:]:
+            shutil.rmtree(stale, ignore_errors=True)
+
+    def summary(self) -> str:
+        return f"Revision exports: {self.written} file(s) written, {self.reused} reused from {self.cache_dir}"
+
+
+def check_exports(revision: str, pages: list[str]) -> list[str]:
+    """Problems with sparse exports of pages at revision: files the checkout's pages load that are missing or differ.
+
+    Files with local changes against revision are not compared, so this is
+    exact on a clean checkout (as in CI) and best effort otherwise.
+    """
+    modified = set(subprocess.run(["git", "diff", "--name-only", revision], cwd=REPO_ROOT,
+                                  check=True, capture_output=True, text=True).stdout.split())
+    issues = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        exports = RevisionExports(Path(temp_dir))
+        files = set(exports.list_files(revision))
+        pages = pages or sorted(path for path in files if is_comparable_html(path))
+        site_dir = exports.export_pages(revision, pages)
+        for page in pages:
+            assets = find_local_assets(REPO_ROOT, page)
+            loaded = {page, *assets, *find_runtime_refs(REPO_ROOT, page, assets)} & files
+            for path in sorted(loaded - modified):
+                exported = site_dir / path
+                if not exported.is_file():
+                    issues.append(f"{page}: {path} is not exported")
+                elif exported.read_bytes() != (REPO_ROOT / path).read_bytes():
+                    issues.append(f"{page}: exported {path} differs from the checkout")
+    return issues
+
+
+def unmapped_validators() -> list[str]:
+    """Root validate_*.py scripts that have no VALIDATORS entry."""
+    mapped = {command.split()[0] for command in VALIDATORS}
+    return sorted(path.name for path in REPO_ROOT.glob("validate_*.py") if path.name not in mapped)
+
+
+def all_validators() -> list[str]:
+    return [*VALIDATORS, *unmapped_validators()]
+
+
+def select_validators(changed_files: list[str]) -> list[str]:
+    """The validator commands whose inputs (or own script) changed, in VALIDATORS order.
+
+    Everything runs when a run-all input changed or a validator has no entry,
+    since nothing says which changes that validator covers.
+    """
+    if unmapped_validators() or any(path in RUN_ALL_INPUTS for path in changed_files):
+        return all_validators()
+    return [
+        command for command, inputs in VALIDATORS.items()
+        if any(fnmatch.fnmatch(path, pattern)
+               for path in changed_files for pattern in (command.split()[0], *inputs))
+    ]
+
+
+@dataclass
+class ChangeAnalysis:
+    """What changed between two revisions and what each PR job has to do about it."""
+
+    base_sha: str
+    head_sha: str
+    changed_files: list[str]
+    ui_files: list[str]
+    affected_pages: dict[str, list[str]] = field(default_factory=dict)
+    validators: list[str] = field(default_factory=list)
+
+    @property
+    def render_inputs_changed(self) -> bool:
+        return any(is_render_input(path) for path in self.changed_files)
+
+    @property
+    def site_build_inputs_changed(self) -> bool:
+        return any(path in RUN_ALL_INPUTS or any(fnmatch.fnmatch(path, pattern) for pattern in SITE_BUILD_INPUTS)
+                   for path in self.changed_files)
+
+    @property
+    def jobs(self) -> dict[str, bool]:
+        """Job -> whether it has anything to check; also written to $GITHUB_OUTPUT."""
+        return {
+            "validations": bool(self.validators),
+            "browser_tests": any(command in BROWSER_VALIDATORS for command in self.validators),
+            "screenshot_policy": bool(self.ui_files),
+            "screenshot_diff": bool(self.affected_pages),
+            "site_build": self.site_build_inputs_changed,
+        }
+
+    def to_json(self) -> dict:
+        return {"version": ANALYSIS_VERSION, **asdict(self), "jobs": self.jobs}
+
+    @classmethod
+    def from_json(cls, data: dict) -> ChangeAnalysis:
+        if data.get("version") != ANALYSIS_VERSION:
+            raise ValueError(f"unsupported change analysis version {data.get('version')}")
+        return cls(data["base_sha"], data["head_sha"], data["changed_files"], data["ui_files"],
+                   data["affected_pages"], data["validators"])
+
+
+def analyze(base_sha: str, head_sha: str, exports: RevisionExports) -> ChangeAnalysis:
+    """Runs the diff once and derives everything the PR jobs need from it."""
+    changed_files = run_git_diff(base_sha, head_sha)
+    analysis = ChangeAnalysis(base_sha, head_sha, changed_files,
+                              [path for path in changed_files if is_ui_file(path)],
+                              validators=select_validators(changed_files))
+    if analysis.render_inputs_changed:
+        # Pages, stylesheets and scripts are enough to find the affected pages
+        base_dir, head_dir = (
+            exports.export_graph_inputs(sha, [path for path in exports.list_files(sha) if is_comparable_html(path)])
+            for sha in (base_sha, head_sha))
+        analysis.affected_pages = find_affected_pages(base_dir, head_dir, changed_files,
+                                                      exports.list_files(base_sha), exports.list_files(head_sha))
+    return analysis
+
+
+def load_analysis(path: Path) -> ChangeAnalysis:
+    return ChangeAnalysis.from_json(json.loads(path.read_text(encoding="utf-8")))
+
+
+def write_github_output(analysis: ChangeAnalysis, output_path: Path) -> None:
+    """Appends one name=true/false line per job for `if:` conditions."""
+    with output_path.open("a", encoding="utf-8") as handle:
+        for job, has_work in analysis.jobs.items():
+            handle.write(f"{job}={'true' if has_work else 'false'}\n")
+
+
+def run_validators(commands: list[str]) -> int:
+    """Runs each validator from the repository root; returns 1 if any failed."""
+    if not commands:
+        print("✅ No validator inputs changed; nothing to validate.")
+        return 0
+    failed = []
+    for command in commands:
+        print(f"▶ python {command}", flush=True)
+        if subprocess.run([sys.executable, *command.split()], cwd=REPO_ROOT).returncode != 0:
+            failed.append(command)
+    if failed:
+        print(f"❌ Failed: {', '.join(failed)}")
+        return 1
+    print(f"✅ {len(commands)} validator(s) passed")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Work out once what a PR changed and which checks it needs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    analyze_parser = commands.add_parser("analyze", help="Diff two revisions and write the analysis JSON")
+    analyze_parser.add_argument("--base-sha", required=True)
+    analyze_parser.add_argument("--head-sha", required=True)
+    analyze_parser.add_argument("--output", default=DEFAULT_ANALYSIS_PATH,
+                                help=f"Analysis JSON to write (default: {DEFAULT_ANALYSIS_PATH})")
+    analyze_parser.add_argument("--export-cache-dir", default=None,
+                                help="Directory for the per-tree revision exports (default: <git dir>/ui-diff-exports)")
+    analyze_parser.add_argument("--github-output", action="store_true",
+                                help="Also append the per-job flags to $GITHUB_OUTPUT")
+    validators_parser = commands.add_parser("run-validators", help="Run the validators an analysis selected")
+    source = validators_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--analysis", help="Analysis JSON written by analyze")
+    source.add_argument("--all", action="store_true", help="Run every validator")
+    export_parser = commands.add_parser("check-export",
+                                        help="Check that sparse page exports hold what the checkout's pages load")
+    export_parser.add_argument("--revision", default="HEAD", help="Revision to export (default: HEAD)")
+    export_parser.add_argument("--page", action="append", default=[],
+                               help="Page to check (can repeat; default: every comparable page)")
+    args = parser.parse_args()
+
+    if args.command == "check-export":
+        try:
+            issues = check_exports(args.revision, args.page)
+        except subprocess.CalledProcessError as exc:
+            print(f"❌ Unable to export {args.revision}: {exc.stderr}")
+            return 1
+        for issue in issues:
+            print(f"❌ {issue}")
+        if issues:
+            return 1
+        print(f"✅ Page exports at {args.revision} match the checkout")
+        return 0
+
+    if args.command == "run-validators":
+        if args.all:
+            return run_validators(all_validators())
+        try:
+            analysis = load_analysis(Path(args.analysis))
+        except (OSError, ValueError, KeyError) as exc:
+            print(f"❌ Unable to read change analysis: {exc}")
+            return 1
+        return run_validators(analysis.validators)
+
+    try:
+        exports = RevisionExports(Path(args.export_cache_dir).expanduser() if args.export_cache_dir
+                                  else default_export_cache_dir())
+        analysis = analyze(args.base_sha, args.head_sha, exports)
+    except subprocess.CalledProcessError as exc:
+        print("❌ Unable to analyze the changes between the two revisions.")
+        print(exc.stderr)
+        return 1
+    exports.prune()
+
+    output_path = Path(args.output)
+    output_path.write_text(json.dumps(analysis.to_json(), indent=2), encoding="utf-8")
+    if args.github_output and os.environ.get("GITHUB_OUTPUT"):
+        write_github_output(analysis, Path(os.environ["GITHUB_OUTPUT"]))
+
+    print(f"Changed files: {len(analysis.changed_files)} ({len(analysis.ui_files)} UI-facing)")
+    print(f"Affected pages: {', '.join(analysis.affected_pages) or 'none'}")
+    print(f"Validators: {', '.join(analysis.validators) or 'none'}")
+    for script in unmapped_validators():
+        print(f"⚠️  {script} has no VALIDATORS entry in utils/change_analysis.py, so every validator runs")
+    for job, has_work in analysis.jobs.items():
+        print(f"  {job}: {'run' if has_work else 'skip'}")
+    print(f"Wrote {output_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
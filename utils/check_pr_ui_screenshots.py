@@ -4,6 +4,9 @@ PR policy check for UI changes.
 Rules:
 - If UI-facing files changed, PR body must include both BEFORE and AFTER labels.
 - PR body must include at least two screenshots (Markdown image or HTML <img> tags).
+
+The UI-facing files come from the change analysis (--analysis change-analysis.json,
+see change_analysis.py) or, without it, from git diff base...head.
 """
 
 from __future__ import annotations
@@ -13,41 +16,9 @@ import os
 import re
 import subprocess
 import sys
+from pathlib import Path
 
-
-UI_FILE_PATTERNS = (
-    ".html",
-    ".css",
-    ".scss",
-    ".sass",
-    ".jsx",
-    ".tsx",
-)
-
-UI_EXCLUDE_PATTERNS = (
-    "test_",
-    "TESTING.md",
-)
-
-
-def run_git_diff(base_sha: str, head_sha: str) -> list[str]:
-    cmd = ["git", "diff", "--name-only", f"{base_sha}...{head_sha}"]
-    result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-    files = [line.strip()
-             for line in result.stdout.splitlines() if line.strip()]
-    return files
-
-
-def is_ui_file(path: str) -> bool:
-    lower = path.lower()
-    if not lower.endswith(UI_FILE_PATTERNS):
-        return False
-
-    for excluded in UI_EXCLUDE_PATTERNS:
-        if excluded.lower() in lower:
-            return False
-
-    return True
+from change_analysis import is_ui_file, load_analysis, run_git_diff
 
 
 def count_images(pr_body: str) -> int:
@@ -66,18 +37,28 @@ def has_before_after_labels(pr_body: str) -> bool:
 
 def main() -> int:
     parser = argparse.ArgumentParser()
-    parser.add_argument("--base-sha", required=True)
-    parser.add_argument("--head-sha", required=True)
+    parser.add_argument("--base-sha")
+    parser.add_argument("--head-sha")
+    parser.add_argument("--analysis", default=None,
+                        help="Change analysis JSON from change_analysis.py (replaces --base-sha/--head-sha)")
     args = parser.parse_args()
-
-    try:
-        changed_files = run_git_diff(args.base_sha, args.head_sha)
-    except subprocess.CalledProcessError as exc:
-        print("❌ Unable to determine changed files for PR policy check.")
-        print(exc.stderr)
-        return 1
-
-    ui_changed_files = [f for f in changed_files if is_ui_file(f)]
+    if not args.analysis and (not args.base_sha or not args.head_sha):
+        parser.error("--base-sha and --head-sha are required unless --analysis is given")
+
+    if args.analysis:
+        try:
+            ui_changed_files = load_analysis(Path(args.analysis)).ui_files
+        except (OSError, ValueError, KeyError) as exc:
+            print(f"❌ Unable to read change analysis: {exc}")
+            return 1
+    else:
+        try:
+            changed_files = run_git_diff(args.base_sha, args.head_sha)
+        except subprocess.CalledProcessError as exc:
+            print("❌ Unable to determine changed files for PR policy check.")
+            print(exc.stderr)
+            return 1
+        ui_changed_files = [f for f in changed_files if is_ui_file(f)]
 
     if not ui_changed_files:
         print("✅ No UI-facing file changes detected; screenshot policy not required.")
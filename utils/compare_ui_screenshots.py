@@ -2,42 +2,121 @@
 Compare UI screenshots between PR base and head revisions.
 
 Behavior:
+- The changed files and affected pages come from change_analysis.py: computed here, or
+  read from the JSON written by an earlier CI job with --analysis.
 - If no UI-facing files changed: pass with a short summary.
 - If UI files changed but no comparable HTML pages changed: pass with a note.
 - If comparable HTML pages changed: capture base/head screenshots, compute pixel diffs,
   and produce a markdown report that can be posted as a PR comment.
+- A page is compared when it changed itself or when, in either revision, it references
+  a changed local asset (<link href>, <script src>, <img src>, ...). Editing theme.css
+  therefore re-renders every page that includes it, and nothing else.
+- One Chromium instance is launched per run; base and head pages are captured
+  concurrently in isolated browser contexts, at most --concurrency at a time.
+- Revisions are not archived whole: the pages, stylesheets and scripts are read
+  from `git cat-file --batch` to find the affected pages, and only those pages' assets
+  are added. Each export lives in <export-cache-dir>/<tree SHA> and is reused by
+  later runs against the same tree.
+- With --cache-dir, rendered PNGs are cached by a hash of the page HTML, the local
+  assets it references (stylesheets, scripts, images, CSS url() and @import targets), the
+  data it fetches at runtime (the same files the revision export copies), the
+  viewport and the Playwright version. Cache hits skip rendering; the report lists
+  hit/miss counts. After each run the least recently used screenshots are pruned
+  until the cache fits --cache-max-mb.
+- Pixel diffs run in horizontal NumPy tiles: identical tiles are skipped, channel
+  differences within --tolerance are ignored, and changed areas are reported as
+  bounding boxes (snapped to a DIFF_BLOCK_SIZE grid). The difference image is
+  written one tile at a time and shows only pixels that count as changed.
+- Before the pixel diff, cheaper checks try to prove a page unchanged: identical PNG
+  bytes, then identical decoded pixels, then (only with --perceptual-max-distance)
+  matching perceptual hashes. The report names the stage that decided each page.
+- Before any screenshot, each page's DOM and computed styles are snapshotted. When the
+  base and head snapshots match, the screenshots are skipped (unless the page has
+  canvas/media content or a changed image or font); otherwise the report lists the
+  changed elements.
+- --asset-mode offline serves external assets (fonts, CDNs) from --asset-cache-dir and
+  blocks everything else; --asset-mode record seeds that cache (see offline_assets.py).
+- --deterministic freezes the clock, pauses intervals and CSS animations, and waits on
+  an explicit ready condition instead of network idle (see deterministic_render.py).
+- When a render daemon is running (python utils/render_service.py serve), pages are
+  rendered by its warm browser; otherwise, or with --no-daemon, in this process.
+- --viewport (repeatable, WIDTHxHEIGHT) and --theme light/dark (repeatable) render every
+  combination. Each page is loaded once per viewport and the themes are switched with
+  applyTheme() on the loaded page. Images go to <artifacts-dir>/<variant>/{base,head,diff}
+  and the report has one row per page and variant.
+- --shard i/n compares only the i-th of n deterministic slices of the affected pages
+  (round-robin over the sorted page list) and also writes the shard's results to
+  <artifacts-dir>/results-shard-i-of-n.json. Once every shard's artifacts dir has been
+  gathered into one, --merge combines those files into the single markdown report.
+- With --store, the images are written through the content-addressed store the
+  artifacts dir lies in (pr-screenshots/, see screenshot_store.py).
 """
 
 from __future__ import annotations
 
 import argparse
-import functools
+import asyncio
+import hashlib
+import json
+import os
+import re
 import shutil
+import struct
 import subprocess
 import sys
-import tempfile
-import threading
-import time
-from dataclasses import dataclass
-from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import zlib
+from dataclasses import asdict, dataclass
+from importlib import metadata
 from pathlib import Path
 
-from PIL import Image, ImageChops
+import numpy as np
+from PIL import Image
+
+from change_analysis import (
+    RevisionExports,
+    analyze,
+    default_export_cache_dir,
+    find_local_assets,
+    find_runtime_refs,
+    is_comparable_html,
+    is_ui_file,
+    load_analysis,
+)
+from deterministic_render import DEFAULT_FROZEN_TIME, DEFAULT_READY_CONDITION, RenderSettings, parse_frozen_time
+from offline_assets import ASSET_MODES, OfflineAssets
+from render_service import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_VARIANT,
+    THEMES,
+    VIEWPORT,
+    DaemonRenderer,
+    LocalRenderer,
+    RenderJob,
+    Variant,
+    build_matrix,
+    connect_renderer,
+    parse_viewport,
+)
+from screenshot_store import store_outputs
 
 
-UI_FILE_PATTERNS = (
-    ".html",
-    ".css",
-    ".scss",
-    ".sass",
-    ".jsx",
-    ".tsx",
-)
+# Bump when the capture settings change in a way the cache key does not see
+SCREENSHOT_CACHE_VERSION = "1"
+SCREENSHOT_CACHE_LIMIT_MB = 512  # The least recently used screenshots beyond this are pruned after each run
+DIFF_TILE_HEIGHT = 512
+DIFF_BLOCK_SIZE = 16  # Region boxes are built from blocks of this many pixels square
+MAX_REPORTED_REGIONS = 5
+MAX_REPORTED_ELEMENTS = 5
+# Changed inputs whose effect shows up in the DOM/computed styles; anything else forces screenshots
+SNAPSHOT_TEXT_INPUTS = (".html", ".css", ".scss", ".sass", ".js", ".mjs", ".jsx", ".tsx")
+PERCEPTUAL_HASH_SIZE = 16  # dHash grid; the hash has PERCEPTUAL_HASH_SIZE ** 2 bits
 
-UI_EXCLUDE_PATTERNS = (
-    "test_",
-    "TESTING.md",
-)
+# Stages that can decide a page, cheapest first
+STAGE_DOM_SNAPSHOT = "dom-snapshot"
+STAGE_PNG_BYTES = "png-bytes"
+STAGE_PIXEL_HASH = "pixel-hash"
+STAGE_PERCEPTUAL_HASH = "perceptual-hash"
+STAGE_PIXEL_DIFF = "pixel-diff"
 
 
 @dataclass
@@ -46,124 +125,558 @@ class PageDiffResult:
     status: str
     diff_percent: float
     notes: str
+    stage: str = ""
+    variant: str = ""
 
 
-def run_git_diff(base_sha: str, head_sha: str) -> list[str]:
-    cmd = ["git", "diff", "--name-only", f"{base_sha}...{head_sha}"]
-    result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-    return [line.strip() for line in result.stdout.splitlines() if line.strip()]
-
-
-def is_ui_file(path: str) -> bool:
-    lower = path.lower()
-    if not lower.endswith(UI_FILE_PATTERNS):
-        return False
-    return not any(excluded.lower() in lower for excluded in UI_EXCLUDE_PATTERNS)
-
-
-def is_comparable_html(path: str) -> bool:
-    lower = path.lower()
-    return lower.endswith(".html") and not any(excluded.lower() in lower for excluded in UI_EXCLUDE_PATTERNS)
-
+@dataclass
+class PixelDiff:
+    diff_percent: float
+    changed_pixels: int
+    size_note: str
+    regions: list[tuple[int, int, int, int]]  # (left, top, right, bottom), right/bottom exclusive
 
-def export_revision(revision: str, out_dir: Path) -> None:
-    out_dir.mkdir(parents=True, exist_ok=True)
-    archive_cmd = ["git", "archive", revision]
-    tar_cmd = ["tar", "-x", "-C", str(out_dir)]
 
-    archive_proc = subprocess.Popen(
-        archive_cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-    )
+def renderer_version() -> str:
     try:
-        subprocess.run(tar_cmd, stdin=archive_proc.stdout, check=True)
-    finally:
-        if archive_proc.stdout:
-            archive_proc.stdout.close()
-        archive_stderr = None
-        if archive_proc.stderr:
-            archive_stderr = archive_proc.stderr.read()
-            archive_proc.stderr.close()
-        archive_returncode = archive_proc.wait()
-
-    if archive_returncode != 0:
-        raise subprocess.CalledProcessError(
-            archive_returncode,
-            archive_cmd,
-            stderr=archive_stderr,
-        )
-
-
-class LocalServer:
-    def __init__(self, directory: Path, port: int):
+        return f"playwright-{metadata.version('playwright')}"
+    except metadata.PackageNotFoundError:
+        return "playwright-unknown"
+
+
+def screenshot_cache_key(site_dir: Path, page: str, viewport: dict[str, int] = VIEWPORT, variant: str = "") -> str:
+    """Hash of everything that decides how a page renders, as far as can be seen statically.
+
+    variant names capture settings that change the output, such as the asset mode.
+    """
+    digest = hashlib.sha256()
+    header = {
+        "cache_version": SCREENSHOT_CACHE_VERSION,
+        "renderer": renderer_version(),
+        "viewport": viewport,
+        "page": page,
+        "variant": variant,
+    }
+    digest.update(json.dumps(header, sort_keys=True).encode("utf-8"))
+    assets = find_local_assets(site_dir, page)
+    for name in [page, *sorted({*assets, *find_runtime_refs(site_dir, page, assets)})]:
+        path = site_dir / name
+        digest.update(b"\0" + name.encode("utf-8") + b"\0")
+        digest.update(path.read_bytes() if path.is_file() else b"<missing>")
+    return digest.hexdigest()
+
+
+class ScreenshotCache:
+    """Rendered PNGs stored by cache key under a directory CI can persist between runs.
+
+    A file's mtime records its last use (fetches touch it), which prune() uses
+    to drop the least recently used screenshots beyond the size limit.
+    """
+
+    def __init__(self, directory: Path, limit_bytes: int = SCREENSHOT_CACHE_LIMIT_MB * 1024 * 1024):
         self.directory = directory
-        self.port = port
-        self.httpd: ThreadingHTTPServer | None = None
-        self.thread: threading.Thread | None = None
-
-    def __enter__(self) -> "LocalServer":
-        handler = functools.partial(
-            SimpleHTTPRequestHandler, directory=str(self.directory))
-        self.httpd = ThreadingHTTPServer(("127.0.0.1", self.port), handler)
-        self.port = self.httpd.server_address[1]
-        self.thread = threading.Thread(
-            target=self.httpd.serve_forever, daemon=True)
-        self.thread.start()
-        time.sleep(0.6)
-        return self
-
-    def __exit__(self, exc_type, exc, tb) -> None:
-        if self.httpd:
-            self.httpd.shutdown()
-            self.httpd.server_close()
-        if self.thread:
-            self.thread.join(timeout=2)
-
-
-def capture_screenshot(url: str, output_path: Path) -> None:
-    from playwright.sync_api import sync_playwright
-
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    with sync_playwright() as playwright:
-        browser = playwright.chromium.launch()
-        page = browser.new_page(viewport={"width": 1440, "height": 1800})
-        page.goto(url, wait_until="networkidle")
-        page.screenshot(path=str(output_path), full_page=True)
-        browser.close()
-
-
-def compute_diff(base_img_path: Path, head_img_path: Path, diff_img_path: Path) -> tuple[float, str]:
-    with Image.open(base_img_path) as base_img_file, Image.open(head_img_path) as head_img_file:
-        base_img = base_img_file.convert("RGB")
-        head_img = head_img_file.convert("RGB")
+        self.limit_bytes = limit_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def path_for(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.png"
+
+    def contains(self, key: str) -> bool:
+        return self.path_for(key).is_file()
+
+    def fetch(self, key: str, output_path: Path) -> bool:
+        cached = self.path_for(key)
+        if not cached.is_file():
+            self.misses += 1
+            return False
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(cached, output_path)
+        os.utime(cached)
+        self.hits += 1
+        return True
+
+    def store(self, key: str, rendered_path: Path) -> None:
+        cached = self.path_for(key)
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = cached.with_suffix(f".{os.getpid()}.tmp")
+        shutil.copyfile(rendered_path, temp_path)
+        os.replace(temp_path, cached)  # Atomic, so a concurrent run never sees half a file
+
+    def prune(self) -> str:
+        """Deletes the least recently used screenshots until the cache fits its limit; returns a summary."""
+        entries = []
+        for path in self.directory.glob("*/*.png"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue  # Removed by a concurrent prune
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort(reverse=True)
+        kept_bytes = removed = 0
+        for _, size, path in entries:
+            if kept_bytes + size <= self.limit_bytes:
+                kept_bytes += size
+                continue
+            path.unlink(missing_ok=True)
+            removed += 1
+        return (f"Screenshot cache: {len(entries) - removed} file(s), {kept_bytes / (1024 * 1024):.1f} MB kept, "
+                f"{removed} pruned from {self.directory}")
+
+
+def snapshot_signatures(snapshot: dict) -> dict[str, str]:
+    """Element path -> serialized attributes, own text, box and computed styles."""
+    return {
+        element["path"]: json.dumps(element, sort_keys=True)
+        for element in snapshot["elements"]
+    }
+
+
+def diff_snapshots(base_snapshot: dict, head_snapshot: dict) -> list[str]:
+    """Paths of elements that were added, removed or differ between two DOM snapshots."""
+    base_signatures = snapshot_signatures(base_snapshot)
+    head_signatures = snapshot_signatures(head_snapshot)
+    paths = list(dict.fromkeys([*base_signatures, *head_signatures]))
+    return [path for path in paths if base_signatures.get(path) != head_signatures.get(path)]
+
+
+def snapshot_blocker(base_snapshot: dict, head_snapshot: dict, changed_inputs: list[str]) -> str | None:
+    """Why an identical snapshot cannot prove identical pixels here, or None if it can."""
+    for snapshot in (base_snapshot, head_snapshot):
+        if snapshot["opaque"]:
+            return f"page has {', '.join(snapshot['opaque'])} content"
+    binary_inputs = [path for path in changed_inputs if not path.lower().endswith(SNAPSHOT_TEXT_INPUTS)]
+    if binary_inputs:
+        return f"changed {', '.join(binary_inputs)} is not visible in the DOM"
+    return None
+
+
+def describe_elements(paths: list[str]) -> str:
+    listed = ", ".join(f"`{path}`" for path in paths[:MAX_REPORTED_ELEMENTS])
+    more = f" +{len(paths) - MAX_REPORTED_ELEMENTS} more" if len(paths) > MAX_REPORTED_ELEMENTS else ""
+    return f"{len(paths)} changed element(s): {listed}{more}"
+
+
+async def capture_pages(
+    page_sites: dict[str, tuple[Path, Path]],
+    variants: list[Variant],
+    page_images: dict[tuple[str, Variant], tuple[Path, Path, Path]],
+    cache_keys: dict[tuple[str, Variant], tuple[str, str]],
+    cache: ScreenshotCache | None,
+    affected_pages: dict[str, list[str]],
+    renderer: LocalRenderer | DaemonRenderer,
+    use_dom_snapshot: bool,
+) -> tuple[dict[tuple[str, Variant], PageDiffResult], dict[tuple[str, Variant], str], dict[Path, Exception | None]]:
+    """Snapshots and screenshots every page variant with one renderer (in-process or the daemon).
+
+    page_sites maps each page to its base and head site directories. Each page
+    is loaded once per side and viewport; the themes of that viewport are
+    switched on the loaded page. Returns (page, variant) entries decided by
+    their DOM snapshots, changed-element notes for the rest, and the capture
+    error (or None) per screenshot path. Variants whose screenshots are both
+    cached skip the snapshot step entirely.
+    """
+    from playwright.async_api import Error as PlaywrightError  # type: ignore
+
+    by_viewport: dict[tuple[int, int], list[Variant]] = {}
+    for variant in variants:
+        by_viewport.setdefault((variant.width, variant.height), []).append(variant)
+
+    decided: dict[tuple[str, Variant], PageDiffResult] = {}
+    element_notes: dict[tuple[str, Variant], str] = {}
+    capture_errors: dict[Path, Exception | None] = {}
+    try:
+        async with renderer:
+            snapshot_loads: list[tuple[str, list[Variant]]] = []
+            for page in page_sites:
+                for group in by_viewport.values():
+                    pending = [
+                        variant for variant in group
+                        if use_dom_snapshot
+                        and not (cache and all(cache.contains(key) for key in cache_keys[(page, variant)]))
+                    ]
+                    if pending:
+                        snapshot_loads.append((page, pending))
+            # A job that raises (say, a file server that cannot start) fails only its own pages
+            snapshots = await asyncio.gather(*(
+                renderer.snapshot(RenderJob(root, page, viewport=pending[0].viewport,
+                                            themes=[variant.theme for variant in pending]))
+                for page, pending in snapshot_loads for root in page_sites[page]), return_exceptions=True)
+            for index, (page, pending) in enumerate(snapshot_loads):
+                base_snapshots, head_snapshots = snapshots[2 * index], snapshots[2 * index + 1]
+                if isinstance(base_snapshots, Exception) or isinstance(head_snapshots, Exception):
+                    continue  # The screenshots will report the failure
+                for variant, base_snapshot, head_snapshot in zip(pending, base_snapshots, head_snapshots):
+                    entry = (page, variant)
+                    changed_elements = diff_snapshots(base_snapshot, head_snapshot)
+                    if changed_elements:
+                        element_notes[entry] = describe_elements(changed_elements)
+                        continue
+                    blocker = snapshot_blocker(base_snapshot, head_snapshot, affected_pages.get(page, []))
+                    if blocker:
+                        element_notes[entry] = f"DOM identical but {blocker}"
+                        continue
+                    decided[entry] = PageDiffResult(
+                        page=page, status="no-visible-change", diff_percent=0.0,
+                        notes="identical DOM and computed styles; screenshots skipped", stage=STAGE_DOM_SNAPSHOT,
+                        variant=variant.name)
+
+            jobs: list[RenderJob] = []
+            pending_by_key: dict[str, tuple[Path, list[Path]]] = {}
+            for page, roots in page_sites.items():
+                for group in by_viewport.values():
+                    for side, root in enumerate(roots):
+                        job = RenderJob(root, page, viewport=group[0].viewport, themes=[])
+                        for variant in group:
+                            entry = (page, variant)
+                            if entry in decided:
+                                continue
+                            image = page_images[entry][side]
+                            if cache is not None:
+                                key = cache_keys[entry][side]
+                                if key in pending_by_key:
+                                    pending_by_key[key][1].append(image)  # Same inputs already queued this run
+                                    cache.hits += 1
+                                    continue
+                                if cache.fetch(key, image):
+                                    continue
+                                pending_by_key[key] = (image, [])
+                            job.themes.append(variant.theme)
+                            job.outputs.append(image)
+                        if job.outputs:
+                            jobs.append(job)
+
+            errors = await asyncio.gather(*(renderer.screenshot(job) for job in jobs), return_exceptions=True)
+            for job, error in zip(jobs, errors):
+                capture_errors.update((image, error) for image in job.outputs)
+    except PlaywrightError as exc:
+        for images in page_images.values():
+            capture_errors[images[0]] = capture_errors[images[1]] = exc
+        return {}, element_notes, capture_errors
+
+    for key, (rendered, copies) in pending_by_key.items():
+        error = capture_errors.get(rendered)
+        for image in copies:
+            capture_errors[image] = error
+        if error is None:
+            cache.store(key, rendered)
+            for image in copies:
+                image.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(rendered, image)
+
+    return decided, element_notes, capture_errors
+
+
+def parse_tolerance(value: str) -> tuple[int, int, int]:
+    """Accepts one per-channel tolerance ("8") or one per RGB channel ("8,8,16")."""
+    try:
+        parts = [int(part) for part in value.split(",")]
+    except ValueError:
+        parts = []
+    if len(parts) == 1:
+        parts *= 3
+    if len(parts) != 3 or not all(0 <= part <= 255 for part in parts):
+        raise argparse.ArgumentTypeError("tolerance must be 0-255, either one value or R,G,B")
+    return parts[0], parts[1], parts[2]
+
+
+def _rgb_tile(img: Image.Image, top: int, bottom: int, width: int) -> np.ndarray:
+    """Rows [top, bottom) of an image as RGB, padded with white past its edges."""
+    tile = np.full((bottom - top, width, 3), 255, dtype=np.uint8)
+    if top < img.height:
+        part = img.crop((0, top, img.width, min(bottom, img.height))).convert("RGB")
+        tile[:part.height, :part.width] = np.asarray(part)
+    return tile
+
+
+class _PngStripWriter:
+    """Writes an RGB PNG a strip of rows at a time, so only one strip is in memory.
+
+    The file is written under a temporary name and moved into place by close().
+    """
+
+    def __init__(self, path: Path, width: int, height: int):
+        self.path = path
+        self.width = width
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        self.handle = self.temp_path.open("wb")
+        self.compressor = zlib.compressobj(6)
+        self.handle.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    def _chunk(self, kind: bytes, data: bytes) -> None:
+        self.handle.write(struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data)))
+
+    def write(self, rows: np.ndarray) -> None:
+        """Appends rows given as a (height, width, 3) uint8 array."""
+        scanlines = np.zeros((rows.shape[0], self.width * 3 + 1), dtype=np.uint8)  # Filter byte 0 per row
+        scanlines[:, 1:] = rows.reshape(rows.shape[0], -1)
+        data = self.compressor.compress(scanlines.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+
+    def write_blank(self, count: int) -> None:
+        self.write(np.zeros((count, self.width, 3), dtype=np.uint8))
+
+    def close(self) -> None:
+        self._chunk(b"IDAT", self.compressor.flush())
+        self._chunk(b"IEND", b"")
+        self.handle.close()
+        os.replace(self.temp_path, self.path)
+
+    def abort(self) -> None:
+        self.handle.close()
+        self.temp_path.unlink(missing_ok=True)
+
+
+def _block_regions(blocks: np.ndarray, width: int, height: int) -> list[tuple[int, int, int, int]]:
+    """Bounding boxes of 8-connected groups of changed blocks, in pixels."""
+    seen = np.zeros_like(blocks)
+    regions: list[tuple[int, int, int, int]] = []
+    for start_row, start_col in zip(*np.nonzero(blocks)):
+        if seen[start_row, start_col]:
+            continue
+        seen[start_row, start_col] = True
+        stack = [(start_row, start_col)]
+        top, left, bottom, right = start_row, start_col, start_row, start_col
+        while stack:
+            row, col = stack.pop()
+            top, bottom = min(top, row), max(bottom, row)
+            left, right = min(left, col), max(right, col)
+            for next_row in range(max(row - 1, 0), min(row + 2, blocks.shape[0])):
+                for next_col in range(max(col - 1, 0), min(col + 2, blocks.shape[1])):
+                    if blocks[next_row, next_col] and not seen[next_row, next_col]:
+                        seen[next_row, next_col] = True
+                        stack.append((next_row, next_col))
+        regions.append((
+            int(left) * DIFF_BLOCK_SIZE,
+            int(top) * DIFF_BLOCK_SIZE,
+            min(int(right + 1) * DIFF_BLOCK_SIZE, width),
+            min(int(bottom + 1) * DIFF_BLOCK_SIZE, height),
+        ))
+    return sorted(regions, key=lambda box: (box[1], box[0]))
+
+
+def compute_diff(
+    base_img_path: Path,
+    head_img_path: Path,
+    diff_img_path: Path,
+    tolerance: tuple[int, int, int] = (0, 0, 0),
+    tile_height: int = DIFF_TILE_HEIGHT,
+) -> PixelDiff:
+    """Compares two screenshots tile by tile, saving a difference image if anything changed.
+
+    Only one tile of each image is converted at a time, and the smaller image is
+    treated as padded with white. A pixel counts as changed when any channel
+    differs by more than its tolerance. The difference image is streamed a tile
+    at a time too: changed pixels show their channel differences, everything
+    else (including differences within tolerance) is black.
+    """
+    tile_height = max(DIFF_BLOCK_SIZE, tile_height - tile_height % DIFF_BLOCK_SIZE)
+    limits = np.array(tolerance, dtype=np.int16)
+    with Image.open(base_img_path) as base_img, Image.open(head_img_path) as head_img:
+        width, height = max(base_img.width, head_img.width), max(base_img.height, head_img.height)
         if base_img.size != head_img.size:
-            target_size = (max(base_img.width, head_img.width),
-                           max(base_img.height, head_img.height))
-            base_canvas = Image.new("RGB", target_size, (255, 255, 255))
-            head_canvas = Image.new("RGB", target_size, (255, 255, 255))
-            base_canvas.paste(base_img, (0, 0))
-            head_canvas.paste(head_img, (0, 0))
-            base_img = base_canvas
-            head_img = head_canvas
-            size_note = f"resized for compare ({target_size[0]}x{target_size[1]})"
+            size_note = f"resized for compare ({width}x{height})"
         else:
             size_note = "same dimensions"
 
-        diff_img = ImageChops.difference(base_img, head_img)
-        diff_gray = diff_img.convert("L")
-        histogram = diff_gray.histogram()
-        total_pixels = base_img.width * base_img.height
-        changed_pixels = total_pixels - histogram[0]
-        diff_percent = (changed_pixels / total_pixels) * \
-            100 if total_pixels else 0.0
+        block_cols = -(-width // DIFF_BLOCK_SIZE)
+        changed_blocks = np.zeros((-(-height // DIFF_BLOCK_SIZE), block_cols), dtype=bool)
+        changed_pixels = 0
+        diff_writer: _PngStripWriter | None = None
+        written_rows = 0  # Rows of the difference image written so far
+
+        try:
+            for top in range(0, height, tile_height):
+                bottom = min(top + tile_height, height)
+                base_tile = _rgb_tile(base_img, top, bottom, width)
+                head_tile = _rgb_tile(head_img, top, bottom, width)
+                if np.array_equal(base_tile, head_tile):
+                    continue
+
+                delta = np.abs(base_tile.astype(np.int16) - head_tile.astype(np.int16))
+                changed = (delta > limits).any(axis=2)
+                tile_changed = int(np.count_nonzero(changed))
+                if not tile_changed:
+                    continue
+                changed_pixels += tile_changed
+
+                padded = np.zeros((-(-changed.shape[0] // DIFF_BLOCK_SIZE) * DIFF_BLOCK_SIZE,
+                                   block_cols * DIFF_BLOCK_SIZE), dtype=bool)
+                padded[:changed.shape[0], :width] = changed
+                blocks = padded.reshape(padded.shape[0] // DIFF_BLOCK_SIZE, DIFF_BLOCK_SIZE,
+                                        block_cols, DIFF_BLOCK_SIZE).any(axis=(1, 3))
+                first_block = top // DIFF_BLOCK_SIZE
+                changed_blocks[first_block:first_block + blocks.shape[0]] |= blocks
+
+                if diff_writer is None:
+                    diff_writer = _PngStripWriter(diff_img_path, width, height)
+                for blank_top in range(written_rows, top, tile_height):  # Unchanged tiles since the last write
+                    diff_writer.write_blank(min(blank_top + tile_height, top) - blank_top)
+                delta[~changed] = 0
+                diff_writer.write(delta.astype(np.uint8))
+                written_rows = bottom
+
+            if diff_writer is not None:
+                for blank_top in range(written_rows, height, tile_height):
+                    diff_writer.write_blank(min(blank_top + tile_height, height) - blank_top)
+                diff_writer.close()
+        except BaseException:
+            if diff_writer is not None:
+                diff_writer.abort()
+            raise
+
+    total_pixels = width * height
+    diff_percent = (changed_pixels / total_pixels) * \
+        100 if total_pixels else 0.0
+
+    return PixelDiff(diff_percent, changed_pixels, size_note, _block_regions(changed_blocks, width, height))
+
+
+def png_bytes_hash(path: Path) -> str:
+    with path.open("rb") as handle:
+        return hashlib.file_digest(handle, "sha256").hexdigest()
+
+
+def pixel_hash(path: Path, tile_height: int = DIFF_TILE_HEIGHT) -> str:
+    """Hash of the decoded RGB pixels and size, so re-encoded but identical renders match."""
+    digest = hashlib.sha256()
+    with Image.open(path) as img:
+        digest.update(f"{img.width}x{img.height}".encode("ascii"))
+        for top in range(0, img.height, tile_height):
+            digest.update(_rgb_tile(img, top, min(top + tile_height, img.height), img.width).tobytes())
+    return digest.hexdigest()
+
+
+def perceptual_hash(path: Path, size: int = PERCEPTUAL_HASH_SIZE) -> np.ndarray:
+    """Difference hash: whether each cell of a shrunken grayscale image is brighter than its right neighbour."""
+    with Image.open(path) as img:
+        img.draft("L", (size * 8, size * 8))  # Lets decoders that support it skip full-size work
+        small = np.asarray(img.convert("L").resize((size + 1, size), Image.Resampling.LANCZOS), dtype=np.int16)
+    return (small[:, 1:] > small[:, :-1]).ravel()
+
+
+def find_identical_stage(
+    base_img_path: Path,
+    head_img_path: Path,
+    perceptual_max_distance: int | None = None,
+) -> tuple[str | None, str]:
+    """Runs the cheap checks in order, returning (deciding stage, note) or (None, "") if undecided.
+
+    The byte and pixel stages prove the renders are identical. The perceptual
+    stage only shows they look alike, so it decides nothing unless a maximum
+    Hamming distance is given.
+    """
+    if png_bytes_hash(base_img_path) == png_bytes_hash(head_img_path):
+        return STAGE_PNG_BYTES, "identical PNG bytes"
+    if pixel_hash(base_img_path) == pixel_hash(head_img_path):
+        return STAGE_PIXEL_HASH, "identical pixels, different encoding"
+    if perceptual_max_distance is not None:
+        distance = int(np.count_nonzero(perceptual_hash(base_img_path) != perceptual_hash(head_img_path)))
+        if distance <= perceptual_max_distance:
+            return STAGE_PERCEPTUAL_HASH, f"perceptual hash distance {distance}"
+    return None, ""
+
+
+def describe_regions(regions: list[tuple[int, int, int, int]]) -> str:
+    boxes = ", ".join(f"({left},{top})-({right},{bottom})" for left, top, right, bottom in regions[:MAX_REPORTED_REGIONS])
+    more = f" +{len(regions) - MAX_REPORTED_REGIONS} more" if len(regions) > MAX_REPORTED_REGIONS else ""
+    return f"{len(regions)} changed region(s): {boxes}{more}"
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parses "i/n" (1 <= i <= n) into (i, n)."""
+    index, _, count = value.partition("/")
+    try:
+        shard = int(index), int(count)
+    except ValueError:
+        shard = (0, 0)
+    if not 1 <= shard[0] <= shard[1]:
+        raise argparse.ArgumentTypeError("shard must be i/n with 1 <= i <= n, e.g. 2/4")
+    return shard
+
 
-        if changed_pixels > 0:
-            diff_img_path.parent.mkdir(parents=True, exist_ok=True)
-            diff_img.save(diff_img_path)
+def shard_pages(pages: list[str], shard: tuple[int, int] | None) -> list[str]:
+    """The pages shard i/n compares: every n-th page of the sorted list, starting at the i-th."""
+    if shard is None:
+        return list(pages)
+    index, count = shard
+    return sorted(pages)[index - 1::count]
 
-    return diff_percent, size_note
+
+def partial_results_path(artifacts_dir: Path, shard: tuple[int, int]) -> Path:
+    return artifacts_dir / f"results-shard-{shard[0]}-of-{shard[1]}.json"
+
+
+def write_partial_results(
+    path: Path,
+    shard: tuple[int, int],
+    ui_changed_files: list[str],
+    comparable_pages: list[str],
+    results: list[PageDiffResult],
+    cache: ScreenshotCache | None,
+    affected_pages: dict[str, list[str]],
+    assets: OfflineAssets | None,
+    variants: list[Variant],
+) -> None:
+    """Everything write_summary needs from one shard, as JSON."""
+    partial = {
+        "shard": list(shard),
+        "ui_changed_files": ui_changed_files,
+        "comparable_pages": comparable_pages,
+        "affected_pages": affected_pages,
+        "variants": [variant.name for variant in variants],
+        "results": [asdict(result) for result in results],
+        "cache": {"hits": cache.hits, "misses": cache.misses} if cache is not None else None,
+        "assets": {"mode": assets.mode, "served": assets.served, "recorded": assets.recorded,
+                   "blocked": sorted(assets.blocked)} if assets is not None else None,
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(partial, indent=2), encoding="utf-8")
+
+
+def merge_partial_results(artifacts_dir: Path, output_markdown: Path) -> list[PageDiffResult]:
+    """Combines every shard's results file in artifacts_dir into one report; returns all results.
+
+    Raises ValueError when the files are missing, from different shard counts, or incomplete.
+    """
+    paths = sorted(artifacts_dir.glob("results-shard-*-of-*.json"))
+    if not paths:
+        raise ValueError(f"No results-shard-*-of-*.json files in {artifacts_dir}")
+    partials = [json.loads(path.read_text(encoding="utf-8")) for path in paths]
+    counts = {partial["shard"][1] for partial in partials}
+    if len(counts) != 1:
+        raise ValueError(f"Results files from different shard counts: {sorted(counts)}")
+    count = counts.pop()
+    missing = sorted(set(range(1, count + 1)) - {partial["shard"][0] for partial in partials})
+    if missing:
+        raise ValueError(f"Missing results for shard(s) {', '.join(f'{i}/{count}' for i in missing)}")
+
+    # Every shard saw the same changed files, so the page lists agree; only the results are split
+    first = partials[0]
+    page_order = {page: position for position, page in enumerate(first["comparable_pages"])}
+    variant_order = {name: position for position, name in enumerate(first["variants"])}
+    results = sorted(
+        (PageDiffResult(**result) for partial in partials for result in partial["results"]),
+        key=lambda result: (page_order.get(result.page, len(page_order)), variant_order.get(result.variant, 0)))
+
+    cache = None
+    if first["cache"] is not None:
+        cache = ScreenshotCache(artifacts_dir)
+        cache.hits = sum(partial["cache"]["hits"] for partial in partials)
+        cache.misses = sum(partial["cache"]["misses"] for partial in partials)
+    assets = None
+    if first["assets"] is not None:
+        assets = OfflineAssets(artifacts_dir, first["assets"]["mode"],
+                               sum(partial["assets"]["served"] for partial in partials),
+                               sum(partial["assets"]["recorded"] for partial in partials),
+                               {url for partial in partials for url in partial["assets"]["blocked"]})
+
+    write_summary(output_markdown, first["ui_changed_files"], first["comparable_pages"], results, cache,
+                  first["affected_pages"], assets, first["variants"] != [DEFAULT_VARIANT.name])
+    return results
 
 
 def write_summary(
@@ -171,6 +684,10 @@ def write_summary(
     ui_changed_files: list[str],
     comparable_pages: list[str],
     results: list[PageDiffResult],
+    cache: ScreenshotCache | None = None,
+    affected_pages: dict[str, list[str]] | None = None,
+    assets: OfflineAssets | None = None,
+    show_variants: bool = False,
 ) -> None:
     lines: list[str] = []
     lines.append("## UI Screenshot Diff Report")
@@ -192,15 +709,28 @@ def write_summary(
         output_markdown.write_text("\n".join(lines), encoding="utf-8")
         return
 
+    if affected_pages:
+        lines.append("### Affected Pages")
+        for page, causes in affected_pages.items():
+            lines.append(f"- {page} ({', '.join(causes)})")
+        lines.append("")
+
     lines.append("### Visual Comparison")
-    lines.append("| Page | Result | Diff % | Notes |")
-    lines.append("|---|---:|---:|---|")
+    if show_variants:
+        lines.append("| Page | Variant | Result | Diff % | Decided by | Notes |")
+        lines.append("|---|---|---:|---:|---|---|")
+    else:
+        lines.append("| Page | Result | Diff % | Decided by | Notes |")
+        lines.append("|---|---:|---:|---|---|")
     for result in results:
         icon = "✅" if result.status == "no-visible-change" else "🟡" if result.status == "changed" else "❌"
+        variant_cell = f" {result.variant or '-'} |" if show_variants else ""
         lines.append(
-            f"| {result.page} | {icon} {result.status} | {result.diff_percent:.3f}% | {result.notes} |")
+            f"| {result.page} |{variant_cell} {icon} {result.status} | {result.diff_percent:.3f}% | "
+            f"{result.stage or '-'} | {result.notes} |")
 
-    changed_pages = [r.page for r in results if r.status == "changed"]
+    changed_pages = [
+        f"{r.page} ({r.variant})" if show_variants else r.page for r in results if r.status == "changed"]
     lines.append("")
     if changed_pages:
         lines.append("### Summary")
@@ -213,81 +743,224 @@ def write_summary(
         lines.append(
             "No visible pixel differences detected on comparable pages.")
 
+    if cache is not None:
+        lines.append("")
+        lines.append(
+            f"Screenshot cache: {cache.hits} hit(s), {cache.misses} miss(es)")
+
+    if assets is not None and assets.mode != "live":
+        lines.append("")
+        lines.append(assets.summary())
+
     output_markdown.write_text("\n".join(lines), encoding="utf-8")
 
 
 def main() -> int:
     parser = argparse.ArgumentParser()
-    parser.add_argument("--base-sha", required=True)
-    parser.add_argument("--head-sha", required=True)
+    parser.add_argument("--base-sha")
+    parser.add_argument("--head-sha")
+    parser.add_argument("--analysis", default=None,
+                        help="Change analysis JSON from change_analysis.py; replaces --base-sha/--head-sha and the diff")
     parser.add_argument("--output-markdown",
                         default="ui-screenshot-diff-summary.md")
     parser.add_argument("--artifacts-dir", default="pr-screenshots/ci-diff")
     parser.add_argument("--base-port", type=int, default=0)
     parser.add_argument("--head-port", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Pages captured at once in the shared browser (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Directory for cached screenshots (persist it between CI runs); caching is off without it")
+    parser.add_argument("--cache-max-mb", type=int, default=SCREENSHOT_CACHE_LIMIT_MB,
+                        help=f"Size the screenshot cache is pruned to after the run (default: {SCREENSHOT_CACHE_LIMIT_MB})")
+    parser.add_argument("--export-cache-dir", default=None,
+                        help="Directory for the per-tree revision exports (default: <git dir>/ui-diff-exports)")
+    parser.add_argument("--tolerance", type=parse_tolerance, default=(0, 0, 0),
+                        help="Per-channel difference to ignore, e.g. 8 or 8,8,16 (default: 0)")
+    parser.add_argument("--perceptual-max-distance", type=int, default=None,
+                        help="Treat pages whose perceptual hashes differ in at most this many bits as unchanged "
+                             "(off by default; small text edits can fall under any threshold)")
+    parser.add_argument("--skip-dom-snapshot", action="store_true",
+                        help="Always take screenshots instead of first comparing DOM/computed-style snapshots")
+    parser.add_argument("--asset-mode", choices=ASSET_MODES, default="live",
+                        help="live: fetch external assets; record: fetch and cache them; "
+                             "offline: serve them from the cache and block the rest (default: live)")
+    parser.add_argument("--asset-cache-dir", default=None,
+                        help="Directory of cached external assets (required for record/offline)")
+    parser.add_argument("--deterministic", action="store_true",
+                        help="Freeze the clock, pause intervals/animations and wait on --ready-condition")
+    parser.add_argument("--frozen-time", default=DEFAULT_FROZEN_TIME,
+                        help=f"Instant the clock is frozen at in deterministic mode (default: {DEFAULT_FROZEN_TIME})")
+    parser.add_argument("--ready-condition", default=DEFAULT_READY_CONDITION,
+                        help="JavaScript expression that is true once a page is ready to capture")
+    parser.add_argument("--no-daemon", action="store_true",
+                        help="Render in this process even when a render daemon is running (see render_service.py)")
+    parser.add_argument("--viewport", type=parse_viewport, action="append", default=[],
+                        help=f"Viewport as WIDTHxHEIGHT (can repeat; default: {DEFAULT_VARIANT.name})")
+    parser.add_argument("--theme", choices=THEMES, action="append", default=[],
+                        help="Also render in this theme via applyTheme (can repeat; default: each page's own)")
+    parser.add_argument("--store", action="store_true",
+                        help="Write the images through the screenshot store the artifacts dir is in (see screenshot_store.py)")
+    parser.add_argument("--shard", type=parse_shard, default=None,
+                        help="Compare only shard i of n (e.g. 2/4) and write its results file to --artifacts-dir")
+    parser.add_argument("--merge", action="store_true",
+                        help="Write the report from the shard results files in --artifacts-dir instead of comparing")
     args = parser.parse_args()
+    if args.merge:
+        output_markdown = Path(args.output_markdown)
+        try:
+            results = merge_partial_results(Path(args.artifacts_dir), output_markdown)
+        except (OSError, ValueError, KeyError) as exc:
+            print(f"❌ Failed to merge shard results: {exc}")
+            return 1
+        print(output_markdown.read_text(encoding="utf-8"))
+        if any(result.status == "error" for result in results):
+            print("❌ One or more pages failed screenshot comparison")
+            return 1
+        return 0
+    if not args.analysis and (not args.base_sha or not args.head_sha):
+        parser.error("--base-sha and --head-sha are required unless --analysis or --merge is given")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.asset_mode != "live" and not args.asset_cache_dir:
+        parser.error(f"--asset-mode {args.asset_mode} needs --asset-cache-dir")
+    assets = OfflineAssets(Path(args.asset_cache_dir), args.asset_mode) if args.asset_mode != "live" else None
+    try:
+        parse_frozen_time(args.frozen_time)
+    except ValueError:
+        parser.error(f"--frozen-time '{args.frozen_time}' is not an ISO 8601 date/time")
+    render = RenderSettings(args.deterministic, args.frozen_time, args.ready_condition)
+    variants = build_matrix(args.viewport, args.theme)
+    show_variants = variants != [DEFAULT_VARIANT]
 
     output_markdown = Path(args.output_markdown)
     artifacts_dir = Path(args.artifacts_dir)
+    cache = ScreenshotCache(Path(args.cache_dir), args.cache_max_mb * 1024 * 1024) if args.cache_dir else None
 
     try:
-        changed_files = run_git_diff(args.base_sha, args.head_sha)
+        exports = RevisionExports(Path(args.export_cache_dir).expanduser() if args.export_cache_dir
+                                  else default_export_cache_dir())
+        analysis = (load_analysis(Path(args.analysis)) if args.analysis
+                    else analyze(args.base_sha, args.head_sha, exports))
     except subprocess.CalledProcessError as exc:
         print("❌ Failed to list changed files")
         print(exc.stderr)
         return 1
+    except (OSError, ValueError, KeyError) as exc:
+        print(f"❌ Unable to read change analysis: {exc}")
+        return 1
 
-    ui_changed_files = [f for f in changed_files if is_ui_file(f)]
+    changed_files = analysis.changed_files
+    ui_changed_files = list(analysis.ui_files)
     comparable_pages = [f for f in changed_files if is_comparable_html(f)]
+    affected_pages: dict[str, list[str]] = {}
 
-    if not ui_changed_files or not comparable_pages:
+    if not analysis.render_inputs_changed:
         write_summary(output_markdown, ui_changed_files, comparable_pages, [])
+        if args.shard is not None:
+            write_partial_results(partial_results_path(artifacts_dir, args.shard), args.shard, ui_changed_files,
+                                  comparable_pages, [], None, {}, None, variants)
         print(output_markdown.read_text(encoding="utf-8"))
         return 0
 
-    work_dir = Path(tempfile.mkdtemp(prefix="ui-diff-"))
-    base_dir = work_dir / "base"
-    head_dir = work_dir / "head"
-
     results: list[PageDiffResult] = []
 
     try:
-        export_revision(args.base_sha, base_dir)
-        export_revision(args.head_sha, head_dir)
-
-        from playwright.sync_api import Error as PlaywrightError  # type: ignore
+        affected_pages = analysis.affected_pages
+        comparable_pages = list(affected_pages)
+        dependency_files = {cause for causes in affected_pages.values() for cause in causes}
+        ui_changed_files = [f for f in changed_files if is_ui_file(f) or f in dependency_files]
+
+        # Only the pages this run renders get their scripts, images and data exported
+        base_dir = exports.export_pages(analysis.base_sha, shard_pages(comparable_pages, args.shard))
+        head_dir = exports.export_pages(analysis.head_sha, shard_pages(comparable_pages, args.shard))
+
+        page_images: dict[tuple[str, Variant], tuple[Path, Path, Path]] = {}
+        page_sites: dict[str, tuple[Path, Path]] = {}
+        for page in shard_pages(comparable_pages, args.shard):
+            base_page = base_dir / page
+            head_page = head_dir / page
+            if not base_page.exists() or not head_page.exists():
+                continue
+
+            normalized_page = str(page).replace("\\", "/")
+            safe_page_id = normalized_page.lstrip("/").replace("/", "__")
+
+            page_sites[page] = (base_dir, head_dir)
+            for variant in variants:
+                # A matrix run keeps each variant in its own folder; the default run keeps the flat layout
+                variant_dir = artifacts_dir / variant.name if show_variants else artifacts_dir
+                base_img = variant_dir / "base" / f"{safe_page_id}.png"
+                head_img = variant_dir / "head" / f"{safe_page_id}.png"
+                diff_img = variant_dir / "diff" / f"{safe_page_id}.png"
+                page_images[(page, variant)] = (base_img, head_img, diff_img)
+
+        settings_variant = f"assets={args.asset_mode};{render.variant}"
+        cache_keys = {
+            (page, variant): tuple(
+                screenshot_cache_key(site_dir, page, viewport=variant.viewport,
+                                     variant=settings_variant + (f";theme={variant.theme}" if variant.theme else ""))
+                for site_dir in (base_dir, head_dir))
+            for page in page_sites for variant in variants
+        } if cache is not None else {}
+        decided, element_notes, capture_errors = {}, {}, {}
+        if page_sites:
+            renderer = connect_renderer(
+                args.concurrency, assets, render, use_daemon=not args.no_daemon,
+                ports={base_dir: args.base_port, head_dir: args.head_port})
+            print(f"Rendering {len(variants)} variant(s) with the {renderer.name} renderer")
+            decided, element_notes, capture_errors = asyncio.run(capture_pages(
+                page_sites, variants, page_images, cache_keys, cache, affected_pages, renderer,
+                not args.skip_dom_snapshot))
+
+        for page in shard_pages(comparable_pages, args.shard):
+            if page not in page_sites:
+                results.append(PageDiffResult(
+                    page=page, status="skipped", diff_percent=0.0, notes="page missing in one revision"))
+                continue
+
+            for variant in variants:
+                entry = (page, variant)
+                page_images[entry][2].unlink(missing_ok=True)  # A diff from an earlier run must not outlive this one
+                if entry in decided:
+                    results.append(decided[entry])
+                    continue
 
-        with LocalServer(base_dir, args.base_port) as base_server, LocalServer(head_dir, args.head_port) as head_server:
-            for page in comparable_pages:
-                base_page = base_dir / page
-                head_page = head_dir / page
-                if not base_page.exists() or not head_page.exists():
+                base_img, head_img, diff_img = page_images[entry]
+                capture_error = capture_errors.get(base_img) or capture_errors.get(head_img)
+                if capture_error is not None:
                     results.append(PageDiffResult(
-                        page=page, status="skipped", diff_percent=0.0, notes="page missing in one revision"))
+                        page=page, status="error", diff_percent=0.0, notes=str(capture_error), variant=variant.name))
                     continue
 
-                normalized_page = str(page).replace("\\", "/")
-                safe_page_id = normalized_page.lstrip("/").replace("/", "__")
-
-                base_img = artifacts_dir / "base" / f"{safe_page_id}.png"
-                head_img = artifacts_dir / "head" / f"{safe_page_id}.png"
-                diff_img = artifacts_dir / "diff" / f"{safe_page_id}.png"
-
                 try:
-                    capture_screenshot(
-                        f"http://127.0.0.1:{base_server.port}/{page}", base_img)
-                    capture_screenshot(
-                        f"http://127.0.0.1:{head_server.port}/{page}", head_img)
-                    diff_percent, size_note = compute_diff(
-                        base_img, head_img, diff_img)
-                    status = "changed" if diff_percent > 0 else "no-visible-change"
-                    notes = size_note + \
-                        ("; diff image saved" if diff_percent > 0 else "")
+                    stage, stage_note = find_identical_stage(
+                        base_img, head_img, args.perceptual_max_distance)
+                    if stage is not None:
+                        results.append(PageDiffResult(
+                            page=page, status="no-visible-change", diff_percent=0.0,
+                            notes="; ".join(filter(None, [stage_note, element_notes.get(entry)])), stage=stage,
+                            variant=variant.name))
+                        continue
+
+                    pixel_diff = compute_diff(
+                        base_img, head_img, diff_img, tolerance=args.tolerance)
+                    status = "changed" if pixel_diff.diff_percent > 0 else "no-visible-change"
+                    notes = pixel_diff.size_note
+                    if pixel_diff.regions:
+                        notes += f"; {describe_regions(pixel_diff.regions)}; diff image saved"
+                    if entry in element_notes:
+                        notes += f"; {element_notes[entry]}"
                     results.append(PageDiffResult(
-                        page=page, status=status, diff_percent=diff_percent, notes=notes))
-                except (PlaywrightError, OSError, RuntimeError) as exc:
+                        page=page, status=status, diff_percent=pixel_diff.diff_percent, notes=notes,
+                        stage=STAGE_PIXEL_DIFF, variant=variant.name))
+                except OSError as exc:
                     results.append(PageDiffResult(
-                        page=page, status="error", diff_percent=0.0, notes=str(exc)))
+                        page=page, status="error", diff_percent=0.0, notes=str(exc), variant=variant.name))
+
+        if args.store:
+            stored = store_outputs([path for images in page_images.values() for path in images],
+                                   [images[2] for images in page_images.values() if not images[2].exists()])
+            print(stored or f"No screenshot store contains {artifacts_dir}; images left as written")
 
     except subprocess.CalledProcessError as exc:
         print("❌ Failed to export git revisions")
@@ -295,8 +968,14 @@ def main() -> int:
         return 1
     finally:
         write_summary(output_markdown, ui_changed_files,
-                      comparable_pages, results)
-        shutil.rmtree(work_dir, ignore_errors=True)
+                      comparable_pages, results, cache, affected_pages, assets, show_variants)
+        if args.shard is not None:
+            write_partial_results(partial_results_path(artifacts_dir, args.shard), args.shard, ui_changed_files,
+                                  comparable_pages, results, cache, affected_pages, assets, variants)
+        print(exports.summary())
+        exports.prune()
+        if cache is not None:
+            print(cache.prune())
 
     print(output_markdown.read_text(encoding="utf-8"))
 
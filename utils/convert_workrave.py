@@ -3,11 +3,29 @@ import os
 import sys
 import json
 import argparse
+import datetime
+import heapq
 
 # --- Configuration ---
 # Default paths - these can now be overridden by command-line arguments
 DEFAULT_WORKRAVE_TXT_PATH = 'workrave_stats.txt'
 DEFAULT_JSON_OUTPUT_PATH = 'workrave_stats.json'
+ROLLUPS_SUFFIX = '.rollups.json'
+MANIFEST_SUFFIX = '.manifest.json'
+SHARD_PERIODS = ('year', 'month')
+
+# Rollup settings - keep in sync with archive/plotly_stats.html
+ROLLUP_METRICS = ('usage', 'keystrokes', 'mouse_movement', 'mouse_clicks', 'break_duration')
+ROLLUP_PERIODS = ('daily', 'weekly', 'monthly', 'yearly')
+HISTOGRAM_BINS = 40
+HISTOGRAM_TOP_PERCENTILE = 99
+USAGE_OUTLIER_THRESHOLD_MINUTES = 1440
+
+# Bit flags matching the dashboard's "Hide days with" filters
+FLAG_ZERO_ACTIVITY = 1
+FLAG_ZERO_USAGE = 2
+FLAG_NO_BREAK_DATA = 4
+FLAG_USAGE_OUTLIER = 8
 
 # --- IMPORTANT: Try different encodings for input if UTF-8 doesn't work ---
 # Common encodings: 'utf-8', 'latin-1', 'cp1252' (Windows ANSI)
@@ -98,28 +116,369 @@ def parse_line(line):
     return None
 
 
-# --- Main conversion script ---
-def main(workrave_txt_path, json_output_path):
-    """Main function to parse WorkRave data and convert it to JSON."""
-    daily_stats = []
-    current_daily_entry = None
+# --- Rollups sidecar ---
+def dashboard_date(date_parts):
+    """Returns the calendar date the dashboard plots for a start/end date dict.
+
+    The dashboard builds dates with `new Date(year, month - 1, day)`, so month and
+    day overflow roll over the same way JavaScript's Date does.
+    """
+    months = date_parts["year"] * 12 + date_parts["month"] - 1
+    first_of_month = datetime.date(months // 12, months % 12 + 1, 1)
+    return first_of_month + datetime.timedelta(days=date_parts["day"] - 1)
+
+
+def dashboard_datetime(date_parts, time_parts):
+    """Returns the local datetime the dashboard uses for usage calculations."""
+    return datetime.datetime.combine(dashboard_date(date_parts), datetime.time()) + datetime.timedelta(
+        hours=time_parts["hour"], minutes=time_parts["minute"])
+
+
+def day_metrics(entry):
+    """Derives the per-day values the dashboard charts from a daily entry."""
+    usage = (dashboard_datetime(entry["end_date"], entry["end_time"]) -
+             dashboard_datetime(entry["start_date"], entry["start_time"])).total_seconds() / 60
+    activity = entry.get("activity_stats") or {}
+    keystrokes = activity.get("keystrokes", 0)
+    mouse_movement = activity.get("mouse_movement_units", 0)
+    mouse_clicks = activity.get("mouse_clicks", 0)
+
+    # values[1] is the break duration in seconds
+    break_by_type = {}
+    for break_stat in entry.get("break_stats", []):
+        values = break_stat.get("values", [])
+        seconds = values[1] if len(values) > 1 else 0
+        break_type = str(break_stat["break_type"])
+        break_by_type[break_type] = break_by_type.get(break_type, 0) + seconds / 60
+    break_duration = sum(break_by_type.values())
+
+    flags = 0
+    if not (keystrokes > 0 or mouse_movement > 0 or mouse_clicks > 0):
+        flags |= FLAG_ZERO_ACTIVITY
+    if usage <= 0:
+        flags |= FLAG_ZERO_USAGE
+    if break_duration <= 0:
+        flags |= FLAG_NO_BREAK_DATA
+    if usage > USAGE_OUTLIER_THRESHOLD_MINUTES:
+        flags |= FLAG_USAGE_OUTLIER
+
+    return {
+        "date": dashboard_date(entry["start_date"]),
+        "usage": usage,
+        "keystrokes": keystrokes,
+        "mouse_movement": mouse_movement,
+        "mouse_clicks": mouse_clicks,
+        "break_duration": break_duration,
+        "break_by_type": break_by_type,
+        "flags": flags,
+    }
+
+
+def period_bounds(day, period):
+    """Returns (key, first_day, last_day) of the rollup period containing a date."""
+    if period == "daily":
+        return day.isoformat(), day, day
+    if period == "weekly":
+        iso_year, iso_week, iso_weekday = day.isocalendar()
+        first_day = day - datetime.timedelta(days=iso_weekday - 1)
+        return f"{iso_year}-W{iso_week:02d}", first_day, first_day + datetime.timedelta(days=6)
+    if period == "monthly":
+        first_day = day.replace(day=1)
+        next_month = (first_day + datetime.timedelta(days=32)).replace(day=1)
+        return first_day.strftime("%Y-%m"), first_day, next_month - datetime.timedelta(days=1)
+    if period == "yearly":
+        return str(day.year), datetime.date(day.year, 1, 1), datetime.date(day.year, 12, 31)
+    raise ValueError(f"Unknown rollup period: {period}")
+
+
+def median(values):
+    """Median matching the dashboard's calculateMedian (None when empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    mid = len(ordered) // 2
+    if len(ordered) % 2 == 0:
+        return (ordered[mid - 1] + ordered[mid]) / 2
+    return ordered[mid]
+
+
+def modes(values):
+    """Mode(s) matching the dashboard's calculateMode (empty when no distinct mode)."""
+    counts = {}
+    for value in values:
+        counts[value] = counts.get(value, 0) + 1
+    if not counts:
+        return []
+    max_count = max(counts.values())
+    result = sorted(value for value, count in counts.items() if count == max_count)
+    return [] if len(result) == len(values) else result
+
+
+def linear_regression(values):
+    """Least-squares trend (y = m * x + b) over sequential indices, like calculateLinearRegression."""
+    n = len(values)
+    if n == 0:
+        return {"m": 0, "b": 0}
+    sum_x = n * (n - 1) / 2
+    sum_x2 = (n - 1) * n * (2 * n - 1) / 6
+    sum_y = sum(values)
+    sum_xy = sum(i * y for i, y in enumerate(values))
+    denominator = n * sum_x2 - sum_x * sum_x
+    if denominator == 0:
+        return {"m": 0, "b": sum_y / n}
+    m = (n * sum_xy - sum_x * sum_y) / denominator
+    return {"m": m, "b": (sum_y - m * sum_x) / n}
+
+
+def histogram_edges(values):
+    """Fixed, evenly spaced bin edges shared by every rollup row of a metric.
+
+    The top edge stops at the 99th percentile so a single runaway day (e.g. a
+    multi-day session) does not squash every other day into the first bin;
+    larger values are counted in the last bin.
+    """
+    if not values:
+        return [0] * (HISTOGRAM_BINS + 1)
+    ordered = sorted(values)
+    low = ordered[0]
+    high = ordered[min(len(ordered) - 1, int(len(ordered) * HISTOGRAM_TOP_PERCENTILE / 100))]
+    if high <= low:
+        high = ordered[-1]
+    width = (high - low) / HISTOGRAM_BINS
+    return [low + width * i for i in range(HISTOGRAM_BINS)] + [high]
+
+
+def histogram_counts(values, edges):
+    """Counts values into the bins described by histogram_edges."""
+    counts = [0] * HISTOGRAM_BINS
+    low, high = edges[0], edges[-1]
+    width = (high - low) / HISTOGRAM_BINS
+    for value in values:
+        index = int((value - low) / width) if width else 0
+        counts[min(max(index, 0), HISTOGRAM_BINS - 1)] += 1
+    return counts
+
+
+def rounded(value):
+    """Keeps the sidecar compact; four decimals is finer than any chart shows."""
+    return round(value, 4) if isinstance(value, float) else value
+
+
+def metric_summary(values, detailed=True):
+    """Aggregates one metric the way the summary panel does (min ignores zeros)."""
+    positive = [value for value in values if value > 0]
+    summary = {
+        "sum": rounded(sum(values)),
+        "mean": rounded(sum(values) / len(values)) if values else 0,
+        "min": rounded(min(positive)) if positive else 0,
+        "max": rounded(max(values)) if values else 0,
+    }
+    if detailed:
+        summary["median"] = rounded(median(values))
+        summary["mode"] = [rounded(value) for value in modes(values)]
+    return summary
+
+
+def build_rollups(daily_stats, source_name=None):
+    """Precomputes daily/weekly/monthly/yearly rollups, per-break-type aggregates and histogram bins.
+
+    Each period is stored column-wise so the dashboard can hand the arrays to
+    Plotly as-is. Daily rows carry the filter flags instead of histograms.
+    """
+    return build_rollups_from_metrics([day_metrics(entry) for entry in daily_stats], source_name)
+
+
+def build_rollups_from_metrics(day_metric_rows, source_name=None):
+    """Same as build_rollups, for callers that already hold day_metrics() rows."""
+    days = sorted(day_metric_rows, key=lambda day: day["date"])
+    break_types = sorted({break_type for day in days for break_type in day["break_by_type"]}, key=int)
+    edges = {metric: histogram_edges([day[metric] for day in days]) for metric in ROLLUP_METRICS}
+
+    rollups = {}
+    for period in ROLLUP_PERIODS:
+        detailed = period != "daily"
+        groups = {}
+        for day in days:
+            key, first_day, last_day = period_bounds(day["date"], period)
+            group = groups.setdefault(key, {"start": first_day, "end": last_day, "days": []})
+            group["days"].append(day)
+
+        columns = {"period": [], "start": [], "end": [], "days": []}
+        for metric in ROLLUP_METRICS:
+            columns[metric] = {}
+        columns["break_by_type"] = {break_type: [] for break_type in break_types}
+        if not detailed:
+            columns["flags"] = []
+
+        for key, group in groups.items():
+            columns["period"].append(key)
+            columns["start"].append(group["start"].isoformat())
+            columns["end"].append(group["end"].isoformat())
+            columns["days"].append(len(group["days"]))
+            for metric in ROLLUP_METRICS:
+                values = [day[metric] for day in group["days"]]
+                stats = metric_summary(values, detailed)
+                if detailed:
+                    stats["histogram"] = histogram_counts(values, edges[metric])
+                for stat, value in stats.items():
+                    columns[metric].setdefault(stat, []).append(value)
+            for break_type in break_types:
+                columns["break_by_type"][break_type].append(
+                    rounded(sum(day["break_by_type"].get(break_type, 0) for day in group["days"])))
+            if not detailed:
+                flags = 0
+                for day in group["days"]:
+                    flags |= day["flags"]
+                columns["flags"].append(flags)
+        rollups[period] = columns
+
+    summary = {"days": len(days)}
+    for metric in ROLLUP_METRICS:
+        values = [day[metric] for day in days]
+        summary[metric] = metric_summary(values)
+        summary[metric]["histogram"] = histogram_counts(values, edges[metric])
+        summary[metric]["trend"] = {key: rounded(value) for key, value in linear_regression(values).items()}
+
+    break_type_aggregates = []
+    for break_type in break_types:
+        minutes = [day["break_by_type"][break_type] for day in days if break_type in day["break_by_type"]]
+        break_type_aggregates.append({
+            "break_type": int(break_type),
+            "days_present": len(minutes),
+            "total_minutes": rounded(sum(minutes)),
+            "avg_minutes_per_day": rounded(sum(minutes) / len(days)) if days else 0,
+            "max_minutes": rounded(max(minutes)) if minutes else 0,
+        })
+
+    return {
+        "version": 1,
+        "source": source_name,
+        "first_date": days[0]["date"].isoformat() if days else None,
+        "last_date": days[-1]["date"].isoformat() if days else None,
+        "metrics": list(ROLLUP_METRICS),
+        "flags": {
+            "zero_activity": FLAG_ZERO_ACTIVITY,
+            "zero_usage": FLAG_ZERO_USAGE,
+            "no_break_data": FLAG_NO_BREAK_DATA,
+            "usage_outlier": FLAG_USAGE_OUTLIER,
+        },
+        "histogram_edges": {metric: [rounded(edge) for edge in metric_edges] for metric, metric_edges in edges.items()},
+        "break_types": break_type_aggregates,
+        "summary": summary,
+        "rollups": rollups,
+    }
+
+
+def default_rollups_path(json_output_path):
+    """Sidecar path next to the JSON output, e.g. workrave_stats.rollups.json."""
+    root, _ = os.path.splitext(json_output_path)
+    return root + ROLLUPS_SUFFIX
+
+
+# --- Sharded output ---
+def shard_key(day, shard_by):
+    """Year ("2024") or month ("2024-03") shard a dashboard date belongs to."""
+    return str(day.year) if shard_by == 'year' else f"{day.year}-{day.month:02d}"
+
+
+class ShardWriter:
+    """Streams daily entries into per-year or per-month JSON files next to the main output.
+
+    Each shard is a compact JSON array named like workrave_stats.2024.json.
+    close() writes workrave_stats.manifest.json with each shard's dashboard
+    date bounds and row count, so the dashboard can fetch only the shards
+    that overlap the selected range. Shards stay open until close(), so
+    entries may arrive in any order without being buffered. They are written
+    to temporary files that close() moves into place; abort() discards them.
+    """
+
+    def __init__(self, json_output_path, shard_by):
+        self.json_output_path = json_output_path
+        self.shard_by = shard_by
+        self.root, _ = os.path.splitext(json_output_path)
+        self.shards = {}
+
+    def add(self, entry):
+        day = dashboard_date(entry["start_date"])
+        key = shard_key(day, self.shard_by)
+        shard = self.shards.get(key)
+        if shard is None:
+            path = f"{self.root}.{key}.json"
+            shard = {"key": key, "path": path, "file": open(temp_path_for(path), 'w', encoding='utf-8'),
+                     "start": day, "end": day, "rows": 0}
+            shard["file"].write('[')
+            self.shards[key] = shard
+        else:
+            shard["file"].write(',')
+        shard["file"].write(json.dumps(entry, separators=(',', ':'), ensure_ascii=False))
+        shard["start"] = min(shard["start"], day)
+        shard["end"] = max(shard["end"], day)
+        shard["rows"] += 1
+
+    def close(self):
+        """Finishes every shard, writes the manifest and returns its path."""
+        shards = []
+        for key in sorted(self.shards):
+            shard = self.shards[key]
+            shard["file"].write(']')
+            shard["file"].close()
+            os.replace(temp_path_for(shard["path"]), shard["path"])
+            shards.append({
+                "key": key,
+                "file": os.path.basename(shard["path"]),
+                "start": shard["start"].isoformat(),
+                "end": shard["end"].isoformat(),
+                "rows": shard["rows"],
+            })
+
+        manifest = {
+            "version": 1,
+            "source": os.path.basename(self.json_output_path),
+            "shard_by": self.shard_by,
+            "first_date": shards[0]["start"] if shards else None,
+            "last_date": max(shard["end"] for shard in shards) if shards else None,
+            "rows": sum(shard["rows"] for shard in shards),
+            "shards": shards,
+        }
+        manifest_path = self.root + MANIFEST_SUFFIX
+        with open(temp_path_for(manifest_path), 'w', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2, ensure_ascii=False)
+        os.replace(temp_path_for(manifest_path), manifest_path)
+        return manifest_path
+
+    def abort(self):
+        """Discards the unfinished shards, leaving any previous ones in place."""
+        for shard in self.shards.values():
+            shard["file"].close()
+            temp_path = temp_path_for(shard["path"])
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self.shards = {}
+
+
+# --- Streaming parser ---
+def detect_encoding(workrave_txt_path):
+    """Returns the encoding to read a historystats file with (UTF-8, else latin-1).
 
+    The check streams the file, so memory stays flat for large histories.
+    """
     try:
-        # Use an explicit check for encoding to provide better feedback
-        content_lines = []
-        try:
-            with open(workrave_txt_path, 'r', encoding=input_encoding) as f:
-                content_lines = f.readlines()
-        except UnicodeDecodeError:
-            print(f"Warning: Failed to decode '{workrave_txt_path}' with {input_encoding}. Trying 'latin-1'...")
-            try:
-                with open(workrave_txt_path, 'r', encoding='latin-1') as f:
-                    content_lines = f.readlines()
-            except UnicodeDecodeError:
-                print(f"Error: Failed to decode '{workrave_txt_path}' with 'latin-1' too. Please check your file encoding.")
-                return # Exit if encoding fails
+        with open(workrave_txt_path, 'r', encoding=input_encoding) as f:
+            for _ in f:
+                pass
+        return input_encoding
+    except UnicodeDecodeError:
+        print(f"Warning: Failed to decode '{workrave_txt_path}' with {input_encoding}. Trying 'latin-1'...")
+        return 'latin-1'
+
+
+def iter_daily_entries(workrave_txt_path, encoding=None):
+    """Yields daily entries, with their B and m lines attached, one at a time."""
+    encoding = encoding or detect_encoding(workrave_txt_path)
+    current_daily_entry = None
 
-        for line in content_lines:
+    with open(workrave_txt_path, 'r', encoding=encoding) as f:
+        for line in f:
             line = line.strip()
             if not line or line.startswith('WorkRaveStats'):  # Skip header or empty lines
                 continue
@@ -128,8 +487,8 @@ def main(workrave_txt_path, json_output_path):
 
             if parsed_data:
                 if parsed_data["type"] == "daily":
-                    if current_daily_entry:  # Save the previous entry if it exists
-                        daily_stats.append(current_daily_entry)
+                    if current_daily_entry:  # Emit the previous entry if it exists
+                        yield current_daily_entry
                     current_daily_entry = parsed_data
                     # Initialize activity_stats and break_stats for consistency
                     current_daily_entry.setdefault("break_stats", [])
@@ -154,8 +513,189 @@ def main(workrave_txt_path, json_output_path):
                 # else: pass # Skipping unparseable lines
             # If parsed_data is None (due to malformed line), it's skipped
 
-        if current_daily_entry:  # Add the last entry after loop finishes
-            daily_stats.append(current_daily_entry)
+    if current_daily_entry:  # Emit the last entry after loop finishes
+        yield current_daily_entry
+
+
+def temp_path_for(path):
+    """Sibling path to write before os.replace() puts the finished file in place."""
+    return f"{path}.{os.getpid()}.tmp"
+
+
+def write_json_array(entries, json_output_path):
+    """Streams entries into a JSON array formatted exactly like json.dumps(..., indent=2).
+
+    The array is written to a temporary file that replaces json_output_path only
+    once every entry has been read, so a failing source leaves the previous
+    output untouched. Returns the number of entries written.
+    """
+    count = 0
+    temp_path = temp_path_for(json_output_path)
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as json_file:
+            for entry in entries:
+                json_file.write('[\n' if count == 0 else ',\n')
+                entry_json = json.dumps(entry, indent=2, ensure_ascii=False)
+                json_file.write('\n'.join('  ' + line for line in entry_json.split('\n')))
+                count += 1
+            json_file.write('\n]' if count else '[]')
+        os.replace(temp_path, json_output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return count
+
+
+# --- Multi-machine merge ---
+def merge_key(entry):
+    """Entries are merged per start date."""
+    start = entry["start_date"]
+    return (start["year"], start["month"], start["day"])
+
+
+def _date_time_key(date_parts, time_parts):
+    return (date_parts["year"], date_parts["month"], date_parts["day"], time_parts["hour"], time_parts["minute"])
+
+
+def merge_daily_entries(target, other):
+    """Folds another machine's entry for the same day into target.
+
+    The day spans the earliest start to the latest end, activity counters are
+    summed, and break stats are combined per break type. values[0] of a break
+    line is WorkRave's field count, so it is kept rather than summed.
+    """
+    if _date_time_key(other["start_date"], other["start_time"]) < _date_time_key(target["start_date"], target["start_time"]):
+        target["start_date"], target["start_time"] = other["start_date"], other["start_time"]
+    if _date_time_key(other["end_date"], other["end_time"]) > _date_time_key(target["end_date"], target["end_time"]):
+        target["end_date"], target["end_time"] = other["end_date"], other["end_time"]
+
+    other_activity = other.get("activity_stats") or {}
+    if other_activity:
+        activity = target.get("activity_stats") or {}
+        if not activity:
+            target["activity_stats"] = dict(other_activity, other_metrics=list(other_activity["other_metrics"]))
+        else:
+            for field in ("keystrokes", "mouse_movement_units", "mouse_clicks"):
+                activity[field] += other_activity[field]
+            activity["other_metrics"] = [a + b for a, b in zip(activity["other_metrics"], other_activity["other_metrics"])]
+
+    breaks_by_type = {break_stat["break_type"]: break_stat for break_stat in target["break_stats"]}
+    for break_stat in other["break_stats"]:
+        existing = breaks_by_type.get(break_stat["break_type"])
+        if existing is None:
+            copied = {"break_type": break_stat["break_type"], "values": list(break_stat["values"])}
+            target["break_stats"].append(copied)
+            breaks_by_type[break_stat["break_type"]] = copied
+        else:
+            existing["values"] = existing["values"][:1] + [
+                a + b for a, b in zip(existing["values"][1:], break_stat["values"][1:])]
+    return target
+
+
+def _ordered_entries(workrave_txt_path, stats):
+    """Streams one source, warning if it is not in start-date order (the merge relies on it)."""
+    previous_key = None
+    for entry in iter_daily_entries(workrave_txt_path):
+        key = merge_key(entry)
+        if previous_key is not None and key < previous_key and workrave_txt_path not in stats["unordered"]:
+            stats["unordered"].append(workrave_txt_path)
+            print(f"Warning: '{workrave_txt_path}' is not in start-date order; some days may not be merged.")
+        previous_key = key
+        yield entry
+
+
+def iter_merged_entries(source_paths, stats=None):
+    """Heap-based k-way merge of several historystats files by start date.
+
+    Holds one pending entry per source plus the day being combined, so memory
+    does not grow with history length. Identical entries (e.g. the same file
+    synced to two machines) are counted once.
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault("duplicates", 0)
+    stats.setdefault("combined", 0)
+    stats.setdefault("unordered", [])
+
+    streams = [_ordered_entries(path, stats) for path in source_paths]
+    current = None
+    current_key = None
+    seen = []
+    for entry in heapq.merge(*streams, key=merge_key):
+        key = merge_key(entry)
+        if key == current_key:
+            if entry in seen:
+                stats["duplicates"] += 1
+                continue
+            seen.append(entry)
+            merge_daily_entries(current, entry)
+            stats["combined"] += 1
+            continue
+        if current is not None:
+            yield current
+        current_key = key
+        seen = [entry]
+        current = json.loads(json.dumps(entry))  # Keep `seen` comparisons against the unmerged entry
+    if current is not None:
+        yield current
+
+
+def merge_main(source_paths, json_output_path, rollups_output_path=None, shard_by=None):
+    """Merges several machines' historystats files into one JSON output in a single pass.
+
+    Memory stays flat in the merge itself, but the rollups sidecar needs the
+    whole history at once (medians, percentile histogram edges), so with
+    rollups on (the default) one small day_metrics() row per day is kept. That
+    is around a kilobyte a day; use --no-rollups if even that is too much.
+    Outputs are only replaced once every source has been read.
+    """
+    stats = {}
+    day_metric_rows = []
+    shard_writer = ShardWriter(json_output_path, shard_by) if shard_by else None
+
+    def tracked(entries):
+        for entry in entries:
+            if rollups_output_path:
+                day_metric_rows.append(day_metrics(entry))
+            if shard_writer:
+                shard_writer.add(entry)
+            yield entry
+
+    try:
+        count = write_json_array(tracked(iter_merged_entries(source_paths, stats)), json_output_path)
+
+        print(f"Successfully merged {len(source_paths)} sources into '{json_output_path}' "
+              f"({count} days, {stats['combined']} overlapping entries combined, {stats['duplicates']} duplicates dropped)")
+
+        if shard_writer:
+            print(f"Wrote {len(shard_writer.shards)} {shard_by} shards and manifest '{shard_writer.close()}'")
+
+        if rollups_output_path:
+            rollups = build_rollups_from_metrics(day_metric_rows, os.path.basename(json_output_path))
+            with open(temp_path_for(rollups_output_path), 'w', encoding='utf-8') as rollups_file:
+                json.dump(rollups, rollups_file, separators=(',', ':'), ensure_ascii=False)
+            os.replace(temp_path_for(rollups_output_path), rollups_output_path)
+            print(f"Wrote rollups sidecar to '{rollups_output_path}'")
+
+    except FileNotFoundError as e:
+        print(f"Error: The file '{e.filename}' was not found. Please check the --source paths.")
+    except Exception as e:
+        exc_type, exc_obj, exc_tb = sys.exc_info()
+        fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
+        print(f"An unexpected error occurred during merge: {exc_type.__name__} - {e} at {fname} line {exc_tb.tb_lineno}")
+    finally:
+        if shard_writer:
+            shard_writer.abort()  # No-op once close() has moved the shards into place
+
+
+# --- Main conversion script ---
+def main(workrave_txt_path, json_output_path, rollups_output_path=None, shard_by=None):
+    """Main function to parse WorkRave data and convert it to JSON.
+
+    When rollups_output_path is given, a precomputed rollups sidecar is written too.
+    shard_by ('year' or 'month') additionally writes sharded files plus a manifest.
+    """
+    try:
+        daily_stats = list(iter_daily_entries(workrave_txt_path))
 
         json_string = json.dumps(daily_stats, indent=2, ensure_ascii=False)
 
@@ -164,6 +704,18 @@ def main(workrave_txt_path, json_output_path):
 
         print(f"Successfully converted '{workrave_txt_path}' to '{json_output_path}'")
 
+        if rollups_output_path:
+            rollups = build_rollups(daily_stats, os.path.basename(json_output_path))
+            with open(rollups_output_path, 'w', encoding='utf-8') as rollups_file:
+                json.dump(rollups, rollups_file, separators=(',', ':'), ensure_ascii=False)
+            print(f"Wrote rollups sidecar to '{rollups_output_path}'")
+
+        if shard_by:
+            shard_writer = ShardWriter(json_output_path, shard_by)
+            for entry in daily_stats:
+                shard_writer.add(entry)
+            print(f"Wrote {len(shard_writer.shards)} {shard_by} shards and manifest '{shard_writer.close()}'")
+
     except FileNotFoundError:
         print(f"Error: The file '{workrave_txt_path}' was not found. Please ensure it's in the same directory as the script or provide the correct path.")
     except Exception as e:
@@ -179,8 +731,10 @@ if __name__ == "__main__":
     parser.add_argument(
         '-s', '--source',
         type=str,
-        default=DEFAULT_WORKRAVE_TXT_PATH,
-        help=f"Path to the source WorkRave historystats text file (default: {DEFAULT_WORKRAVE_TXT_PATH})"
+        nargs='+',
+        default=[DEFAULT_WORKRAVE_TXT_PATH],
+        help=f"Path to the source WorkRave historystats text file (default: {DEFAULT_WORKRAVE_TXT_PATH}). "
+             "Pass several files (one per machine) to merge them into one output."
     )
     parser.add_argument(
         '-d', '--destination',
@@ -188,6 +742,28 @@ if __name__ == "__main__":
         default=DEFAULT_JSON_OUTPUT_PATH,
         help=f"Path for the output JSON file (default: {DEFAULT_JSON_OUTPUT_PATH})"
     )
+    parser.add_argument(
+        '-r', '--rollups',
+        type=str,
+        default=None,
+        help=f"Path for the precomputed rollups sidecar (default: <destination>{ROLLUPS_SUFFIX})"
+    )
+    parser.add_argument(
+        '--no-rollups',
+        action='store_true',
+        help="Skip writing the rollups sidecar"
+    )
+    parser.add_argument(
+        '--shard',
+        choices=SHARD_PERIODS,
+        default=None,
+        help=f"Also write per-year or per-month JSON shards plus <destination>{MANIFEST_SUFFIX} "
+             "so the dashboard can load only the selected date range"
+    )
     args = parser.parse_args()
 
-    main(args.source, args.destination)
+    rollups_path = None if args.no_rollups else (args.rollups or default_rollups_path(args.destination))
+    if len(args.source) > 1:
+        merge_main(args.source, args.destination, rollups_path, args.shard)
+    else:
+        main(args.source[0], args.destination, rollups_path, args.shard)
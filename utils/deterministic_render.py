@@ -0,0 +1,146 @@
+"""
+Deterministic render mode for screenshot capture.
+
+Live counters (the 100 ms ticker in compliance-tracker.html, the 200 ms
+ledger.html updates) and CSS animations give every capture different pixels,
+and waiting for network idle adds latency on every page. In deterministic mode
+both capture tools install an init script before any page script runs that:
+
+- freezes Date (new Date(), Date(), Date.now()) at a fixed instant, by default
+  one after every date the pages count from (ledger.html's priority date,
+  compliance-tracker.html's mandate date, the ledger's notice dates),
+- runs each setInterval callback once, soon after it is registered, instead of
+  repeatedly, so tickers render their value at the frozen instant and stay there,
+- disables CSS animations, transitions and the text caret.
+
+setTimeout and requestAnimationFrame keep working, so one-shot initialisation
+still completes. Instead of waiting for network idle, the page is loaded up to
+the load event and the capture then waits for an explicit ready condition
+(document complete, fonts loaded, every interval callback run once, and
+window.__captureReady unless a page sets it to false until it has finished
+rendering).
+
+Examples:
+  python generate_pr_screenshots.py --deterministic --frozen-time 2026-03-01T00:00:00Z
+  python utils/compare_ui_screenshots.py --base-sha A --head-sha B --deterministic
+"""
+
+from __future__ import annotations
+
+import datetime
+from dataclasses import dataclass
+
+
+DEFAULT_FROZEN_TIME = "2026-03-01T12:00:00+00:00"
+DEFAULT_READY_CONDITION = (
+    "document.readyState === 'complete'"
+    " && (!document.fonts || document.fonts.status === 'loaded')"
+    " && !window.__pendingIntervalTicks"
+    " && window.__captureReady !== false"
+)
+READY_TIMEOUT_MS = 15000
+
+DETERMINISTIC_INIT_SCRIPT = """
+(() => {
+    const frozen = __FROZEN_MS__;
+    const RealDate = Date;
+    function FrozenDate(...args) {
+        if (!new.target) return new RealDate(frozen).toString();
+        return args.length ? new RealDate(...args) : new RealDate(frozen);
+    }
+    FrozenDate.prototype = RealDate.prototype;
+    FrozenDate.now = () => frozen;
+    FrozenDate.parse = RealDate.parse;
+    FrozenDate.UTC = RealDate.UTC;
+    window.Date = FrozenDate;
+
+    // Each interval ticks once, at the frozen instant, and then stops
+    const realSetTimeout = window.setTimeout.bind(window);
+    const realClearTimeout = window.clearTimeout.bind(window);
+    const realClearInterval = window.clearInterval.bind(window);
+    const singleTicks = new Map();
+    let nextIntervalId = 1;
+    window.__pendingIntervalTicks = 0;
+    window.setInterval = function (callback, delay, ...args) {
+        const id = -(nextIntervalId++);  // Negative ids never clash with real timers
+        window.__pendingIntervalTicks += 1;
+        singleTicks.set(id, realSetTimeout(() => {
+            singleTicks.delete(id);
+            try {
+                if (typeof callback === 'function') callback(...args);
+                else (0, eval)(String(callback));
+            } finally {
+                window.__pendingIntervalTicks -= 1;
+            }
+        }, 0));
+        return id;
+    };
+    window.clearInterval = function (id) {
+        if (singleTicks.has(id)) {
+            realClearTimeout(singleTicks.get(id));
+            singleTicks.delete(id);
+            window.__pendingIntervalTicks -= 1;
+        } else {
+            realClearInterval(id);
+        }
+    };
+
+    const freezeStyles = () => {
+        const style = document.createElement('style');
+        style.setAttribute('data-deterministic-render', '');
+        style.textContent = '*, *::before, *::after {'
+            + ' animation: none !important; transition: none !important; caret-color: transparent !important; }';
+        document.documentElement.appendChild(style);
+    };
+    if (document.documentElement) {
+        freezeStyles();
+    } else {
+        document.addEventListener('DOMContentLoaded', freezeStyles);
+    }
+})();
+"""
+
+
+def parse_frozen_time(value: str) -> int:
+    """ISO 8601 instant -> epoch milliseconds (naive times are taken as UTC)."""
+    parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+@dataclass
+class RenderSettings:
+    """How pages are loaded before capture; the defaults reproduce the old network-idle behavior."""
+
+    deterministic: bool = False
+    frozen_time: str = DEFAULT_FROZEN_TIME
+    ready_condition: str = DEFAULT_READY_CONDITION
+
+    @property
+    def wait_until(self) -> str:
+        return "load" if self.deterministic else "networkidle"
+
+    @property
+    def screenshot_options(self) -> dict:
+        return {"animations": "disabled"} if self.deterministic else {}
+
+    @property
+    def variant(self) -> str:
+        """Describes the settings for cache keys."""
+        if not self.deterministic:
+            return "live-clock"
+        return f"frozen@{parse_frozen_time(self.frozen_time)};ready={self.ready_condition}"
+
+    def init_script(self) -> str:
+        return DETERMINISTIC_INIT_SCRIPT.replace("__FROZEN_MS__", str(parse_frozen_time(self.frozen_time)))
+
+    # --- Playwright adapters ---
+    async def prepare_async(self, target) -> None:
+        """Installs the init script on an async Playwright context or page."""
+        if self.deterministic:
+            await target.add_init_script(script=self.init_script())
+
+    async def wait_ready_async(self, page) -> None:
+        if self.deterministic:
+            await page.wait_for_function(self.ready_condition, timeout=READY_TIMEOUT_MS)
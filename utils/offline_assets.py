@@ -0,0 +1,124 @@
+"""
+Serve external page assets from a local cache during screenshot capture.
+
+Pages pull Google Fonts, the Plotly CDN and other third-party files. Fetching
+them live makes captures slow, flaky and impossible offline. Both capture
+tools (generate_pr_screenshots.py and utils/compare_ui_screenshots.py) install
+an OfflineAssets route handler on their browser contexts:
+
+- live: no interception (previous behavior).
+- record: external requests go to the network and successful responses are
+  stored in the cache directory, which seeds it.
+- offline: external requests are answered from the cache; anything not cached
+  is aborted so the page cannot wait on the network.
+
+Requests to the local preview server (127.0.0.1/localhost) and data/blob URLs
+are never intercepted. Each cached response is stored as <sha256(url)>.body
+with a .json sidecar holding the URL, status and the few headers that affect
+rendering (content type and CORS).
+
+Examples:
+  python generate_pr_screenshots.py --asset-mode record --asset-cache-dir .asset-cache
+  python utils/compare_ui_screenshots.py --base-sha A --head-sha B --asset-mode offline --asset-cache-dir .asset-cache
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+
+ASSET_MODES = ("live", "record", "offline")
+LOCAL_HOSTS = ("127.0.0.1", "localhost", "::1")
+PASSTHROUGH_SCHEMES = ("data", "blob", "about", "file")
+KEPT_HEADERS = ("content-type", "access-control-allow-origin", "timing-allow-origin")
+
+
+def normalize_url(url: str) -> str:
+    """Drops the fragment, which never reaches the server."""
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, parts.query, ""))
+
+
+def is_external(url: str) -> bool:
+    parts = urlsplit(url)
+    if parts.scheme in PASSTHROUGH_SCHEMES:
+        return False
+    return (parts.hostname or "") not in LOCAL_HOSTS
+
+
+@dataclass
+class CachedAsset:
+    url: str
+    status: int
+    headers: dict[str, str]
+    body: bytes
+
+
+@dataclass
+class OfflineAssets:
+    """Route handler state for one capture run; counters feed the reports."""
+
+    cache_dir: Path
+    mode: str = "offline"
+    served: int = 0
+    recorded: int = 0
+    blocked: set[str] = field(default_factory=set)
+
+    def _paths(self, url: str) -> tuple[Path, Path]:
+        key = hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+        stem = self.cache_dir / key[:2] / key
+        return stem.with_suffix(".body"), stem.with_suffix(".json")
+
+    def get(self, url: str) -> CachedAsset | None:
+        body_path, meta_path = self._paths(url)
+        if not body_path.is_file() or not meta_path.is_file():
+            return None
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        return CachedAsset(meta["url"], meta["status"], meta["headers"], body_path.read_bytes())
+
+    def put(self, url: str, status: int, headers: dict[str, str], body: bytes) -> None:
+        body_path, meta_path = self._paths(url)
+        body_path.parent.mkdir(parents=True, exist_ok=True)
+        kept = {name: value for name, value in headers.items() if name.lower() in KEPT_HEADERS}
+        for path, data in ((body_path, body),
+                           (meta_path, json.dumps({"url": normalize_url(url), "status": status, "headers": kept},
+                                                  indent=2).encode("utf-8"))):
+            temp_path = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+            temp_path.write_bytes(data)
+            os.replace(temp_path, path)
+
+    def summary(self) -> str:
+        if self.mode == "record":
+            return f"Offline assets: {self.recorded} recorded, {self.served} served from cache"
+        return f"Offline assets: {self.served} served from cache, {len(self.blocked)} blocked"
+
+    # --- Playwright adapters ---
+    async def install_async(self, target) -> None:
+        """Routes every request of an async Playwright context or page through this cache."""
+        if self.mode != "live":
+            await target.route("**/*", self._handle_async)
+
+    async def _handle_async(self, route) -> None:
+        url = route.request.url
+        if not is_external(url):
+            await route.continue_()
+            return
+        cached = self.get(url)
+        if cached is not None:
+            self.served += 1
+            await route.fulfill(status=cached.status, headers=cached.headers, body=cached.body)
+        elif self.mode == "record":
+            response = await route.fetch()
+            body = await response.body()
+            if response.ok:
+                self.put(url, response.status, response.headers, body)
+                self.recorded += 1
+            await route.fulfill(response=response, body=body)
+        else:
+            self.blocked.add(normalize_url(url))
+            await route.abort("blockedbyclient")
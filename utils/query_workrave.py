@@ -0,0 +1,262 @@
+"""
+Query WorkRave stats by date range and predicates without a browser.
+
+This is the command-line counterpart of the dashboard's custom query box
+(archive/plotly_stats.html). Sources can be historystats text files or the
+JSON written by convert_workrave.py. Each day is reduced to the values the
+dashboard charts (convert_workrave.day_metrics), so dates and numbers match
+the browser, including its month handling.
+
+Behavior:
+- Days are kept in a date-sorted index; --start/--end ranges are found by
+  binary search instead of a scan.
+- --where takes the dashboard query syntax ("usage > 300") and can repeat
+  (clauses are ANDed). --weekdays/--weekends, --min-usage/--max-usage and
+  --break-type narrow the days further.
+- Results stream out as CSV (the browser's Date,Metric,Value,Query columns),
+  JSON or JSON Lines, with numeric values in JSON. A Source column/field is
+  added when several sources are queried. Sources are told apart by their
+  resolved path and shown by file name unless two share one.
+
+Examples:
+  python utils/query_workrave.py -s workrave_stats.json --where "usage > 300"
+  python utils/query_workrave.py -s alice.txt -s bob.txt --start 2023-01-01 --end 2023-12-31 --weekends -f jsonl
+  python utils/query_workrave.py -s workrave_stats.txt --break-type 2 --metric break_duration -o workrave_query_results.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import csv
+import datetime
+import json
+import operator
+import re
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, TextIO
+
+from convert_workrave import day_metrics, iter_daily_entries
+
+
+METRICS = ("usage", "keystrokes", "mouse_movement", "mouse_clicks", "break_duration")
+QUERY_PATTERN = re.compile(r"^\s*([a-zA-Z_]+)\s*([<>=!]+)\s*(\d+(\.\d+)?)\s*$")
+OPERATORS: dict[str, Callable[[float, float], bool]] = {
+    ">": operator.gt,
+    "<": operator.lt,
+    ">=": operator.ge,
+    "<=": operator.le,
+    "==": operator.eq,
+    "=": operator.eq,  # the dashboard allows single equals for equality
+    "!=": operator.ne,
+}
+CSV_HEADER = ("Date", "Metric", "Value", "Query")
+OUTPUT_FORMATS = ("csv", "json", "jsonl")
+
+
+@dataclass(frozen=True)
+class Query:
+    """One "metric operator value" clause from the dashboard query syntax."""
+
+    metric: str
+    operator: str
+    value: float
+    text: str
+
+    def matches(self, day: dict) -> bool:
+        return OPERATORS[self.operator](day[self.metric], self.value)
+
+
+def parse_query(text: str) -> Query:
+    """Parses a dashboard-style query, raising ValueError with the dashboard's messages."""
+    match = QUERY_PATTERN.match(text)
+    if not match:
+        raise ValueError('Invalid query format. Please use "metric operator value" (e.g., "usage > 300").')
+    metric, op, value = match.group(1).lower(), match.group(2), float(match.group(3))
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric: '{metric}'. Please use one of: {', '.join(METRICS)}.")
+    if op not in OPERATORS:
+        raise ValueError(f"Unsupported operator: '{op}'. Please use one of: >, <, >=, <=, ==, !=.")
+    return Query(metric, op, value, text.strip())
+
+
+class DateIndex:
+    """Day metrics from one or more sources, sorted by date for range lookups."""
+
+    def __init__(self, days: Iterable[dict]):
+        self.days = sorted(days, key=lambda day: (day["date"], day["source"]))
+        self.ordinals = [day["date"].toordinal() for day in self.days]
+        self.sources = sorted({day["source"] for day in self.days})
+
+    def source_labels(self) -> dict[str, str]:
+        """Display name per source: the file name, or the full path where file names collide."""
+        names = [Path(source).name for source in self.sources]
+        return {source: name if names.count(name) == 1 else source for source, name in zip(self.sources, names)}
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def range(self, start: datetime.date | None = None, end: datetime.date | None = None) -> Iterator[dict]:
+        """Yields days with start <= date <= end (either bound may be omitted)."""
+        lo = bisect.bisect_left(self.ordinals, start.toordinal()) if start else 0
+        hi = bisect.bisect_right(self.ordinals, end.toordinal()) if end else len(self.days)
+        for position in range(lo, hi):
+            yield self.days[position]
+
+
+def iter_source_days(path: str | Path) -> Iterator[dict]:
+    """Yields day metrics from a historystats text file or a converted JSON file."""
+    path = Path(path)
+    if path.suffix.lower() == ".json":
+        with path.open("r", encoding="utf-8") as handle:
+            entries = json.load(handle)
+    else:
+        entries = iter_daily_entries(str(path))
+    for entry in entries:
+        day = day_metrics(entry)
+        day["source"] = str(path.resolve())
+        yield day
+
+
+def build_index(paths: list[str | Path]) -> DateIndex:
+    """Loads every source into one date index, keeping only the compact per-day values."""
+    return DateIndex(day for path in paths for day in iter_source_days(path))
+
+
+def build_predicates(args: argparse.Namespace, queries: list[Query]) -> list[Callable[[dict], bool]]:
+    predicates: list[Callable[[dict], bool]] = [query.matches for query in queries]
+    if args.weekdays:
+        predicates.append(lambda day: day["date"].weekday() < 5)
+    if args.weekends:
+        predicates.append(lambda day: day["date"].weekday() >= 5)
+    if args.min_usage is not None:
+        predicates.append(lambda day: day["usage"] >= args.min_usage)
+    if args.max_usage is not None:
+        predicates.append(lambda day: day["usage"] <= args.max_usage)
+    if args.break_type is not None:
+        break_type = str(args.break_type)
+        predicates.append(lambda day: day["break_by_type"].get(break_type, 0) > 0)
+    return predicates
+
+
+def iter_results(
+    days: Iterable[dict],
+    predicates: list[Callable[[dict], bool]],
+    metrics: list[str],
+    query_text: str,
+    source_labels: dict[str, str] | None = None,
+) -> Iterator[dict]:
+    """Yields one result row per matching day and requested metric, with a source if labels are given."""
+    for day in days:
+        if not all(predicate(day) for predicate in predicates):
+            continue
+        for metric in metrics:
+            row = {
+                "date": day["date"].isoformat(),
+                "metric": metric,
+                "value": round(day[metric], 2),
+                "query": query_text,
+            }
+            if source_labels:
+                row["source"] = source_labels[day["source"]]
+            yield row
+
+
+def write_csv(rows: Iterable[dict], out: TextIO, with_source: bool = False) -> int:
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(CSV_HEADER + (("Source",) if with_source else ()))
+    count = 0
+    for row in rows:
+        writer.writerow([f"{value:.2f}" if key == "value" else value for key, value in row.items()])
+        count += 1
+    return count
+
+
+def write_json(rows: Iterable[dict], out: TextIO) -> int:
+    count = 0
+    for row in rows:
+        out.write("[\n  " if count == 0 else ",\n  ")
+        out.write(json.dumps(row, ensure_ascii=False))
+        count += 1
+    out.write("\n]\n" if count else "[]\n")
+    return count
+
+
+def write_jsonl(rows: Iterable[dict], out: TextIO) -> int:
+    count = 0
+    for row in rows:
+        out.write(json.dumps(row, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+def parse_date(value: str) -> datetime.date:
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Query WorkRave stats by date range and predicates, streaming CSV/JSON results.")
+    parser.add_argument("-s", "--source", action="append", required=True,
+                        help="Historystats text file or converted JSON (can repeat to query several users)")
+    parser.add_argument("--start", type=parse_date, help="First date to include (YYYY-MM-DD)")
+    parser.add_argument("--end", type=parse_date, help="Last date to include (YYYY-MM-DD)")
+    parser.add_argument("-w", "--where", action="append", default=[],
+                        help='Dashboard-style condition such as "usage > 300" (can repeat; all must match)')
+    day_group = parser.add_mutually_exclusive_group()
+    day_group.add_argument("--weekdays", action="store_true", help="Only Monday-Friday")
+    day_group.add_argument("--weekends", action="store_true", help="Only Saturday and Sunday")
+    parser.add_argument("--min-usage", type=float, help="Minimum usage in minutes")
+    parser.add_argument("--max-usage", type=float, help="Maximum usage in minutes")
+    parser.add_argument("--break-type", type=int, help="Only days with break time of this type")
+    parser.add_argument("-m", "--metric", action="append", choices=METRICS,
+                        help="Metric to output (can repeat; defaults to the --where metrics, else usage)")
+    parser.add_argument("-f", "--format", choices=OUTPUT_FORMATS, default="csv", help="Output format (default: csv)")
+    parser.add_argument("-o", "--output", help="Write results to this file instead of stdout")
+    args = parser.parse_args()
+
+    try:
+        queries = [parse_query(text) for text in args.where]
+    except ValueError as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 1
+
+    try:
+        index = build_index(args.source)
+    except FileNotFoundError as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 1
+
+    metrics = args.metric or list(dict.fromkeys(query.metric for query in queries)) or ["usage"]
+    with_source = len(index.sources) > 1
+    rows = iter_results(
+        index.range(args.start, args.end),
+        build_predicates(args, queries),
+        metrics,
+        " and ".join(query.text for query in queries),
+        index.source_labels() if with_source else None,
+    )
+
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        if args.format == "csv":
+            count = write_csv(rows, out, with_source)
+        elif args.format == "json":
+            count = write_json(rows, out)
+        else:
+            count = write_jsonl(rows, out)
+    finally:
+        if args.output:
+            out.close()
+
+    print(f"Matched {count} row(s) from {len(index)} day(s) in {len(index.sources)} source(s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
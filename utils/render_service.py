@@ -0,0 +1,724 @@
+"""
+Page rendering shared by the screenshot tools, in-process or through a warm daemon.
+
+Starting a static file server and a cold Chromium dominates short local runs.
+This module holds the rendering pieces both tools use and a long-lived daemon
+that keeps them warm between runs:
+
+- LocalServer serves a site directory on an ephemeral 127.0.0.1 port.
+- BrowserPool shares one browser per run; every visit gets a fresh context and
+  at most `concurrency` pages are open at once.
+- LocalRenderer renders RenderJobs (site directory, page, viewport, themes) in
+  this process, starting one LocalServer per site directory on demand.
+- A RenderJob is one page load: each of its themes is switched in turn through
+  the site's applyTheme() and captured without reloading, so a viewport x theme
+  matrix (see Variant and build_matrix) costs one load per viewport.
+- DaemonRenderer has the same interface but sends each job to a running daemon.
+
+Start the daemon with `python utils/render_service.py serve`. It listens on
+127.0.0.1:8765 (override with --address or RENDER_DAEMON=host:port), speaks
+newline-delimited JSON, one request per connection, and keeps its browser and
+per-directory file servers alive. Tools call connect_renderer(), which pings the
+daemon and falls back to a LocalRenderer when none answers (RENDER_DAEMON=off
+forces the fallback). Asset and render settings travel with each job, and the
+daemon reports offline-asset counters back so reports stay accurate.
+
+Any local process can reach a TCP port, so every request carries a token the
+daemon writes at startup to a file only its user can read (see token_path());
+requests without it are refused. Screenshots are only written inside the
+daemon's output directories (--output-dir, default: where it was started).
+
+Examples:
+  python utils/render_service.py serve --concurrency 6
+  python utils/render_service.py ping
+  python utils/render_service.py stop
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import functools
+import hmac
+import json
+import os
+import secrets
+import socket
+import sys
+import threading
+from dataclasses import dataclass, field
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from deterministic_render import RenderSettings
+from offline_assets import OfflineAssets
+
+
+VIEWPORT = {"width": 1440, "height": 1800}
+DEFAULT_CONCURRENCY = 4
+DEFAULT_DAEMON_ADDRESS = ("127.0.0.1", 8765)
+DAEMON_ENV = "RENDER_DAEMON"
+PROTOCOL_VERSION = 3
+PING_TIMEOUT_SECONDS = 0.25
+
+# Serializes every rendered element: its path, attributes, own text, box and computed
+# styles (including ::before/::after content). Pixels drawn outside the DOM, such as
+# canvas or media, are listed in "opaque" so an identical snapshot is not trusted.
+DOM_SNAPSHOT_SCRIPT = """
+() => {
+    const skip = new Set(['HEAD', 'SCRIPT', 'STYLE', 'LINK', 'META', 'TITLE', 'NOSCRIPT', 'TEMPLATE']);
+    const styleOf = (el, pseudo) => {
+        const style = getComputedStyle(el, pseudo);
+        const values = {};
+        for (const name of style) values[name] = style.getPropertyValue(name);
+        return values;
+    };
+    const elements = [];
+    const walk = (el, path) => {
+        if (skip.has(el.tagName)) return;
+        const rect = el.getBoundingClientRect();
+        const attributes = {};
+        for (const attr of el.attributes) attributes[attr.name] = attr.value;
+        const record = {
+            path,
+            attributes,
+            text: Array.from(el.childNodes)
+                .filter(node => node.nodeType === Node.TEXT_NODE)
+                .map(node => node.textContent).join('').replace(/\\s+/g, ' ').trim(),
+            box: [rect.x, rect.y, rect.width, rect.height].map(v => Math.round(v * 100) / 100),
+            styles: styleOf(el, null),
+        };
+        for (const pseudo of ['::before', '::after']) {
+            if (getComputedStyle(el, pseudo).content !== 'none') record[pseudo] = styleOf(el, pseudo);
+        }
+        if (el.value !== undefined && typeof el.value === 'string') record.value = el.value;
+        elements.push(record);
+        const counts = {};
+        for (const child of el.children) {
+            const tag = child.tagName.toLowerCase();
+            counts[tag] = (counts[tag] || 0) + 1;
+            walk(child, `${path} > ${tag}:nth-of-type(${counts[tag]})`);
+        }
+    };
+    walk(document.documentElement, 'html');
+    const opaque = ['canvas', 'video', 'iframe', 'embed', 'object']
+        .filter(tag => document.getElementsByTagName(tag).length > 0);
+    return { opaque, elements };
+}
+"""
+
+THEMES = ("light", "dark")
+# Uses the site's theme.js when present so button labels follow the theme too, then
+# waits two frames so the new styles are painted before the next capture
+APPLY_THEME_SCRIPT = """
+async theme => {
+    if (typeof applyTheme === 'function') {
+        applyTheme(theme, false);
+    } else {
+        document.documentElement.setAttribute('data-theme', theme);
+    }
+    await new Promise(resolve => requestAnimationFrame(() => requestAnimationFrame(resolve)));
+}
+"""
+
+
+@dataclass(frozen=True)
+class Variant:
+    """One cell of the render matrix; an empty theme leaves the page's own theme alone."""
+
+    width: int
+    height: int
+    theme: str = ""
+
+    @property
+    def viewport(self) -> dict[str, int]:
+        return {"width": self.width, "height": self.height}
+
+    @property
+    def name(self) -> str:
+        return f"{self.width}x{self.height}" + (f"-{self.theme}" if self.theme else "")
+
+
+DEFAULT_VARIANT = Variant(VIEWPORT["width"], VIEWPORT["height"])
+
+
+def parse_viewport(value: str) -> tuple[int, int]:
+    """Parses "WIDTHxHEIGHT" (e.g. "390x844")."""
+    width, sep, height = value.lower().partition("x")
+    try:
+        size = (int(width), int(height))
+    except ValueError:
+        size = None
+    if not sep or size is None or min(size) < 1:
+        raise argparse.ArgumentTypeError(f"Invalid viewport '{value}', expected WIDTHxHEIGHT such as 1440x1800")
+    return size
+
+
+def build_matrix(viewports: list[tuple[int, int]], themes: list[str]) -> list[Variant]:
+    """Every viewport x theme combination, grouped by viewport; no themes keeps each page's own."""
+    return [Variant(width, height, theme)
+            for width, height in dict.fromkeys(viewports or [(VIEWPORT["width"], VIEWPORT["height"])])
+            for theme in dict.fromkeys(themes or [""])]
+
+
+async def apply_theme(page, theme: str) -> None:
+    if theme:
+        await page.emulate_media(color_scheme=theme)
+        await page.evaluate(APPLY_THEME_SCRIPT, theme)
+
+
+@dataclass
+class CaptureJob:
+    url: str
+    output_path: Path
+    viewport: dict[str, int] = field(default_factory=lambda: dict(VIEWPORT))
+    full_page: bool = True
+    theme: str = ""
+
+
+@dataclass
+class RenderJob:
+    """One load of a page from a site directory.
+
+    Each entry of `themes` is applied in turn ("" keeps the page's own theme) and
+    screenshotted to the matching entry of `outputs`; with no outputs the job
+    takes a DOM snapshot per theme instead.
+    """
+
+    root: Path
+    page: str
+    outputs: list[Path] = field(default_factory=list)
+    viewport: dict[str, int] = field(default_factory=lambda: dict(VIEWPORT))
+    full_page: bool = True
+    themes: list[str] = field(default_factory=lambda: [""])
+
+    def to_json(self) -> dict:
+        return {
+            "root": str(Path(self.root).resolve()),
+            "page": self.page,
+            "outputs": [str(Path(path).resolve()) for path in self.outputs],
+            "viewport": self.viewport,
+            "full_page": self.full_page,
+            "themes": self.themes,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "RenderJob":
+        return cls(
+            root=Path(data["root"]),
+            page=data["page"],
+            outputs=[Path(path) for path in data.get("outputs", [])],
+            viewport=data.get("viewport") or dict(VIEWPORT),
+            full_page=data.get("full_page", True),
+            themes=data.get("themes") or [""],
+        )
+
+
+class LocalServer:
+    def __init__(self, directory: Path, port: int):
+        self.directory = directory
+        self.port = port
+        self.httpd: ThreadingHTTPServer | None = None
+        self.thread: threading.Thread | None = None
+
+    def __enter__(self) -> "LocalServer":
+        handler = functools.partial(
+            SimpleHTTPRequestHandler, directory=str(self.directory))
+        # The socket is listening once the server is constructed, so no settle delay is needed
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", self.port), handler)
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+        if self.thread:
+            self.thread.join(timeout=2)
+
+
+class BrowserPool:
+    """One browser shared by every capture in a run, with at most `concurrency` pages open.
+
+    Each visit gets a fresh context so pages cannot leak localStorage or
+    cookies into each other.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        assets: OfflineAssets | None = None,
+        render: RenderSettings | None = None,
+    ):
+        self.semaphore = asyncio.Semaphore(max(1, concurrency))
+        self.assets = assets
+        self.render = render or RenderSettings()
+        self._playwright = None
+        self.browser = None
+
+    async def __aenter__(self) -> "BrowserPool":
+        from playwright.async_api import async_playwright  # type: ignore
+
+        self._playwright = await async_playwright().start()
+        try:
+            self.browser = await self._playwright.chromium.launch()
+        except BaseException:
+            await self._playwright.stop()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if self.browser:
+            await self.browser.close()
+        if self._playwright:
+            await self._playwright.stop()
+
+    def with_settings(self, assets: OfflineAssets | None, render: RenderSettings | None) -> "BrowserPool":
+        """Another view of the same warm browser and page limit with different capture settings."""
+        view = BrowserPool(assets=assets, render=render)
+        view.semaphore = self.semaphore
+        view.browser = self.browser
+        return view
+
+    async def visit(self, url: str, action, viewport: dict[str, int] | None = None, setup=None):
+        """Loads url in a new context and returns `await action(page)`, or the exception raised.
+
+        `await setup(context)` runs before the page is created, e.g. to expose bindings.
+        """
+        from playwright.async_api import Error as PlaywrightError  # type: ignore
+
+        async with self.semaphore:
+            context = await self.browser.new_context(viewport=viewport or VIEWPORT)
+            try:
+                if self.assets is not None:
+                    await self.assets.install_async(context)
+                await self.render.prepare_async(context)
+                if setup is not None:
+                    await setup(context)
+                page = await context.new_page()
+                await page.goto(url, wait_until=self.render.wait_until)
+                await self.render.wait_ready_async(page)
+                return await action(page)
+            except (PlaywrightError, OSError, RuntimeError) as exc:
+                return exc
+            finally:
+                await context.close()
+
+    async def screenshot(self, job: CaptureJob) -> Exception | None:
+        return await self.screenshot_themes(job.url, [job.output_path], job.viewport, job.full_page, [job.theme])
+
+    async def screenshot_themes(
+        self,
+        url: str,
+        outputs: list[Path],
+        viewport: dict[str, int] | None = None,
+        full_page: bool = True,
+        themes: list[str] | None = None,
+    ) -> Exception | None:
+        """Loads url once and screenshots each theme in turn to the matching output."""
+        for path in outputs:
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+        async def take(page) -> None:
+            for theme, path in zip(themes or [""], outputs):
+                await apply_theme(page, theme)
+                await page.screenshot(path=str(path), full_page=full_page, **self.render.screenshot_options)
+
+        return await self.visit(url, take, viewport)
+
+    async def snapshot(self, url: str, viewport: dict[str, int] | None = None) -> dict | Exception:
+        snapshots = await self.snapshot_themes(url, viewport)
+        return snapshots if isinstance(snapshots, Exception) else snapshots[0]
+
+    async def snapshot_themes(
+        self,
+        url: str,
+        viewport: dict[str, int] | None = None,
+        themes: list[str] | None = None,
+    ) -> list[dict] | Exception:
+        """Loads url once and returns a DOM snapshot per theme."""
+        async def take(page) -> list[dict]:
+            snapshots = []
+            for theme in themes or [""]:
+                await apply_theme(page, theme)
+                snapshots.append(await page.evaluate(DOM_SNAPSHOT_SCRIPT))
+            return snapshots
+
+        return await self.visit(url, take, viewport)
+
+
+async def capture_screenshots(
+    jobs: list[CaptureJob],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    assets: OfflineAssets | None = None,
+    render: RenderSettings | None = None,
+) -> dict[Path, Exception | None]:
+    """Captures every job with one shared browser, returning the error (or None) per output path."""
+    from playwright.async_api import Error as PlaywrightError  # type: ignore
+
+    try:
+        async with BrowserPool(concurrency, assets, render) as pool:
+            errors = await asyncio.gather(*(pool.screenshot(job) for job in jobs))
+    except PlaywrightError as exc:
+        return {job.output_path: exc for job in jobs}
+    return {job.output_path: error for job, error in zip(jobs, errors)}
+
+
+def capture_screenshot(url: str, output_path: Path) -> None:
+    """Captures a single page; prefer capture_screenshots() for several pages."""
+    error = asyncio.run(capture_screenshots([CaptureJob(url, output_path)]))[output_path]
+    if error is not None:
+        raise error
+
+
+class LocalRenderer:
+    """Renders jobs in this process: one LocalServer per site directory plus one BrowserPool."""
+
+    name = "in-process"
+
+    def __init__(
+        self,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        assets: OfflineAssets | None = None,
+        render: RenderSettings | None = None,
+        ports: dict[Path, int] | None = None,
+    ):
+        self.pool = BrowserPool(concurrency, assets, render)
+        self.servers: dict[Path, LocalServer] = {}
+        self.ports = {Path(root).resolve(): port for root, port in (ports or {}).items()}
+
+    async def __aenter__(self) -> "LocalRenderer":
+        await self.pool.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        try:
+            await self.pool.__aexit__(exc_type, exc, tb)
+        finally:
+            for server in self.servers.values():
+                server.__exit__(None, None, None)
+            self.servers.clear()
+
+    def url_for(self, root: Path, page: str) -> str:
+        root = Path(root).resolve()
+        server = self.servers.get(root)
+        if server is None:
+            server = self.servers[root] = LocalServer(root, self.ports.get(root, 0)).__enter__()
+        return f"http://127.0.0.1:{server.port}/{page.lstrip('/')}"
+
+    def release(self, roots) -> None:
+        """Stops the file servers of site directories that will not be rendered again."""
+        for root in roots:
+            server = self.servers.pop(Path(root).resolve(), None)
+            if server is not None:
+                server.__exit__(None, None, None)
+
+    async def screenshot(self, job: RenderJob, pool: BrowserPool | None = None) -> Exception | None:
+        return await (pool or self.pool).screenshot_themes(
+            self.url_for(job.root, job.page), [Path(path) for path in job.outputs], job.viewport, job.full_page,
+            job.themes)
+
+    async def snapshot(self, job: RenderJob, pool: BrowserPool | None = None) -> list[dict] | Exception:
+        """One DOM snapshot per theme of the job."""
+        return await (pool or self.pool).snapshot_themes(self.url_for(job.root, job.page), job.viewport, job.themes)
+
+
+def settings_to_json(assets: OfflineAssets | None, render: RenderSettings | None) -> dict:
+    render = render or RenderSettings()
+    return {
+        "asset_mode": assets.mode if assets else "live",
+        "asset_cache_dir": str(Path(assets.cache_dir).resolve()) if assets else None,
+        "deterministic": render.deterministic,
+        "frozen_time": render.frozen_time,
+        "ready_condition": render.ready_condition,
+    }
+
+
+def settings_from_json(data: dict) -> tuple[OfflineAssets | None, RenderSettings]:
+    assets = None
+    if data.get("asset_mode", "live") != "live":
+        assets = OfflineAssets(Path(data["asset_cache_dir"]), data["asset_mode"])
+    render = RenderSettings(data.get("deterministic", False), data["frozen_time"], data["ready_condition"])
+    return assets, render
+
+
+class DaemonRenderer:
+    """Same interface as LocalRenderer, but every job is rendered by a running daemon."""
+
+    name = "daemon"
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        assets: OfflineAssets | None = None,
+        render: RenderSettings | None = None,
+        token: str | None = None,
+    ):
+        self.address = address
+        self.token = token
+        self.client = secrets.token_hex(8)  # Names this renderer's site directories in the daemon's counts
+        self.assets = assets
+        self.settings = settings_to_json(assets, render)
+        self.roots: set[str] = set()
+
+    async def __aenter__(self) -> "DaemonRenderer":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        # Revision exports are shared per tree SHA, so the daemon only stops a file server
+        # once no other client is still rendering from that directory
+        if self.roots:
+            await self._send({"op": "release", "client": self.client, "roots": sorted(self.roots)})
+
+    async def _request(self, op: str, job: RenderJob) -> dict:
+        payload = job.to_json()
+        self.roots.add(payload["root"])
+        response = await self._send({"op": op, "client": self.client, "job": payload, "settings": self.settings})
+        if self.assets is not None and "assets" in response:
+            self.assets.served += response["assets"]["served"]
+            self.assets.recorded += response["assets"]["recorded"]
+            self.assets.blocked.update(response["assets"]["blocked"])
+        return response
+
+    async def _send(self, payload: dict) -> dict:
+        try:
+            reader, writer = await asyncio.open_connection(*self.address)
+        except OSError as exc:
+            return {"ok": False, "error": f"render daemon unreachable: {exc}"}
+        try:
+            writer.write(json.dumps({**payload, "token": self.token}).encode("utf-8") + b"\n")
+            await writer.drain()
+            line = await reader.readline()
+        except OSError as exc:
+            return {"ok": False, "error": f"render daemon connection failed: {exc}"}
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass  # Already reported above if the connection broke
+        if not line:
+            return {"ok": False, "error": "render daemon closed the connection"}
+        return json.loads(line)
+
+    async def screenshot(self, job: RenderJob) -> Exception | None:
+        response = await self._request("screenshot", job)
+        return None if response["ok"] else RuntimeError(response["error"])
+
+    async def snapshot(self, job: RenderJob) -> list[dict] | Exception:
+        response = await self._request("snapshot", job)
+        return response["snapshots"] if response["ok"] else RuntimeError(response["error"])
+
+
+def token_path(address: tuple[str, int]) -> Path:
+    """File holding the token of the daemon at address, in a directory only this user can read."""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    directory = Path(runtime_dir) if runtime_dir else Path.home() / ".cache"
+    return directory / "render-daemon" / f"{address[0]}-{address[1]}.token"
+
+
+def read_token(address: tuple[str, int]) -> str | None:
+    try:
+        return token_path(address).read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+
+
+def write_token(address: tuple[str, int]) -> str:
+    """Creates a new token for the daemon at address, readable by this user only."""
+    path = token_path(address)
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    os.chmod(path.parent, 0o700)
+    token = secrets.token_hex(32)
+    temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as handle:
+        handle.write(token)
+    os.replace(temp_path, path)
+    return token
+
+
+def parse_address(value: str) -> tuple[str, int]:
+    host, _, port = value.rpartition(":")
+    return (host or DEFAULT_DAEMON_ADDRESS[0], int(port))
+
+
+def request_daemon(address: tuple[str, int], payload: dict, timeout: float | None = None) -> dict:
+    """Sends one request (with this user's token) to the daemon synchronously and returns its reply."""
+    payload = {**payload, "token": read_token(address)}
+    with socket.create_connection(address, timeout=timeout) as connection:
+        connection.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+        with connection.makefile("rb") as reply:
+            line = reply.readline()
+    if not line:
+        raise ConnectionError("render daemon closed the connection")
+    return json.loads(line)
+
+
+def find_daemon(address: tuple[str, int] | None = None) -> tuple[str, int] | None:
+    """Address of a daemon that answers a ping, or None (also when RENDER_DAEMON=off)."""
+    configured = os.environ.get(DAEMON_ENV, "")
+    if configured.lower() in ("off", "0", "no"):
+        return None
+    if address is None:
+        address = parse_address(configured) if configured else DEFAULT_DAEMON_ADDRESS
+    try:
+        reply = request_daemon(address, {"op": "ping"}, timeout=PING_TIMEOUT_SECONDS)
+    except (OSError, ValueError):
+        return None
+    return address if reply.get("ok") and reply.get("protocol") == PROTOCOL_VERSION else None
+
+
+def connect_renderer(
+    concurrency: int = DEFAULT_CONCURRENCY,
+    assets: OfflineAssets | None = None,
+    render: RenderSettings | None = None,
+    use_daemon: bool = True,
+    ports: dict[Path, int] | None = None,
+) -> LocalRenderer | DaemonRenderer:
+    """A DaemonRenderer if a daemon is running, otherwise an in-process LocalRenderer.
+
+    Fixed ports only apply in-process; the daemon picks its own.
+    """
+    address = find_daemon() if use_daemon else None
+    if address is not None:
+        return DaemonRenderer(address, assets, render, read_token(address))
+    return LocalRenderer(concurrency, assets, render, ports)
+
+
+class RenderDaemon:
+    """Keeps a LocalRenderer warm and serves render requests on a local socket.
+
+    Only requests carrying the token from token_path() are served, and
+    screenshots may only be written inside output_dirs. Requests arrive one per
+    connection, so each client names itself; a site directory's file server
+    stops when the last client using it releases it.
+    """
+
+    def __init__(self, address: tuple[str, int], concurrency: int, output_dirs: list[Path]):
+        self.address = address
+        self.concurrency = concurrency
+        self.output_dirs = [Path(directory).resolve() for directory in output_dirs]
+        self.stopped = asyncio.Event()
+        self.renderer: LocalRenderer | None = None
+        self.token = ""
+        self.root_clients: dict[Path, set[str]] = {}  # Site directory -> clients that rendered from it
+
+    async def serve(self) -> None:
+        async with LocalRenderer(self.concurrency) as renderer:
+            self.renderer = renderer
+            server = await asyncio.start_server(self._handle, *self.address)
+            self.token = write_token(self.address)
+            try:
+                async with server:
+                    print(f"✅ Render daemon listening on {self.address[0]}:{self.address[1]} (pid {os.getpid()}), "
+                          f"writing to {', '.join(map(str, self.output_dirs))}")
+                    await self.stopped.wait()
+            finally:
+                if read_token(self.address) == self.token:  # Leave a newer daemon's token alone
+                    token_path(self.address).unlink(missing_ok=True)
+        print("Render daemon stopped")
+
+    def _outside_output_dirs(self, outputs: list[Path]) -> list[Path]:
+        return [path for path in outputs
+                if not any(path.resolve().is_relative_to(directory) for directory in self.output_dirs)]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            line = await reader.readline()
+            try:
+                response = await self._dispatch(json.loads(line))
+            except (ValueError, KeyError, TypeError) as exc:
+                response = {"ok": False, "error": f"bad request: {exc}"}
+            writer.write(json.dumps(response).encode("utf-8") + b"\n")
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _dispatch(self, request: dict) -> dict:
+        if not self.token or not hmac.compare_digest(str(request.get("token")), self.token):
+            return {"ok": False, "error": "unauthorized: missing or wrong render daemon token"}
+        op = request.get("op")
+        if op == "ping":
+            return {"ok": True, "protocol": PROTOCOL_VERSION, "pid": os.getpid(), "servers": len(self.renderer.servers)}
+        if op == "stop":
+            self.stopped.set()
+            return {"ok": True}
+        if op == "release":
+            unused = []
+            for root in request["roots"]:
+                root = Path(root).resolve()
+                clients = self.root_clients.get(root, set())
+                clients.discard(request["client"])
+                if not clients:
+                    self.root_clients.pop(root, None)
+                    unused.append(root)
+            self.renderer.release(unused)
+            return {"ok": True, "released": len(unused)}
+        if op not in ("screenshot", "snapshot"):
+            return {"ok": False, "error": f"unknown op '{op}'"}
+
+        job = RenderJob.from_json(request["job"])
+        self.root_clients.setdefault(Path(job.root).resolve(), set()).add(request["client"])
+        assets, render = settings_from_json(request["settings"])
+        pool = self.renderer.pool.with_settings(assets, render)
+        if op == "screenshot":
+            if len(job.outputs) != len(job.themes):
+                return {"ok": False, "error": "screenshot job needs one output path per theme"}
+            outside = self._outside_output_dirs(job.outputs)
+            if outside:
+                return {"ok": False, "error": f"output path outside the daemon's output directories: {outside[0]} "
+                                             f"(start it with --output-dir to allow more)"}
+            result = await self.renderer.screenshot(job, pool)
+            response = {"ok": result is None, "error": str(result) if result else None}
+        else:
+            result = await self.renderer.snapshot(job, pool)
+            failed = isinstance(result, Exception)
+            response = {"ok": not failed, "error": str(result) if failed else None, "snapshots": None if failed else result}
+        if assets is not None:
+            response["assets"] = {"served": assets.served, "recorded": assets.recorded, "blocked": sorted(assets.blocked)}
+        return response
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Warm render daemon for the screenshot tools.")
+    parser.add_argument("command", choices=("serve", "ping", "stop"))
+    parser.add_argument("--address", type=parse_address, default=None,
+                        help=f"host:port to use (default: ${DAEMON_ENV} or "
+                             f"{DEFAULT_DAEMON_ADDRESS[0]}:{DEFAULT_DAEMON_ADDRESS[1]})")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Pages rendered at once (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--output-dir", type=Path, action="append", default=[],
+                        help="Directory screenshots may be written in (can repeat; default: the current directory)")
+    args = parser.parse_args()
+
+    configured = os.environ.get(DAEMON_ENV, "")
+    address = args.address or (parse_address(configured) if configured and ":" in configured else DEFAULT_DAEMON_ADDRESS)
+
+    if args.command == "serve":
+        try:
+            asyncio.run(RenderDaemon(address, args.concurrency, args.output_dir or [Path.cwd()]).serve())
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    try:
+        reply = request_daemon(address, {"op": args.command}, timeout=2)
+    except OSError as exc:
+        print(f"❌ No render daemon at {address[0]}:{address[1]}: {exc}")
+        return 1
+    if not reply.get("ok"):
+        print(f"❌ Render daemon at {address[0]}:{address[1]} refused the request: {reply.get('error')}")
+        return 1
+    if args.command == "ping":
+        print(f"✅ Render daemon pid {reply['pid']} serving {reply['servers']} site dir(s)")
+    else:
+        print("✅ Render daemon stopping")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,348 @@
+"""
+Content-addressed store for the screenshots committed under pr-screenshots/.
+
+Full-page PNGs are large, and PR evidence often repeats the same capture under
+several names (pr13-before-* next to all-pages/base/*). Instead of committing
+every file, pr-screenshots/ commits:
+
+- blobs/<aa>/<digest>.png: one losslessly recompressed PNG per distinct image.
+  The digest is the SHA-256 of the decoded pixels, so the same picture saved
+  twice, or encoded differently, is stored once.
+- manifest.json: friendly path (relative to pr-screenshots/) -> digest, plus the
+  size, dimensions and byte hash of every blob.
+
+The friendly files themselves are working copies (ignored by git); `checkout`
+recreates them from the manifest. Recompression keeps whichever is smallest of
+the original bytes, a maximum-effort re-encode and, when the image has at most
+256 colors, an exact palette encoding; a candidate is only used if it decodes
+to the same pixels.
+
+generate_pr_screenshots.py writes through the store when its output directory
+is inside one (--no-store to opt out); utils/compare_ui_screenshots.py does so
+with --store. `verify` is the integrity check run in CI: every manifest entry
+must point at a blob whose bytes match the recorded hash (--pixels also decodes
+each blob and checks its digest).
+
+Examples:
+  python utils/screenshot_store.py import pr-screenshots/pr13-after-index.png
+  python utils/screenshot_store.py import pr-screenshots      # every PNG under it
+  python utils/screenshot_store.py checkout
+  python utils/screenshot_store.py verify --pixels
+  python utils/screenshot_store.py gc
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+
+DEFAULT_STORE_DIR = Path(__file__).resolve().parent.parent / "pr-screenshots"
+MANIFEST_NAME = "manifest.json"
+BLOBS_DIR = "blobs"
+MANIFEST_VERSION = 1
+PALETTE_MAX_COLORS = 256
+
+
+def file_sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def pixel_digest(image) -> str:
+    """SHA-256 of an image's size and RGBA pixels: equal for equal pictures, whatever the encoding."""
+    rgba = image.convert("RGBA")
+    digest = hashlib.sha256(f"{rgba.width}x{rgba.height};".encode("ascii"))
+    digest.update(rgba.tobytes())
+    return digest.hexdigest()
+
+
+def _encode(image, **options) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", optimize=True, **options)
+    return buffer.getvalue()
+
+
+def _palette_png(image) -> bytes | None:
+    """An exact palette ("P") encoding of image, or None when it has more than 256 colors."""
+    import numpy as np
+    from PIL import Image
+
+    rgba = np.ascontiguousarray(image.convert("RGBA"))
+    keys = rgba.view(np.uint32).reshape(rgba.shape[:2])
+    colors, indices = np.unique(keys, return_inverse=True)
+    if len(colors) > PALETTE_MAX_COLORS:
+        return None
+    palette = colors.view(np.uint8).reshape(-1, 4)
+    paletted = Image.fromarray(indices.reshape(keys.shape).astype(np.uint8), mode="P")
+    paletted.putpalette(palette[:, :3].tobytes(), rawmode="RGB")
+    if (palette[:, 3] != 255).any():
+        return _encode(paletted, compress_level=9, transparency=palette[:, 3].tobytes())
+    return _encode(paletted, compress_level=9)
+
+
+def optimize_png(data: bytes) -> tuple[bytes, str]:
+    """Returns (smallest lossless encoding of data, its pixel digest)."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        digest = pixel_digest(image)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        candidates = [_encode(image.convert("RGBA" if has_alpha else "RGB"), compress_level=9)]
+        paletted = _palette_png(image)
+        if paletted is not None:
+            candidates.append(paletted)
+
+    best = data
+    for candidate in candidates:
+        if len(candidate) >= len(best):
+            continue
+        with Image.open(io.BytesIO(candidate)) as decoded:
+            if pixel_digest(decoded) == digest:
+                best = candidate
+    return best, digest
+
+
+@dataclass
+class StoreStats:
+    added: int = 0
+    removed: int = 0
+    new_blobs: int = 0
+    bytes_in: int = 0
+    bytes_stored: int = 0
+
+    def summary(self) -> str:
+        saved = self.bytes_in - self.bytes_stored
+        removed = f", {self.removed} removed" if self.removed else ""
+        return (f"Screenshot store: {self.added} stored{removed}, {self.new_blobs} new blobs, "
+                f"{self.bytes_in / 1024:.0f} KB in -> {self.bytes_stored / 1024:.0f} KB new "
+                f"({saved / 1024:.0f} KB saved)")
+
+
+class ScreenshotStore:
+    """A pr-screenshots-style directory holding manifest.json and blobs/."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.manifest_path = root / MANIFEST_NAME
+        self.files: dict[str, str] = {}
+        self.blobs: dict[str, dict] = {}
+        self.stats = StoreStats()
+        if self.manifest_path.is_file():
+            manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+            if manifest.get("version") != MANIFEST_VERSION:
+                raise ValueError(f"{self.manifest_path}: unsupported manifest version {manifest.get('version')}")
+            self.files = manifest["files"]
+            self.blobs = manifest["blobs"]
+
+    @classmethod
+    def find(cls, path: Path) -> ScreenshotStore | None:
+        """The store whose root contains path, if any."""
+        path = path.resolve()
+        for directory in (path, *path.parents):
+            if (directory / MANIFEST_NAME).is_file() and (directory / BLOBS_DIR).is_dir():
+                return cls(directory)
+        return None
+
+    def blob_path(self, digest: str) -> Path:
+        return self.root / BLOBS_DIR / digest[:2] / f"{digest}.png"
+
+    def friendly_name(self, path: Path) -> str:
+        try:
+            return path.resolve().relative_to(self.root.resolve()).as_posix()
+        except ValueError:
+            raise ValueError(f"{path} is not inside the screenshot store {self.root}") from None
+
+    def add(self, path: Path) -> str:
+        """Stores the PNG at path under its friendly name and replaces it with the stored copy."""
+        name = self.friendly_name(path)
+        data = path.read_bytes()
+        optimized, digest = optimize_png(data)
+        blob_path = self.blob_path(digest)
+        if digest not in self.blobs or not blob_path.is_file():
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = blob_path.with_suffix(f".{os.getpid()}.tmp")
+            temp_path.write_bytes(optimized)
+            os.replace(temp_path, blob_path)
+            with _open_image(optimized) as image:
+                self.blobs[digest] = {
+                    "sha256": hashlib.sha256(optimized).hexdigest(),
+                    "bytes": len(optimized),
+                    "width": image.width,
+                    "height": image.height,
+                }
+            self.stats.new_blobs += 1
+            self.stats.bytes_stored += len(optimized)
+        self.files[name] = digest
+        self.stats.added += 1
+        self.stats.bytes_in += len(data)
+        # A copy, not a link: capture tools overwrite friendly paths in place
+        shutil.copyfile(blob_path, path)
+        return digest
+
+    def remove(self, path: Path) -> bool:
+        """Drops a friendly path, and its blob if no other path uses it; returns whether it was listed."""
+        digest = self.files.pop(self.friendly_name(path), None)
+        if digest is None:
+            return False
+        if digest not in self.files.values():
+            self.blobs.pop(digest, None)
+            self.blob_path(digest).unlink(missing_ok=True)
+        self.stats.removed += 1
+        return True
+
+    def checkout(self, force: bool = False) -> int:
+        """Writes every friendly path from its blob; returns how many were (re)written."""
+        written = 0
+        for name, digest in sorted(self.files.items()):
+            target = self.root / name
+            if not force and target.is_file() and file_sha256(target) == self.blobs[digest]["sha256"]:
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(self.blob_path(digest), target)
+            written += 1
+        return written
+
+    def verify(self, pixels: bool = False) -> list[str]:
+        """Integrity problems of the manifest and blobs (empty when the store is sound)."""
+        problems = []
+        for name, digest in sorted(self.files.items()):
+            if digest not in self.blobs:
+                problems.append(f"{name}: blob {digest[:12]} is not listed in {MANIFEST_NAME}")
+        for digest, meta in sorted(self.blobs.items()):
+            blob_path = self.blob_path(digest)
+            if not blob_path.is_file():
+                problems.append(f"{blob_path.relative_to(self.root)}: missing")
+                continue
+            data = blob_path.read_bytes()
+            if len(data) != meta["bytes"] or hashlib.sha256(data).hexdigest() != meta["sha256"]:
+                problems.append(f"{blob_path.relative_to(self.root)}: contents do not match {MANIFEST_NAME}")
+            elif pixels:
+                with _open_image(data) as image:
+                    if pixel_digest(image) != digest:
+                        problems.append(f"{blob_path.relative_to(self.root)}: pixels do not match its name")
+        referenced = set(self.files.values())
+        for digest in sorted(set(self.blobs) - referenced):
+            problems.append(f"{self.blob_path(digest).relative_to(self.root)}: not referenced by any path (run gc)")
+        for blob_path in sorted((self.root / BLOBS_DIR).glob("*/*.png")):
+            if blob_path.stem not in self.blobs:
+                problems.append(f"{blob_path.relative_to(self.root)}: not listed in {MANIFEST_NAME}")
+        return problems
+
+    def gc(self) -> int:
+        """Deletes blobs no friendly path references; returns how many were deleted."""
+        referenced = set(self.files.values())
+        removed = 0
+        for digest in sorted(set(self.blobs) - referenced):
+            del self.blobs[digest]
+        for blob_path in sorted((self.root / BLOBS_DIR).glob("*/*.png")):
+            if blob_path.stem not in referenced:
+                blob_path.unlink()
+                removed += 1
+        return removed
+
+    def save(self) -> None:
+        manifest = {"version": MANIFEST_VERSION, "files": dict(sorted(self.files.items())),
+                    "blobs": dict(sorted(self.blobs.items()))}
+        temp_path = self.manifest_path.with_suffix(f".{os.getpid()}.tmp")
+        temp_path.write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+        os.replace(temp_path, self.manifest_path)
+
+
+def _open_image(data: bytes):
+    from PIL import Image
+
+    return Image.open(io.BytesIO(data))
+
+
+def store_outputs(paths: list[Path], removed: list[Path] = ()) -> str | None:
+    """Writes the PNGs among paths that lie inside a store through it; returns a summary line.
+
+    Paths in removed (deleted outputs, such as stale diff images) are dropped
+    from their store's manifest so checkout does not bring them back.
+    """
+    stores: dict[Path, ScreenshotStore] = {}
+
+    def store_for(path: Path) -> ScreenshotStore | None:
+        store = ScreenshotStore.find(path.parent)
+        return None if store is None else stores.setdefault(store.root, store)
+
+    for path in removed:
+        store = store_for(path) if path.suffix.lower() == ".png" else None
+        if store is not None:
+            store.remove(path)
+    for path in paths:
+        if path.suffix.lower() != ".png" or not path.is_file():
+            continue
+        store = store_for(path)
+        if store is None:
+            continue
+        store.add(path)
+    for store in stores.values():
+        store.save()
+    if not stores:
+        return None
+    return "\n".join(store.stats.summary() for store in stores.values())
+
+
+def expand_pngs(paths: list[Path], store: ScreenshotStore) -> list[Path]:
+    """The PNG files named by paths, with directories searched recursively (blobs/ excluded)."""
+    found = []
+    blobs_dir = (store.root / BLOBS_DIR).resolve()
+    for path in paths:
+        candidates = sorted(path.rglob("*.png")) if path.is_dir() else [path]
+        found.extend(candidate for candidate in candidates if blobs_dir not in candidate.resolve().parents)
+    return found
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Manage the content-addressed pr-screenshots store.")
+    parser.add_argument("--store", type=Path, default=DEFAULT_STORE_DIR,
+                        help=f"Store directory (default: {DEFAULT_STORE_DIR.name})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="Store PNG files (directories are searched recursively)")
+    import_parser.add_argument("paths", type=Path, nargs="+")
+    checkout_parser = commands.add_parser("checkout", help="Recreate the friendly paths from their blobs")
+    checkout_parser.add_argument("--force", action="store_true", help="Rewrite paths that are already up to date")
+    verify_parser = commands.add_parser("verify", help="Check the manifest against the blobs")
+    verify_parser.add_argument("--pixels", action="store_true", help="Also decode every blob and check its digest")
+    commands.add_parser("gc", help="Delete blobs no path references")
+    args = parser.parse_args()
+
+    store = ScreenshotStore(args.store)
+    if args.command == "import":
+        args.store.mkdir(parents=True, exist_ok=True)
+        (args.store / BLOBS_DIR).mkdir(exist_ok=True)
+        try:
+            for path in expand_pngs(args.paths, store):
+                store.add(path)
+        except (OSError, ValueError) as exc:
+            print(f"❌ {exc}")
+            return 1
+        store.save()
+        print(f"✅ {store.stats.summary()}")
+    elif args.command == "checkout":
+        print(f"✅ Checked out {store.checkout(args.force)} of {len(store.files)} screenshots")
+    elif args.command == "verify":
+        problems = store.verify(args.pixels)
+        for problem in problems:
+            print(f"❌ {problem}")
+        if problems:
+            return 1
+        print(f"✅ {len(store.files)} screenshots, {len(store.blobs)} blobs: manifest verified")
+    elif args.command == "gc":
+        removed = store.gc()
+        store.save()
+        print(f"✅ Removed {removed} unreferenced blobs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,398 @@
+"""
+Bulk NumPy loader and vectorized analytics for WorkRave historystats files.
+
+convert_workrave.py builds one dict per line, which is fine for a single
+history. This module loads whole files into column arrays instead so many
+users' histories can be analyzed together:
+
+- D lines become a day index plus start/end times.
+- B lines become a (days, break types, 7) value matrix.
+- m lines become a (days, 6) activity counter matrix.
+
+Parsing follows convert_workrave.parse_line: years are 2000 + code % 100, the
+exported month is 0-indexed, B lines keep their first 7 values, the last m line
+of a day wins, and malformed lines are skipped (so following B/m lines attach to
+the previous valid day). Days without an m line get zero counters here and an
+empty activity_stats object in the JSON. WorkRave writes each break type once
+per day; if a type repeats, the matrix keeps its last line.
+`to_records` rebuilds the converter's JSON records from the arrays.
+
+Examples:
+  python utils/workrave_arrays.py -s utils/samples/workrave_stats.txt
+  python utils/workrave_arrays.py -s alice.txt -s bob.txt --json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+
+D_WIDTH = 10  # start day, month, year code, hour, minute, then the same for the end
+B_WIDTH = 8  # break type followed by 7 values
+M_WIDTH = 6  # workrave id, keystrokes, mouse movement, mouse clicks, 2 other metrics
+BREAK_VALUE_COUNT = B_WIDTH - 1
+BREAK_DURATION_COLUMN = 1  # values[1] is the break duration in seconds
+
+ACTIVITY_COLUMNS = ("workrave_id", "keystrokes", "mouse_movement_units", "mouse_clicks", "other_1", "other_2")
+DEFAULT_PERCENTILES = (50, 90, 95, 99)
+
+
+@dataclass
+class HistoryArrays:
+    """Column arrays for one or more historystats files, one row per D line."""
+
+    source: np.ndarray  # (n,) int index into `sources`
+    sources: list[str]
+    start_parts: np.ndarray  # (n, 5) year, month (0-indexed, as exported), day, hour, minute
+    end_parts: np.ndarray  # (n, 5)
+    start: np.ndarray  # (n,) datetime64[m]
+    end: np.ndarray  # (n,) datetime64[m]
+    break_types: np.ndarray  # (t,) sorted break type ids
+    break_values: np.ndarray  # (n, t, 7) int64, zero where break_present is False
+    break_present: np.ndarray  # (n, t) bool
+    break_order: np.ndarray  # (n, t) int, file order of each B line within its day (-1 if absent)
+    activity: np.ndarray  # (n, 6) int64, columns as ACTIVITY_COLUMNS
+    has_activity: np.ndarray  # (n,) bool
+
+    def __len__(self) -> int:
+        return len(self.source)
+
+    @property
+    def day_index(self) -> np.ndarray:
+        """Days since 1970-01-01 of each start date."""
+        return self.start.astype("datetime64[D]").astype(np.int64)
+
+    def activity_column(self, name: str) -> np.ndarray:
+        return self.activity[:, ACTIVITY_COLUMNS.index(name)]
+
+
+def _read_lines(path: Path) -> list[str]:
+    """Reads a historystats file, falling back to latin-1 like the converter."""
+    try:
+        text = path.read_text(encoding="utf-8")
+    except UnicodeDecodeError:
+        text = path.read_text(encoding="latin-1")
+    return text.splitlines()
+
+
+def _parse_block(lines: list[str], width: int, kind: str) -> tuple[np.ndarray, np.ndarray]:
+    """Parses same-type lines into an (n, width) int64 matrix with one numeric conversion.
+
+    Returns the matrix and a mask of which input lines were well formed.
+    """
+    if not lines:
+        return np.empty((0, width), dtype=np.int64), np.zeros(0, dtype=bool)
+
+    # Split on any whitespace like parse_line, dropping the record letter.
+    fields = [line.split()[1:] for line in lines]
+    counts = np.fromiter(map(len, fields), dtype=np.int64, count=len(fields))
+    valid = counts >= width
+    for index in np.flatnonzero(~valid):
+        print(f"Warning: Malformed {kind} line (too few parts): {lines[index]}")
+
+    # Extra trailing fields are ignored, matching parse_line.
+    rows = [" ".join(parts[:width]) for parts, ok in zip(fields, valid) if ok]
+    try:
+        flat = np.array(" ".join(rows).split(), dtype=np.int64)
+    except ValueError:
+        # Rare non-numeric field: fall back to validating line by line.
+        parsed = []
+        for index in np.flatnonzero(valid):
+            try:
+                parsed.append([int(field) for field in fields[index][:width]])
+            except ValueError as exc:
+                print(f"Error parsing {kind} line: {lines[index]} - {exc}")
+                valid[index] = False
+        flat = np.array(parsed, dtype=np.int64).reshape(-1)
+    return flat.reshape(-1, width), valid
+
+
+def _to_datetimes(parts: np.ndarray) -> np.ndarray:
+    """Builds datetime64[m] values from (year, month0, day, hour, minute) rows."""
+    months = (parts[:, 0] - 1970) * 12 + parts[:, 1]
+    days = months.astype("datetime64[M]").astype("datetime64[D]") + (parts[:, 2] - 1)
+    return days.astype("datetime64[m]") + parts[:, 3] * 60 + parts[:, 4]
+
+
+def parse_lines(lines: list[str], source_name: str = "") -> HistoryArrays:
+    """Parses historystats lines into a HistoryArrays in bulk."""
+    stripped = [line.strip() for line in lines]
+    positions = {prefix: [] for prefix in "DBm"}
+    grouped = {prefix: [] for prefix in "DBm"}
+    for position, line in enumerate(stripped):
+        prefix = line[:2]
+        if prefix in ("D ", "B ", "m "):
+            positions[prefix[0]].append(position)
+            grouped[prefix[0]].append(line)
+
+    d_rows, d_valid = _parse_block(grouped["D"], D_WIDTH, "D")
+    b_rows, b_valid = _parse_block(grouped["B"], B_WIDTH, "B")
+    m_rows, m_valid = _parse_block(grouped["m"], M_WIDTH, "m")
+
+    d_positions = np.asarray(positions["D"], dtype=np.int64)[d_valid]
+    day_count = len(d_rows)
+
+    def owners(record_positions: list[int], valid: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # Each B/m line belongs to the closest valid D line above it.
+        kept = np.asarray(record_positions, dtype=np.int64)[valid]
+        owner = np.searchsorted(d_positions, kept, side="right") - 1
+        return owner, owner >= 0
+
+    start_parts = np.empty((day_count, 5), dtype=np.int64)
+    end_parts = np.empty((day_count, 5), dtype=np.int64)
+    for parts, offset in ((start_parts, 0), (end_parts, 5)):
+        parts[:, 0] = 2000 + d_rows[:, offset + 2] % 100
+        parts[:, 1] = d_rows[:, offset + 1] - 1
+        parts[:, 2] = d_rows[:, offset]
+        parts[:, 3] = d_rows[:, offset + 3]
+        parts[:, 4] = d_rows[:, offset + 4]
+
+    b_owner, b_attached = owners(positions["B"], b_valid)
+    b_rows, b_owner = b_rows[b_attached], b_owner[b_attached]
+    break_types, type_index = np.unique(b_rows[:, 0], return_inverse=True)
+    break_values = np.zeros((day_count, len(break_types), BREAK_VALUE_COUNT), dtype=np.int64)
+    break_present = np.zeros((day_count, len(break_types)), dtype=bool)
+    break_order = np.full((day_count, len(break_types)), -1, dtype=np.int64)
+    # Fancy-index assignment keeps the last B line when a type repeats within a day.
+    break_values[b_owner, type_index] = b_rows[:, 1:]
+    break_present[b_owner, type_index] = True
+    if len(b_owner):
+        first_b_of_day = np.r_[True, b_owner[1:] != b_owner[:-1]]
+        group_start = np.maximum.accumulate(np.where(first_b_of_day, np.arange(len(b_owner)), 0))
+        break_order[b_owner, type_index] = np.arange(len(b_owner)) - group_start
+
+    m_owner, m_attached = owners(positions["m"], m_valid)
+    activity = np.zeros((day_count, M_WIDTH), dtype=np.int64)
+    has_activity = np.zeros(day_count, dtype=bool)
+    activity[m_owner[m_attached]] = m_rows[m_attached]
+    has_activity[m_owner[m_attached]] = True
+
+    return HistoryArrays(
+        source=np.zeros(day_count, dtype=np.int64),
+        sources=[source_name],
+        start_parts=start_parts,
+        end_parts=end_parts,
+        start=_to_datetimes(start_parts),
+        end=_to_datetimes(end_parts),
+        break_types=break_types,
+        break_values=break_values,
+        break_present=break_present,
+        break_order=break_order,
+        activity=activity,
+        has_activity=has_activity,
+    )
+
+
+def load_historystats(path: str | Path) -> HistoryArrays:
+    """Loads one historystats file."""
+    path = Path(path)
+    return parse_lines(_read_lines(path), source_name=str(path))
+
+
+def concatenate(histories: list[HistoryArrays]) -> HistoryArrays:
+    """Stacks several histories (e.g. one per user) into one, aligning break types."""
+    if not histories:
+        return parse_lines([])
+    break_types = np.unique(np.concatenate([history.break_types for history in histories]))
+
+    def aligned(history: HistoryArrays, array: np.ndarray, fill: int) -> np.ndarray:
+        shape = (len(history), len(break_types)) + array.shape[2:]
+        out = np.full(shape, fill, dtype=array.dtype)
+        out[:, np.searchsorted(break_types, history.break_types)] = array
+        return out
+
+    sources: list[str] = []
+    source_ids = []
+    for history in histories:
+        source_ids.append(history.source + len(sources))
+        sources.extend(history.sources)
+
+    return HistoryArrays(
+        source=np.concatenate(source_ids),
+        sources=sources,
+        start_parts=np.concatenate([history.start_parts for history in histories]),
+        end_parts=np.concatenate([history.end_parts for history in histories]),
+        start=np.concatenate([history.start for history in histories]),
+        end=np.concatenate([history.end for history in histories]),
+        break_types=break_types,
+        break_values=np.concatenate([aligned(h, h.break_values, 0) for h in histories]),
+        break_present=np.concatenate([aligned(h, h.break_present, False) for h in histories]),
+        break_order=np.concatenate([aligned(h, h.break_order, -1) for h in histories]),
+        activity=np.concatenate([history.activity for history in histories]),
+        has_activity=np.concatenate([history.has_activity for history in histories]),
+    )
+
+
+def load_many(paths: list[str | Path]) -> HistoryArrays:
+    """Loads and stacks several historystats files; `source` tells them apart."""
+    return concatenate([load_historystats(path) for path in paths])
+
+
+def to_records(history: HistoryArrays) -> list[dict]:
+    """Rebuilds the JSON records convert_workrave.py writes for the same input."""
+    records = []
+    for row in range(len(history)):
+        start = history.start_parts[row].tolist()
+        end = history.end_parts[row].tolist()
+        present = np.flatnonzero(history.break_present[row])
+        present = present[np.argsort(history.break_order[row, present], kind="stable")]
+        activity = history.activity[row].tolist()
+        activity_stats = {}
+        if history.has_activity[row]:
+            activity_stats = {
+                "workrave_id": activity[0],
+                "keystrokes": activity[1],
+                "mouse_movement_units": activity[2],
+                "mouse_clicks": activity[3],
+                "other_metrics": activity[4:6],
+            }
+        records.append({
+            "type": "daily",
+            "start_date": {"day": start[2], "month": start[1], "year": start[0]},
+            "start_time": {"hour": start[3], "minute": start[4]},
+            "end_date": {"day": end[2], "month": end[1], "year": end[0]},
+            "end_time": {"hour": end[3], "minute": end[4]},
+            "break_stats": [
+                {"break_type": int(history.break_types[column]), "values": history.break_values[row, column].tolist()}
+                for column in present
+            ],
+            "activity_stats": activity_stats,
+        })
+    return records
+
+
+# --- Vectorized summaries ---
+def usage_minutes(history: HistoryArrays) -> np.ndarray:
+    """Minutes between each day's start and end time."""
+    return (history.end - history.start).astype(np.int64).astype(float)
+
+
+def break_minutes(history: HistoryArrays, break_type: int | None = None) -> np.ndarray:
+    """Total break duration per day in minutes, optionally for one break type."""
+    seconds = history.break_values[:, :, BREAK_DURATION_COLUMN]
+    if break_type is not None:
+        matches = history.break_types == break_type
+        seconds = seconds[:, matches]
+    return seconds.sum(axis=1) / 60
+
+
+def metric_arrays(history: HistoryArrays) -> dict[str, np.ndarray]:
+    """The per-day metrics the dashboard charts, as float arrays."""
+    return {
+        "usage": usage_minutes(history),
+        "keystrokes": history.activity_column("keystrokes").astype(float),
+        "mouse_movement": history.activity_column("mouse_movement_units").astype(float),
+        "mouse_clicks": history.activity_column("mouse_clicks").astype(float),
+        "break_duration": break_minutes(history),
+    }
+
+
+def percentiles(values: np.ndarray, q: tuple[int, ...] = DEFAULT_PERCENTILES) -> dict[str, float]:
+    if len(values) == 0:
+        return {f"p{int(p)}": float("nan") for p in q}
+    return {f"p{int(p)}": float(v) for p, v in zip(q, np.percentile(values, q))}
+
+
+def trend(values: np.ndarray, x: np.ndarray | None = None) -> dict[str, float]:
+    """Least-squares line y = m * x + b; x defaults to sequential indices like the dashboard."""
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return {"m": 0.0, "b": 0.0}
+    x = np.arange(len(values), dtype=float) if x is None else np.asarray(x, dtype=float)
+    x_centered = x - x.mean()
+    denominator = (x_centered ** 2).sum()
+    if denominator == 0:
+        return {"m": 0.0, "b": float(values.mean())}
+    m = float((x_centered * (values - values.mean())).sum() / denominator)
+    return {"m": m, "b": float(values.mean() - m * x.mean())}
+
+
+def summarize_values(values: np.ndarray) -> dict[str, float]:
+    """Total, mean, min (ignoring zeros, like the summary panel), max, percentiles and trend."""
+    positive = values[values > 0]
+    return {
+        "days": int(len(values)),
+        "total": float(values.sum()),
+        "mean": float(values.mean()) if len(values) else 0.0,
+        "min": float(positive.min()) if len(positive) else 0.0,
+        "max": float(values.max()) if len(values) else 0.0,
+        **percentiles(values),
+        "trend": trend(values),
+    }
+
+
+def summarize(history: HistoryArrays, by_source: bool = False) -> dict:
+    """Summaries for every dashboard metric, overall or per source file."""
+    metrics = metric_arrays(history)
+    if not by_source:
+        return {name: summarize_values(values) for name, values in metrics.items()}
+
+    order = np.argsort(history.start, kind="stable")
+    result = {}
+    for source_id, source_name in enumerate(history.sources):
+        rows = order[history.source[order] == source_id]
+        if source_name in result:
+            source_name = f"{source_name} #{source_id + 1}"
+        result[source_name] = {name: summarize_values(values[rows]) for name, values in metrics.items()}
+    return result
+
+
+def rollup(history: HistoryArrays, values: np.ndarray, period: str = "monthly") -> dict[str, np.ndarray]:
+    """Sums and day counts per calendar period ("weekly", "monthly" or "yearly") of the start date."""
+    days = history.start.astype("datetime64[D]")
+    if period == "weekly":
+        # 1970-01-01 was a Thursday; shift so weeks start on Monday.
+        keys = ((days - np.datetime64("1969-12-29")) // np.timedelta64(7, "D")) * 7 + np.datetime64("1969-12-29")
+    elif period == "monthly":
+        keys = days.astype("datetime64[M]").astype("datetime64[D]")
+    elif period == "yearly":
+        keys = days.astype("datetime64[Y]").astype("datetime64[D]")
+    else:
+        raise ValueError(f"Unknown rollup period: {period}")
+
+    periods, inverse = np.unique(keys, return_inverse=True)
+    totals = np.bincount(inverse, weights=values, minlength=len(periods))
+    counts = np.bincount(inverse, minlength=len(periods))
+    return {"period_start": periods, "total": totals, "days": counts, "mean": totals / counts}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Load WorkRave historystats files into NumPy arrays and print summaries.")
+    parser.add_argument("-s", "--source", action="append", required=True,
+                        help="Historystats file (can repeat to analyze several users together)")
+    parser.add_argument("--by-source", action="store_true",
+                        help="Summarize each source file separately")
+    parser.add_argument("--json", action="store_true",
+                        help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    try:
+        history = load_many(args.source)
+    except FileNotFoundError as exc:
+        print(f"Error: {exc}")
+        return 1
+
+    summary = summarize(history, by_source=args.by_source)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return 0
+
+    print(f"Loaded {len(history)} day(s) from {len(history.sources)} file(s)")
+    sections = summary.items() if args.by_source else [("all sources", summary)]
+    for name, metrics in sections:
+        print(f"\n{name}")
+        for metric, stats in metrics.items():
+            print(f"  {metric:<15} total={stats['total']:.0f} mean={stats['mean']:.2f} "
+                  f"p50={stats['p50']:.2f} p95={stats['p95']:.2f} trend={stats['trend']['m']:+.4f}/day")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
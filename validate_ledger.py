@@ -69,6 +69,23 @@ def check_html_structure(file_path):
     return issues
 
 
+def check_generated_tables(file_path):
+    """Entity tables must match ledger_entities.json and notices_extracted.json"""
+    import build_ledger
+
+    issues = []
+    try:
+        current, expected = build_ledger.expected_ledger(Path(file_path))
+    except (OSError, ValueError, KeyError) as exc:
+        issues.append(f"❌ CRITICAL: Cannot build entity tables: {exc}")
+        return issues
+
+    if current != expected:
+        issues.append(
+            "❌ CRITICAL: Generated entity tables are stale (run: python build_ledger.py)")
+    return issues
+
+
 def main():
     print("🧪 Running Ledger Validation Tests\n")
 
@@ -88,6 +105,10 @@ def main():
     structure_issues = check_html_structure(ledger_path)
     all_issues.extend(structure_issues)
 
+    print("🧮 Checking generated entity tables...")
+    table_issues = check_generated_tables(ledger_path)
+    all_issues.extend(table_issues)
+
     print()
 
     if not all_issues:
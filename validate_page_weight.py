@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Validation script for page weight: what each page costs to load, checked against budgets.
+
+Every site page is analyzed statically (nothing is fetched or rendered) for:
+
+- requests:            subresources the page loads (stylesheets, scripts, images,
+                       url() and @import targets of local stylesheets) plus
+                       data files the page or its scripts name, external or local
+- local_bytes:         the page plus every local file above
+- blocking_resources:  stylesheets (other than media="print") and <head> scripts
+                       without async/defer/type="module", which hold up first render
+- external_origins:    distinct origins the page connects to, preconnects included
+- inline_script_bytes: contents of inline <script> elements
+- inline_style_bytes:  contents of <style> elements
+
+Data files are counted as if every existing one named in the page or its scripts
+were fetched, along with the <stem>.*.json siblings scripts derive from them
+(rollups, manifest, shards), so a page that picks among several (shards or a
+fallback file) is measured at its worst case.
+
+Budgets live in page_budgets.json: "default" applies to every page and "pages"
+overrides it per page. A metric over its budget fails validation.
+
+Examples:
+  python validate_page_weight.py
+  python validate_page_weight.py --page archive/plotly_stats.html
+  python validate_page_weight.py --site-dir dist      # measure the built site
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from dataclasses import asdict, dataclass, field
+from html.parser import HTMLParser
+from pathlib import Path
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).parent / "utils"))
+
+from change_analysis import (  # noqa: E402
+    css_refs,
+    find_local_assets,
+    find_runtime_refs,
+    is_comparable_html,
+)
+
+ROOT = Path(__file__).parent
+DEFAULT_BUDGETS_FILE = ROOT / "page_budgets.json"
+EXCLUDED_DIRS = ("utils/", "pr-screenshots/", "dist/", ".git/")
+METRICS = ("requests", "local_bytes", "blocking_resources", "external_origins",
+           "inline_script_bytes", "inline_style_bytes")
+NON_REQUEST_LINK_RELS = {"preconnect", "dns-prefetch", "canonical", "alternate", "author", "license", "help",
+                         "search", "next", "prev"}
+
+
+@dataclass
+class PageWeight:
+    page: str
+    requests: int = 0
+    local_bytes: int = 0
+    blocking_resources: int = 0
+    external_origins: int = 0
+    inline_script_bytes: int = 0
+    inline_style_bytes: int = 0
+    origins: list[str] = field(default_factory=list)
+    missing: list[str] = field(default_factory=list)  # Local references to files that do not exist
+
+
+class _PageWeightParser(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=False)
+        self.subresources: list[str] = []
+        self.connect_origins: list[str] = []
+        self.blocking = 0
+        self.inline_script_bytes = 0
+        self.inline_style_bytes = 0
+        self._in_head = True
+        self._inline: str | None = None  # "script" or "style" while inside an inline one
+        self._in_noscript = False  # Not parsed as markup when scripts run
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        attributes = {name: value or "" for name, value in attrs}
+        if tag == "noscript":
+            self._in_noscript = True
+        elif self._in_noscript:
+            return
+        elif tag == "body":
+            self._in_head = False
+        elif tag == "link":
+            rels = set(attributes.get("rel", "").lower().split())
+            href = attributes.get("href", "")
+            if not href:
+                return
+            if rels & {"preconnect", "dns-prefetch"}:
+                self.connect_origins.append(href)
+            elif not rels & NON_REQUEST_LINK_RELS:
+                self.subresources.append(href)
+                if "stylesheet" in rels and attributes.get("media", "all").lower() != "print":
+                    self.blocking += 1
+        elif tag == "script":
+            if "src" in attributes:
+                self.subresources.append(attributes["src"])
+                deferred = ("async" in attributes or "defer" in attributes
+                            or attributes.get("type", "").lower() == "module")
+                if self._in_head and not deferred:
+                    self.blocking += 1
+            else:
+                self._inline = "script"
+        elif tag == "style":
+            self._inline = "style"
+        elif tag in ("img", "source", "iframe", "audio", "video") and attributes.get("src"):
+            self.subresources.append(attributes["src"])
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "head":
+            self._in_head = False
+        elif tag == "noscript":
+            self._in_noscript = False
+        if tag == self._inline:
+            self._inline = None
+
+    def handle_data(self, data: str) -> None:
+        size = len(data.encode("utf-8"))
+        if self._inline == "script":
+            self.inline_script_bytes += size
+        elif self._inline == "style":
+            self.inline_style_bytes += size
+
+
+def origin_of(ref: str) -> str | None:
+    parts = urlsplit(ref.strip())
+    if parts.netloc:
+        return f"{parts.scheme or 'https'}://{parts.netloc}".lower()
+    return None
+
+
+def measure_page(site_dir: Path, page: str) -> PageWeight:
+    html = (site_dir / page).read_text(encoding="utf-8", errors="replace")
+    parser = _PageWeightParser()
+    parser.feed(html)
+    weight = PageWeight(page, blocking_resources=parser.blocking,
+                        inline_script_bytes=parser.inline_script_bytes,
+                        inline_style_bytes=parser.inline_style_bytes)
+
+    external = {ref for ref in parser.subresources if origin_of(ref) is not None}
+    local = set(find_local_assets(site_dir, page))
+    for stylesheet in [asset for asset in local if asset.lower().endswith(".css") and (site_dir / asset).is_file()]:
+        css = (site_dir / stylesheet).read_text(encoding="utf-8", errors="replace")
+        external.update(ref for ref in css_refs(css) if origin_of(ref) is not None)
+    # Names in script text are a guess at what gets fetched, so only ones that exist count
+    local.update(ref for ref in find_runtime_refs(site_dir, page, sorted(local)) if (site_dir / ref).is_file())
+    local.discard(page)
+
+    weight.requests = len(external) + len(local)
+    weight.local_bytes = (site_dir / page).stat().st_size
+    for asset in sorted(local):
+        path = site_dir / asset
+        if path.is_file():
+            weight.local_bytes += path.stat().st_size
+        else:
+            weight.missing.append(asset)
+    weight.origins = sorted({origin_of(ref) for ref in [*external, *parser.connect_origins]} - {None})
+    weight.external_origins = len(weight.origins)
+    return weight
+
+
+def find_pages(site_dir: Path) -> list[str]:
+    pages = (path.relative_to(site_dir).as_posix() for path in site_dir.rglob("*.html"))
+    return sorted(page for page in pages if is_comparable_html(page) and not page.startswith(EXCLUDED_DIRS))
+
+
+def load_budgets(path: Path) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    for name, budget in [("default", config.get("default", {})), *config.get("pages", {}).items()]:
+        unknown = set(budget) - set(METRICS)
+        if unknown:
+            raise ValueError(f"{path.name}: unknown metric(s) for {name}: {', '.join(sorted(unknown))}")
+    return config
+
+
+def page_budget(config: dict, page: str) -> dict[str, int]:
+    return {**config.get("default", {}), **config.get("pages", {}).get(page, {})}
+
+
+def validate_page_weight(site_dir: Path, pages: list[str], config: dict) -> tuple[list[PageWeight], list[str]]:
+    """Measures pages and returns them with the issues found."""
+    weights = [measure_page(site_dir, page) for page in pages]
+    issues = []
+    for weight in weights:
+        for metric, limit in page_budget(config, weight.page).items():
+            value = getattr(weight, metric)
+            if value > limit:
+                issues.append(f"❌ CRITICAL: {weight.page}: {metric} {value:,} exceeds budget {limit:,}")
+        for asset in weight.missing:
+            issues.append(f"⚠️  WARNING: {weight.page}: references missing local file {asset}")
+    for page in config.get("pages", {}):
+        if page not in pages and not (site_dir / page).exists():
+            issues.append(f"⚠️  WARNING: budget for {page}, which does not exist")
+    return weights, issues
+
+
+def print_weights(weights: list[PageWeight], config: dict) -> None:
+    print(f"{'page':<28} {'requests':>9} {'local KB':>9} {'blocking':>9} {'origins':>8} "
+          f"{'inline js KB':>13} {'inline css KB':>14}")
+    for weight in weights:
+        budget = page_budget(config, weight.page)
+
+        def cell(metric: str, width: int, scale: int = 1) -> str:
+            value = getattr(weight, metric)
+            text = f"{value / scale:,.1f}" if scale > 1 else f"{value:,}"
+            flag = "!" if value > budget.get(metric, value) else " "
+            return f"{text + flag:>{width}}"
+
+        print(f"{weight.page:<28} {cell('requests', 9)} {cell('local_bytes', 9, 1024)} "
+              f"{cell('blocking_resources', 9)} {cell('external_origins', 8)} "
+              f"{cell('inline_script_bytes', 13, 1024)} {cell('inline_style_bytes', 14, 1024)}")
+        if weight.origins:
+            print(f"{'':<28} origins: {', '.join(weight.origins)}")
+    print()
+
+
+def print_report(issues):
+    """Print validation report"""
+    if not issues:
+        print("✅ All pages are within their budgets!")
+        return True
+
+    print("📋 Page Weight Report:")
+    print("-" * 60)
+
+    critical = [i for i in issues if 'CRITICAL' in i]
+    warnings = [i for i in issues if 'WARNING' in i]
+
+    if critical:
+        print("\n🔴 CRITICAL ISSUES:")
+        for issue in critical:
+            print(f"  {issue}")
+
+    if warnings:
+        print("\n🟡 WARNINGS:")
+        for issue in warnings:
+            print(f"  {issue}")
+
+    print("-" * 60)
+    print(
+        f"Summary: {len(critical)} critical, {len(warnings)} warning(s)\n")
+
+    return len(critical) == 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check each page's load cost against page_budgets.json.")
+    parser.add_argument("--site-dir", type=Path, default=ROOT,
+                        help="Site to measure (default: the repository; dist/ after python build_site.py)")
+    parser.add_argument("--budgets", type=Path, default=DEFAULT_BUDGETS_FILE,
+                        help=f"Budget config (default: {DEFAULT_BUDGETS_FILE.name})")
+    parser.add_argument("--page", action="append", default=[],
+                        help="Page to check, relative to the site (can repeat; default: all)")
+    parser.add_argument("--json", action="store_true", help="Print the measurements as JSON")
+    args = parser.parse_args()
+
+    try:
+        config = load_budgets(args.budgets)
+    except (OSError, ValueError) as exc:
+        print(f"❌ Failed to load budgets: {exc}")
+        return 1
+    pages = args.page or find_pages(args.site_dir)
+    missing = [page for page in pages if not (args.site_dir / page).is_file()]
+    if missing:
+        print(f"❌ Page(s) not found in {args.site_dir}: {', '.join(missing)}")
+        return 1
+
+    print("🔍 Checking page weight budgets...\n")
+    weights, issues = validate_page_weight(args.site_dir, pages, config)
+    if args.json:
+        print(json.dumps([asdict(weight) for weight in weights], indent=2))
+    else:
+        print_weights(weights, config)
+    return 0 if print_report(issues) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Validation script for utils/workrave_arrays.py
+Checks that the NumPy loader rebuilds the same records convert_workrave.py writes,
+for the sample history and for files with malformed lines
+"""
+import contextlib
+import io
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "utils"))
+
+from convert_workrave import iter_daily_entries  # noqa: E402
+from workrave_arrays import load_historystats, to_records  # noqa: E402
+
+SAMPLE_FILE = Path(__file__).parent / "utils" / "samples" / "workrave_stats.txt"
+DAY = "D 6 8 123 16 23 7 8 123 17 34"
+BREAK = "B 1 7 11 2 5 0 9 11 2472"
+ACTIVITY = "m 6 16362 4275200 1681117 4024 1712 10915"
+
+# Case name -> historystats lines; each must load the same way in both parsers
+CASES = {
+    "well formed": ["WorkRaveStats 4", DAY, BREAK, ACTIVITY],
+    "repeated spaces leave too few fields": [DAY, "B 0  1 2 3 4 5 6", BREAK, ACTIVITY],
+    "tabs and repeated spaces between fields": [DAY.replace(" ", "\t", 3), "B 0  7 21 21 79 0 0 21 230", ACTIVITY],
+    "extra trailing fields": [DAY + " 99", BREAK + " 1 2", ACTIVITY + " 5"],
+    "non-numeric fields": [DAY, "B 0 7 x 21 79 0 0 21 230", BREAK, "m 6 1 2 x 4 5 6", ACTIVITY],
+    "malformed day keeps lines on the previous day": [DAY, ACTIVITY, "D 8 8 123 9", BREAK],
+    "lines before the first day": [BREAK, ACTIVITY, DAY, BREAK],
+    "day without activity": [DAY, BREAK, "D 8 8 123 9 6 8 8 123 16 44", BREAK],
+}
+
+
+def compare_file(path):
+    """Returns a description of the first difference between the two parsers, or None."""
+    with contextlib.redirect_stdout(io.StringIO()):  # Both parsers warn about malformed lines
+        expected = list(iter_daily_entries(str(path)))
+        actual = to_records(load_historystats(path))
+    # The converter writes zero counters for days without an m line; the loader leaves them empty
+    for entry in expected:
+        if entry["activity_stats"] == {"workrave_id": 0, "keystrokes": 0, "mouse_movement_units": 0,
+                                       "mouse_clicks": 0, "other_metrics": [0, 0]}:
+            entry["activity_stats"] = {}
+    if len(expected) != len(actual):
+        return f"{len(actual)} day(s) loaded, convert_workrave.py writes {len(expected)}"
+    for index, (want, got) in enumerate(zip(expected, actual)):
+        if want != got:
+            return f"day {index + 1} differs: {got} != {want}"
+    return None
+
+
+def validate_workrave_arrays():
+    """Validate workrave_arrays against convert_workrave"""
+    issues = []
+
+    if not SAMPLE_FILE.exists():
+        issues.append(f"❌ CRITICAL: Sample history not found: {SAMPLE_FILE}")
+    else:
+        difference = compare_file(SAMPLE_FILE)
+        if difference:
+            issues.append(f"❌ CRITICAL: {SAMPLE_FILE.name}: {difference}")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, lines in CASES.items():
+            path = Path(temp_dir) / "historystats.txt"
+            path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+            try:
+                difference = compare_file(path)
+            except Exception as exc:  # A parser crash is a failed case, not a crashed validator
+                difference = f"{type(exc).__name__}: {exc}"
+            if difference:
+                issues.append(f"❌ CRITICAL: Case '{name}': {difference}")
+
+    critical_count = len([i for i in issues if 'CRITICAL' in i])
+    warning_count = len([i for i in issues if 'WARNING' in i])
+    return issues, critical_count, warning_count
+
+
+if __name__ == '__main__':
+    print("🧪 Running WorkRave Arrays Validation Tests\n")
+    print(f"📋 Comparing the NumPy loader with convert_workrave.py on the sample and {len(CASES)} edge cases...\n")
+
+    issues, critical_count, warning_count = validate_workrave_arrays()
+
+    if issues:
+        print("Issues found:\n")
+        for issue in issues:
+            print(f"  {issue}")
+        print()
+
+    if critical_count > 0:
+        print(f"❌ {critical_count} critical issue(s)")
+        sys.exit(1)
+    elif warning_count > 0:
+        print(f"⚠️  {warning_count} warning(s) - PASSED with warnings")
+        sys.exit(0)
+    else:
+        print("✅ All checks passed!")
+        sys.exit(0)